@@ -0,0 +1,67 @@
+import threading
+import time
+from typing import Any, Callable, Hashable
+
+
+class TTLCache:
+    """Small in-process cache with separate lifetimes for hits and misses.
+
+    A loader returning None is treated as a miss and cached for
+    `negative_ttl` seconds, so unknown keys are not looked up again on every
+    call. Once `max_entries` is reached the oldest entry is evicted. Safe to
+    share between threads; loaders run outside of the lock, so concurrent
+    misses on the same key may each call the loader.
+    """
+
+    def __init__(self, ttl: float, negative_ttl: float, max_entries: int = 10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[Hashable, tuple[Any, float]] = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[Hashable], Any]) -> Any:
+        """Return the cached value for `key`, calling `loader` if absent or expired.
+
+        Args:
+            key (Hashable): The cache key.
+            loader (Callable): Called with `key` to compute the value on a miss.
+
+        Returns:
+            Any: The cached or freshly loaded value (None for a cached miss).
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        value = loader(key)
+        self.set(key, value, now)
+        return value
+
+    def set(self, key: Hashable, value: Any, now: float | None = None):
+        """Store a value, using the negative TTL when it is None."""
+        now = time.monotonic() if now is None else now
+        ttl = self.ttl if value is not None else self.negative_ttl
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, now + ttl)
+            if len(self._entries) > self.max_entries:
+                self._entries.pop(next(iter(self._entries)), None)
+
+    def invalidate(self, key: Hashable = None):
+        """Drop one key, or every entry when no key is given."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current number of entries."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
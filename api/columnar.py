@@ -0,0 +1,44 @@
+import io
+import struct
+import zipfile
+
+# Column data is aligned for memory mapping, like zipalign does for APKs
+ALIGNMENT = 64
+ALIGNMENT_EXTRA_ID = 0xD935
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+
+
+def npy_header(dtype: str, count: int, offset: int) -> bytes:
+    """Build a .npy (format 1.0) header so the data starts aligned once written at `offset`."""
+    header = repr({"descr": dtype, "fortran_order": False, "shape": (count,)}).encode("latin1")
+    prefix = len(NPY_MAGIC) + 2
+    padding = -(offset + prefix + len(header) + 1) % ALIGNMENT
+    header += b" " * padding + b"\n"
+    return NPY_MAGIC + struct.pack("<H", len(header)) + header
+
+
+def build_npz(columns: dict[str, tuple[str, bytes]], count: int) -> bytes:
+    """Bundle little-endian columns into an uncompressed .npz archive.
+
+    Every column is a stored (uncompressed) .npy member whose data starts on
+    a 64-byte boundary of the archive, so it can be loaded with `numpy.load`
+    or mapped in place with `numpy.memmap`.
+
+    Args:
+        columns (dict): Column name -> (numpy dtype string, raw little-endian data).
+        count (int): Number of values in every column.
+
+    Returns:
+        bytes: The .npz archive.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as archive:
+        for name, (dtype, data) in columns.items():
+            info = zipfile.ZipInfo(f"{name}.npy")
+            member_offset = buffer.tell()
+            # Local file header (30 bytes) + name + 6 bytes of alignment extra field
+            header_end = member_offset + 30 + len(info.filename) + 6
+            info.extra = struct.pack("<HHH", ALIGNMENT_EXTRA_ID, 2, ALIGNMENT)
+            archive.writestr(info, npy_header(dtype, count, header_end) + data)
+    return buffer.getvalue()
+
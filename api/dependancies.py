@@ -1,6 +1,16 @@
-from fastapi import HTTPException, Request, status
+import math
+from datetime import datetime
+from typing import Literal
 
+from fastapi import HTTPException, Query, Request, status
+
+from api.models.Analytics import AnalyticsQuery
+from api.models.HistoryQuery import HistoryQuery
+from api.models.Nearby import NearbyQuery
+from api.models.Position import InterpolationRequest
+from api.models.RollupQuery import RollupQuery
 from api.services import auth_service
+from config.config import ANALYTICS_MOVING_SPEED, HISTORY_DEFAULT_LIMIT, HISTORY_MAX_LIMIT
 
 
 def get_header_token(request: Request) -> str:
@@ -32,3 +42,72 @@ def allowed_roles(request: Request, allowed_roles: list[str]):
     if not any(role in user.roles for role in allowed_roles):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+
+def local_time(value: datetime | None) -> datetime | None:
+    # Positions are stored as naive local times
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+def history_query(
+    seconds: int | None = Query(None, gt=0, description="Only return the last `seconds` seconds"),
+    start: datetime | None = Query(None, alias="from", description="Only return positions at or after this time"),
+    end: datetime | None = Query(None, alias="to", description="Only return positions at or before this time"),
+    limit: int | None = Query(None, gt=0, le=HISTORY_MAX_LIMIT,
+                              description=f"Maximum number of positions (default {HISTORY_DEFAULT_LIMIT}, "
+                                          "no limit when streaming NDJSON)"),
+    cursor: str | None = Query(None, description="Continuation cursor returned in `X-Next-Cursor`"),
+    points: int | None = Query(None, ge=3, le=HISTORY_MAX_LIMIT,
+                               description="Downsample the window to this many positions (LTTB)"),
+    bucket: float | None = Query(None, gt=0, description="Average positions over buckets of this many seconds"),
+    precision: float | None = Query(None, ge=1e-9, description="Coordinate precision of the compact trajectory format")
+) -> HistoryQuery:
+    return HistoryQuery(seconds=seconds, start=local_time(start), end=local_time(end),
+                        limit=limit, cursor=cursor, points=points, bucket=bucket,
+                        precision=precision)
+
+
+def rollup_query(
+    resolution: int = Query(3600, gt=0, description="Width of the summarized periods, in seconds "
+                                                    "(a multiple of 60)"),
+    start: datetime | None = Query(None, alias="from", description="Only return periods at or after this time"),
+    end: datetime | None = Query(None, alias="to", description="Only return periods at or before this time"),
+    limit: int | None = Query(None, gt=0, le=HISTORY_MAX_LIMIT,
+                              description=f"Maximum number of periods (default {HISTORY_DEFAULT_LIMIT})")
+) -> RollupQuery:
+    return RollupQuery(resolution=resolution, start=local_time(start), end=local_time(end), limit=limit)
+
+
+def nearby_query(
+    radius: float | None = Query(None, gt=0, description="Return the entities within this distance"),
+    k: int | None = Query(None, gt=0, le=HISTORY_MAX_LIMIT, description="Return the k nearest entities"),
+    kind: Literal["ship", "planet"] | None = Query(None, description="Only return ships or planets")
+) -> NearbyQuery:
+    if (radius is None) == (k is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Exactly one of 'radius' and 'k' is required")
+    if radius is not None and not math.isfinite(radius):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="'radius' must be finite")
+    return NearbyQuery(radius=radius, k=k, kind=kind)
+
+
+def interpolation_times(
+    time: list[datetime] = Query(..., description="Time to evaluate, may be repeated"),
+    method: Literal["linear", "cubic"] = Query("linear", description="Interpolation between samples")
+) -> InterpolationRequest:
+    if len(time) > HISTORY_MAX_LIMIT:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"At most {HISTORY_MAX_LIMIT} times per request")
+    return InterpolationRequest(times=[local_time(value) for value in time], method=method)
+
+
+def analytics_query(
+    resolution: float | None = Query(None, gt=0, description="Also return the kinematics per period of "
+                                                             "this many seconds"),
+    moving_speed: float = Query(ANALYTICS_MOVING_SPEED, ge=0,
+                                description="Speed above which the entity counts as moving")
+) -> AnalyticsQuery:
+    return AnalyticsQuery(resolution=resolution, moving_speed=moving_speed)
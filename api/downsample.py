@@ -0,0 +1,54 @@
+from typing import Sequence
+
+
+def lttb(xs: Sequence[float], ys: Sequence[float], zs: Sequence[float], threshold: int) -> list[int]:
+    """Select the samples of a trajectory to keep with Largest-Triangle-Three-Buckets.
+
+    The samples between the first and the last one are split into
+    `threshold - 2` buckets; from each bucket the sample forming the largest
+    triangle with the previously selected sample and the average of the next
+    bucket is kept. Triangle areas are measured in 3D space, so turns of the
+    trail are preserved while straight stretches are thinned out.
+
+    Args:
+        xs (Sequence[float]): X coordinates, in time order.
+        ys (Sequence[float]): Y coordinates, in time order.
+        zs (Sequence[float]): Z coordinates, in time order.
+        threshold (int): Number of samples to keep.
+
+    Returns:
+        list[int]: The indices of the kept samples, in time order.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    selected = [0]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for bucket in range(threshold - 2):
+        next_start = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, n)
+        count = next_end - next_start
+        next_x = sum(xs[next_start:next_end]) / count
+        next_y = sum(ys[next_start:next_end]) / count
+        next_z = sum(zs[next_start:next_end]) / count
+
+        ax, ay, az = xs[a], ys[a], zs[a]
+        vx, vy, vz = next_x - ax, next_y - ay, next_z - az
+        best_area = -1.0
+        best = next_start - 1
+        for index in range(int(bucket * every) + 1, next_start):
+            ux, uy, uz = xs[index] - ax, ys[index] - ay, zs[index] - az
+            cx = uy * vz - uz * vy
+            cy = uz * vx - ux * vz
+            cz = ux * vy - uy * vx
+            # Squared cross product, proportional to the squared triangle area
+            area = cx * cx + cy * cy + cz * cz
+            if area > best_area:
+                best_area = area
+                best = index
+        selected.append(best)
+        a = best
+    selected.append(n - 1)
+    return selected
@@ -1,2 +1,18 @@
 class AlreadyExistsException(Exception):
     pass
+
+
+class NotFoundException(Exception):
+    pass
+
+
+class InvalidCursorException(Exception):
+    pass
+
+
+class UnsupportedResolutionException(Exception):
+    pass
+
+
+class UnencodableTrajectoryException(Exception):
+    pass
@@ -0,0 +1,167 @@
+import math
+import threading
+import uuid
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+
+from api.models.Position import Position
+
+# Bytes used by one sample: x, y, z and time, 8 bytes each
+SAMPLE_BYTES = 32
+
+
+class HistoryRing:
+    """Fixed-capacity ring of the most recent samples of one entity.
+
+    Samples are kept in time order in preallocated arrays. `floor` is the
+    time (epoch ms) from which the ring is known to hold every sample
+    written: it moves forward when samples are evicted, and past any sample
+    arriving out of order, which is not stored.
+    """
+    __slots__ = ("capacity", "xs", "ys", "zs", "times", "start", "count", "floor")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.xs = array("d", bytes(8 * capacity))
+        self.ys = array("d", bytes(8 * capacity))
+        self.zs = array("d", bytes(8 * capacity))
+        self.times = array("q", bytes(8 * capacity))
+        self.start = 0
+        self.count = 0
+        self.floor: int | None = None
+
+    def newest(self) -> int | None:
+        if not self.count:
+            return None
+        return self.times[(self.start + self.count - 1) % self.capacity]
+
+    def append(self, x: float, y: float, z: float, timestamp: int, retention_ms: int):
+        newest = self.newest()
+        if newest is not None and timestamp <= newest:
+            if timestamp < newest:
+                # Late sample: only the window after it is still complete
+                self.floor = max(self.floor, timestamp + 1)
+            return
+        if self.floor is None:
+            self.floor = timestamp
+
+        if self.count == self.capacity:
+            self._evict()
+        end = (self.start + self.count) % self.capacity
+        self.xs[end] = x
+        self.ys[end] = y
+        self.zs[end] = z
+        self.times[end] = timestamp
+        self.count += 1
+        while retention_ms and self.count and self.times[self.start] < timestamp - retention_ms:
+            self._evict()
+
+    def window(self, since: int, before: int = None,
+               limit: int = None) -> list[tuple[float, float, float, int]] | None:
+        """Return the samples in [since, before), newest first, or None if not held."""
+        if self.floor is None or since < self.floor:
+            return None
+        samples = []
+        for index in range(self.count - 1, -1, -1):
+            slot = (self.start + index) % self.capacity
+            timestamp = self.times[slot]
+            if timestamp < since or (limit is not None and len(samples) >= limit):
+                break
+            if before is None or timestamp < before:
+                samples.append((self.xs[slot], self.ys[slot], self.zs[slot], timestamp))
+        return samples
+
+    def _evict(self):
+        self.floor = max(self.floor, self.times[self.start] + 1)
+        self.start = (self.start + 1) % self.capacity
+        self.count -= 1
+
+
+class RecentHistory:
+    """Recent position history of the entities written by this process.
+
+    Each entity gets a `HistoryRing` of `samples` samples, also trimmed to
+    the last `seconds` seconds. The number of rings is bounded by
+    `memory_budget` bytes; the least recently updated entity is dropped
+    when a new one would exceed it. A window is only served when the ring
+    is known to hold all of it, otherwise the caller reads the database.
+    """
+
+    def __init__(self, samples: int, seconds: int, memory_budget: int):
+        self.samples = samples
+        self.retention_ms = seconds * 1000
+        self.max_entities = max(1, memory_budget // (samples * SAMPLE_BYTES))
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._rings: OrderedDict[uuid.UUID, HistoryRing] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, positions: list[Position]):
+        """Append written positions to the rings of their entities."""
+        with self._lock:
+            for position in positions:
+                ring = self._rings.get(position.id)
+                if ring is None:
+                    if len(self._rings) >= self.max_entities:
+                        self._rings.popitem(last=False)
+                        self.evicted += 1
+                    ring = self._rings[position.id] = HistoryRing(self.samples)
+                else:
+                    self._rings.move_to_end(position.id)
+                ring.append(position.x, position.y, position.z,
+                            int(position.time.timestamp() * 1000), self.retention_ms)
+
+    def window(self, id: uuid.UUID, since: datetime, until: datetime = None,
+               before: datetime = None, limit: int = None) -> list[Position] | None:
+        """Return the positions of an entity in a time window, newest first.
+
+        Args:
+            id (UUID): The unique identifier of the entity.
+            since (datetime): Start of the window.
+            until (datetime): Inclusive end of the window.
+            before (datetime): Exclusive end of the window.
+            limit (int): Maximum number of positions to return.
+
+        Returns:
+            list[Position]: The positions in the window.
+            None: If the window is not fully held in memory.
+        """
+        ends = []
+        if until is not None:
+            ends.append(math.floor(until.timestamp() * 1000) + 1)
+        if before is not None:
+            ends.append(math.ceil(before.timestamp() * 1000))
+        with self._lock:
+            ring = self._rings.get(id)
+            samples = ring.window(math.ceil(since.timestamp() * 1000),
+                                  min(ends) if ends else None, limit) if ring else None
+        if samples is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [
+            Position.model_construct(
+                id=id, x=x, y=y, z=z, time=datetime.fromtimestamp(timestamp / 1000.0))
+            for x, y, z, timestamp in samples
+        ]
+
+    def clear(self):
+        """Drop every ring, e.g. when this process stops receiving some entities."""
+        with self._lock:
+            self._rings.clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and memory use of this process."""
+        lookups = self.hits + self.misses
+        return {
+            "entities": len(self._rings),
+            "max_entities": self.max_entities,
+            "samples_per_entity": self.samples,
+            "memory_bytes": len(self._rings) * self.samples * SAMPLE_BYTES,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evicted": self.evicted,
+        }
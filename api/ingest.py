@@ -0,0 +1,200 @@
+import asyncio
+import re
+from typing import AsyncIterable
+
+from config.config import get_logger
+
+from api.models.IngestResult import IngestResult
+from api.models.Message import Message
+
+from kafka.batch_writer import PositionBatchWriter
+from kafka.codec import get_codec
+from kafka.consumer import resolve_position
+from kafka.dead_letter import classify
+
+logger = get_logger()
+
+# How long a request waits for the shared ingest writer to confirm its rows
+# (it may be holding a failed batch for a retry)
+CONFIRM_TIMEOUT_SECONDS = 30.0
+
+# Bytes that matter when scanning a JSON object, outside and inside strings
+STRUCTURE = re.compile(rb'[{}"]')
+STRING_SPECIALS = re.compile(rb'["\\]')
+
+
+class RecordSplitter:
+    """Split a streamed request body into JSON records as chunks arrive.
+
+    The body is either a JSON array of objects or NDJSON (one object per
+    line), detected from its first non-blank byte. Array elements are found
+    by matching braces outside of strings, skipping escaped characters
+    inside them.
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        self._array: bool | None = None
+
+    def feed(self, chunk: bytes) -> list[bytes]:
+        """Add a chunk of the body and return the records it completes."""
+        self._buffer += chunk
+        if self._array is None:
+            stripped = self._buffer.lstrip()
+            if not stripped:
+                return []
+            self._array = stripped[:1] == b"["
+        return self._split_array() if self._array else self._split_lines()
+
+    def close(self) -> list[bytes]:
+        """Return what is left of the body once it has been fully received."""
+        rest, self._buffer = self._buffer.strip(), b""
+        if self._array:
+            rest = rest.rstrip(b"]").strip()
+        return [rest] if rest else []
+
+    def _split_lines(self) -> list[bytes]:
+        *lines, self._buffer = self._buffer.split(b"\n")
+        return [line for line in lines if line.strip()]
+
+    def _split_array(self) -> list[bytes]:
+        records = []
+        buffer = self._buffer
+        position = 0
+        while True:
+            start = buffer.find(b"{", position)
+            if start < 0:
+                # Only separators are left
+                self._buffer = b""
+                return records
+            end = _object_end(buffer, start)
+            if end < 0:
+                self._buffer = buffer[start:]
+                return records
+            records.append(buffer[start:end + 1])
+            position = end + 1
+
+
+def _object_end(buffer: bytes, start: int) -> int:
+    """Return the index of the brace closing the object opened at `start`, or -1."""
+    depth = 0
+    in_string = False
+    position = start
+    while True:
+        match = (STRING_SPECIALS if in_string else STRUCTURE).search(buffer, position)
+        if match is None:
+            return -1
+        char = match.group()
+        position = match.end()
+        if in_string:
+            if char == b"\\":
+                # Skip the escaped character, whatever it is
+                position += 1
+            else:
+                in_string = False
+        elif char == b'"':
+            in_string = True
+        elif char == b"{":
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 0:
+                return match.start()
+
+
+def _resolve_all(messages: list[Message]) -> list:
+    """Resolve messages to positions, returning the error raised for failed ones."""
+    results = []
+    for message in messages:
+        try:
+            results.append(resolve_position(message))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+async def ingest_stream(
+    chunks: AsyncIterable[bytes],
+    type_object: str,
+    writer: PositionBatchWriter = None
+) -> IngestResult:
+    """Decode, resolve and write the `Message` records of a streamed body.
+
+    Records go through the JSON codec and the name resolution of the Kafka
+    consumer (in a worker thread, as it may query the database), then
+    through a `PositionBatchWriter`. When the ingest pipeline runs in this
+    process its writer is shared, so HTTP and Kafka positions are batched
+    (and deduplicated, spooled...) together; otherwise a writer is created
+    for the request. The writer is flushed before returning, and records
+    are only counted as accepted once their batch is durable; records whose
+    batch failed, or was not confirmed within `CONFIRM_TIMEOUT_SECONDS`, are
+    rejected as "database".
+
+    Args:
+        chunks (AsyncIterable[bytes]): The request body, as it is received.
+        type_object (str): The only object type accepted ("ship" or "planet").
+        writer (PositionBatchWriter): The running ingest writer, if any.
+
+    Returns:
+        IngestResult: The accepted and rejected record counts.
+    """
+    codec = get_codec("json")
+    errors: dict[str, int] = {}
+    # Number of records waiting on each batch outcome
+    outcomes: dict[asyncio.Future, int] = {}
+    duplicates = 0
+
+    def reject(reason: str, count: int = 1):
+        errors[reason] = errors.get(reason, 0) + count
+
+    if writer is None:
+        # A single attempt: a failed batch is reported instead of retried
+        writer = PositionBatchWriter(on_failure=lambda batch: None, max_attempts=1)
+
+    async def add(values: list[bytes]):
+        nonlocal duplicates
+        messages = []
+        for value in values:
+            try:
+                message = codec.decode(value)
+            except Exception as e:
+                reject(classify("decode", e)[0])
+                continue
+            if message.type_object != type_object:
+                reject("wrong_type")
+                continue
+            messages.append(message)
+        if not messages:
+            return
+
+        for result in await asyncio.to_thread(_resolve_all, messages):
+            if isinstance(result, Exception):
+                reject(classify("resolve", result)[0])
+                continue
+            waiter = await writer.add(result)
+            if waiter is None:
+                # Already written
+                duplicates += 1
+            else:
+                outcomes[waiter] = outcomes.get(waiter, 0) + 1
+
+    splitter = RecordSplitter()
+    async for chunk in chunks:
+        await add(splitter.feed(chunk))
+    await add(splitter.close())
+    await writer.flush(force=False)
+
+    pending = [waiter for waiter in outcomes if not waiter.done()]
+    if pending:
+        await asyncio.wait(pending, timeout=CONFIRM_TIMEOUT_SECONDS)
+    accepted = duplicates
+    for waiter, count in outcomes.items():
+        if waiter.done() and waiter.result():
+            accepted += count
+        else:
+            reject("database", count)
+
+    rejected = sum(errors.values())
+    logger.info("Ingested %d %s positions over HTTP, %d rejected: %s",
+                accepted, type_object, rejected, errors)
+    return IngestResult(accepted=accepted, rejected=rejected, errors=errors)
@@ -0,0 +1,64 @@
+from datetime import datetime
+from typing import Sequence
+
+# A sample: x, y, z, time
+Sample = tuple[float, float, float, datetime]
+
+
+def interpolate(before: Sequence[Sample], after: Sequence[Sample], at: datetime,
+                method: str = "linear") -> tuple[float, float, float] | None:
+    """Interpolate the position of an entity at a given time.
+
+    `before` holds the samples at or before `at`, newest first, and `after`
+    the samples after it, oldest first: the bracketing pair is `before[0]`
+    and `after[0]`. The cubic method is a Hermite spline whose tangents are
+    three-point finite differences over the neighbouring samples
+    (`before[1]` and `after[1]`), weighted by the sample spacing so uneven
+    sampling is handled (quadratic motion is reproduced exactly); it falls
+    back to one-sided differences where a neighbour is missing.
+
+    Args:
+        before (Sequence[Sample]): Up to two samples at or before `at`, newest first.
+        after (Sequence[Sample]): Up to two samples after `at`, oldest first.
+        at (datetime): The time to evaluate.
+        method (str): "linear" or "cubic".
+
+    Returns:
+        tuple: The interpolated (x, y, z).
+        None: If `at` is outside the sampled range.
+    """
+    if not before:
+        return None
+    p1 = before[0]
+    if p1[3] == at:
+        return p1[0], p1[1], p1[2]
+    if not after:
+        return None
+    p2 = after[0]
+    h = (p2[3] - p1[3]).total_seconds()
+    u = (at - p1[3]).total_seconds() / h
+    if method != "cubic":
+        return tuple(a + (b - a) * u for a, b in zip(p1[:3], p2[:3]))
+
+    p0 = before[1] if len(before) > 1 else None
+    p3 = after[1] if len(after) > 1 else None
+    h00 = 2 * u ** 3 - 3 * u ** 2 + 1
+    h10 = u ** 3 - 2 * u ** 2 + u
+    h01 = -2 * u ** 3 + 3 * u ** 2
+    h11 = u ** 3 - u ** 2
+    m1 = _tangent(p0, p1, p2)
+    m2 = _tangent(p1, p2, p3)
+    return tuple(h00 * a + h10 * h * ma + h01 * b + h11 * h * mb
+                 for a, b, ma, mb in zip(p1[:3], p2[:3], m1, m2))
+
+
+def _tangent(previous: Sample | None, sample: Sample,
+             following: Sample | None) -> tuple[float, float, float]:
+    if previous is None or following is None:
+        start, end = (sample, following) if previous is None else (previous, sample)
+        dt = (end[3] - start[3]).total_seconds()
+        return tuple((b - a) / dt for a, b in zip(start[:3], end[:3]))
+    left = (sample[3] - previous[3]).total_seconds()
+    right = (following[3] - sample[3]).total_seconds()
+    return tuple(((c - b) / right * left + (b - a) / left * right) / (left + right)
+                 for a, b, c in zip(previous[:3], sample[:3], following[:3]))
@@ -0,0 +1,207 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from api.models.Position import Position
+from config.config import get_logger
+
+logger = get_logger()
+
+# File header: magic, layout version, number of slots
+STORE_HEADER = struct.Struct("<8sII")
+STORE_MAGIC = b"OWLATEST"
+STORE_VERSION = 2
+# Number of occupied slots, after the header, kept up to date by the writers
+STORE_ENTRIES = struct.Struct("<Q")
+ENTRIES_OFFSET = STORE_HEADER.size
+HEADER_SIZE = 64
+# Slot: sequence (odd while being written), entity id, x, y, z, time (epoch
+# ms), time the slot was written (epoch seconds). 64 bytes.
+STORE_SLOT = struct.Struct("<I4x16sdddqd")
+EMPTY_ID = bytes(16)
+READ_ATTEMPTS = 8
+
+
+class LatestPositionStore:
+    """Latest position of every entity in a memory-mapped file shared by processes.
+
+    The file (on /dev/shm by default) is an open-addressing hash table of
+    fixed-size slots keyed by entity id. Writers serialize on a file lock
+    and only ever replace a slot with a newer position. Readers take no lock:
+    every slot carries a sequence number that is odd while it is being
+    written, and a read is retried if the sequence changed under it.
+
+    Entries written more than `max_age` seconds ago are reported as misses
+    so the caller falls back to the database. Counters are per process.
+    Every process must use the same `capacity`, the file is reset otherwise.
+    The header counts the occupied slots, so the occupancy is read without
+    scanning the table.
+    """
+
+    def __init__(self, path: str, capacity: int, max_age: float):
+        self.path = path
+        self.capacity = capacity
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.full = 0
+        self.max_age_served = 0.0
+        self.total_age_served = 0.0
+        self._map: mmap.mmap | None = None
+        self._fd: int | None = None
+        self._pid: int | None = None
+        self._unavailable_in: int | None = None
+        self._lock = threading.Lock()
+
+    def get(self, id: uuid.UUID) -> Position | None:
+        """Return the stored latest position of an entity.
+
+        Args:
+            id (UUID): The unique identifier of the entity.
+
+        Returns:
+            Position: The latest position, if stored and fresh enough.
+            None: On a miss or a stale entry.
+        """
+        store = self._open()
+        if store is None:
+            return None
+        key = id.bytes
+        slot = self._find(store, key)
+        record = self._read(store, slot) if slot is not None else None
+        if record is None or record[1] != key:
+            self.misses += 1
+            return None
+
+        _, _, x, y, z, timestamp, written_at = record
+        age = time.time() - written_at
+        if self.max_age > 0 and age > self.max_age:
+            self.stale += 1
+            return None
+        self.hits += 1
+        self.total_age_served += age
+        self.max_age_served = max(self.max_age_served, age)
+        return Position.model_construct(
+            id=id, x=x, y=y, z=z, time=datetime.fromtimestamp(timestamp / 1000.0))
+
+    def update(self, positions: list[Position]):
+        """Store the positions newer than the stored ones.
+
+        Errors are logged and ignored: the database stays the reference.
+
+        Args:
+            positions (list[Position]): Positions already written to the database.
+        """
+        store = self._open()
+        if store is None or not positions:
+            return
+        latest: dict[bytes, Position] = {}
+        for position in positions:
+            key = position.id.bytes
+            current = latest.get(key)
+            if current is None or current.time < position.time:
+                latest[key] = position
+        try:
+            with self._lock:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+                try:
+                    now = time.time()
+                    for key, position in latest.items():
+                        self._write(store, key, position, now)
+                finally:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+        except Exception as e:
+            logger.error("Error updating the latest position store: %s", e)
+
+    def stats(self) -> dict:
+        """Return hit rate and staleness counters of this process, and the store occupancy."""
+        store = self._open()
+        entries = STORE_ENTRIES.unpack_from(store, ENTRIES_OFFSET)[0] if store is not None else 0
+        lookups = self.hits + self.misses + self.stale
+        return {
+            "pid": os.getpid(),
+            "entries": entries,
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "full": self.full,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "avg_age_ms": round(self.total_age_served / self.hits * 1000, 3) if self.hits else None,
+            "max_age_ms": round(self.max_age_served * 1000, 3),
+        }
+
+    def _open(self) -> mmap.mmap | None:
+        # Mapped lazily in every process (uvicorn forks its workers)
+        if self._map is not None and self._pid == os.getpid():
+            return self._map
+        if self._unavailable_in == os.getpid():
+            return None
+        size = HEADER_SIZE + self.capacity * STORE_SLOT.size
+        try:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                header = os.pread(fd, STORE_HEADER.size, 0)
+                if (os.fstat(fd).st_size != size
+                        or header != STORE_HEADER.pack(STORE_MAGIC, STORE_VERSION, self.capacity)):
+                    logger.info("Initializing the latest position store: %s", self.path)
+                    os.ftruncate(fd, size)
+                    os.pwrite(fd, bytes(size), 0)
+                    os.pwrite(fd, STORE_HEADER.pack(STORE_MAGIC, STORE_VERSION, self.capacity), 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._map = mmap.mmap(fd, size)
+            self._fd = fd
+            self._pid = os.getpid()
+        except OSError as e:
+            logger.error("Latest position store unavailable (%s): %s", self.path, e)
+            self._map = None
+            self._unavailable_in = os.getpid()
+        return self._map
+
+    def _find(self, store: mmap.mmap, key: bytes, insert: bool = False) -> int | None:
+        start = int.from_bytes(key[:8], "little") % self.capacity
+        for probe in range(self.capacity):
+            slot = (start + probe) % self.capacity
+            offset = HEADER_SIZE + slot * STORE_SLOT.size + 8
+            stored = store[offset:offset + 16]
+            if stored == key:
+                return slot
+            if stored == EMPTY_ID:
+                return slot if insert else None
+        return None
+
+    def _read(self, store: mmap.mmap, slot: int) -> tuple | None:
+        offset = HEADER_SIZE + slot * STORE_SLOT.size
+        for _ in range(READ_ATTEMPTS):
+            record = STORE_SLOT.unpack_from(store, offset)
+            if record[0] % 2 == 0 and STORE_SLOT.unpack_from(store, offset)[0] == record[0]:
+                return record
+        return None
+
+    def _write(self, store: mmap.mmap, key: bytes, position: Position, now: float):
+        slot = self._find(store, key, insert=True)
+        if slot is None:
+            self.full += 1
+            return
+        offset = HEADER_SIZE + slot * STORE_SLOT.size
+        sequence, stored_key, _, _, _, timestamp, _ = STORE_SLOT.unpack_from(store, offset)
+        new_timestamp = int(position.time.timestamp() * 1000)
+        if stored_key == key and timestamp >= new_timestamp:
+            return
+        if stored_key == EMPTY_ID:
+            # Slots are never freed, and writers hold the file lock
+            entries = STORE_ENTRIES.unpack_from(store, ENTRIES_OFFSET)[0]
+            STORE_ENTRIES.pack_into(store, ENTRIES_OFFSET, entries + 1)
+        writing = (sequence + 1) & 0xFFFFFFFF
+        struct.pack_into("<I", store, offset, writing)
+        STORE_SLOT.pack_into(store, offset, writing, key,
+                             position.x, position.y, position.z, new_timestamp, now)
+        struct.pack_into("<I", store, offset, (writing + 1) & 0xFFFFFFFF)
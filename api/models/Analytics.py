@@ -0,0 +1,46 @@
+import uuid
+from datetime import datetime
+from pydantic import BaseModel
+
+
+class AnalyticsQuery(BaseModel):
+    """Options of a trajectory analytics request."""
+    resolution: float | None = None
+    moving_speed: float = 0.0
+
+
+class TrajectorySummary(BaseModel):
+    """Kinematic summary of a trajectory (distances in position units, times in seconds)."""
+    samples: int
+    duration: float
+    path_length: float
+    displacement: float
+    mean_speed: float | None
+    max_speed: float | None
+    max_acceleration: float | None
+    time_in_motion: float
+
+
+class TrajectoryPeriod(BaseModel):
+    """Kinematics of a trajectory over one period."""
+    start: datetime
+    distance: float
+    vx: float | None
+    vy: float | None
+    vz: float | None
+    mean_speed: float | None
+    max_speed: float
+    max_acceleration: float | None
+    time_in_motion: float
+
+
+class TrajectoryAnalytics(BaseModel):
+    """Summary of a trajectory, and its kinematics per period when a resolution is requested.
+
+    The series is capped to its newest periods; `series_truncated` is set
+    when older ones were left out (the summary always covers the whole window).
+    """
+    id: uuid.UUID
+    summary: TrajectorySummary
+    series: list[TrajectoryPeriod] | None = None
+    series_truncated: bool = False
@@ -0,0 +1,14 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+
+class HistoryQuery(BaseModel):
+    """Filters and pagination of a position history request."""
+    seconds: int | None = None
+    start: datetime | None = None
+    end: datetime | None = None
+    limit: int | None = None
+    cursor: str | None = None
+    points: int | None = None
+    bucket: float | None = None
+    precision: float | None = None
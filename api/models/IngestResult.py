@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+
+
+class IngestResult(BaseModel):
+    """Outcome of a batch ingestion request, with rejected records counted per reason."""
+    accepted: int
+    rejected: int
+    errors: dict[str, int]
@@ -0,0 +1,22 @@
+import uuid
+from datetime import datetime
+from typing import Literal
+from pydantic import BaseModel
+
+
+class NearbyQuery(BaseModel):
+    """Search of a proximity request: within a radius, or the k nearest."""
+    radius: float | None = None
+    k: int | None = None
+    kind: Literal["ship", "planet"] | None = None
+
+
+class NearbyEntity(BaseModel):
+    """Latest position of an entity found by a proximity query, with its distance."""
+    id: uuid.UUID
+    kind: str | None
+    x: float
+    y: float
+    z: float
+    time: datetime
+    distance: float
@@ -1,6 +1,7 @@
 from pydantic import BaseModel
 from datetime import datetime
 import uuid
+from typing import Literal
 
 
 class Position(BaseModel):
@@ -10,3 +11,18 @@ class Position(BaseModel):
     y: float
     z: float
     time: datetime
+
+
+class InterpolatedPosition(BaseModel):
+    """Position of an entity at a requested time, null outside its history."""
+    id: uuid.UUID
+    time: datetime
+    x: float | None = None
+    y: float | None = None
+    z: float | None = None
+
+
+class InterpolationRequest(BaseModel):
+    """Times at which to evaluate the position of an entity."""
+    times: list[datetime]
+    method: Literal["linear", "cubic"] = "linear"
@@ -0,0 +1,21 @@
+import uuid
+from datetime import datetime
+from pydantic import BaseModel
+
+
+class Rollup(BaseModel):
+    """Summary of the positions of an entity over a period."""
+    id: uuid.UUID
+    start: datetime
+    seconds: int
+    samples: int
+    min_x: float
+    max_x: float
+    min_y: float
+    max_y: float
+    min_z: float
+    max_z: float
+    mean_x: float
+    mean_y: float
+    mean_z: float
+    distance: float
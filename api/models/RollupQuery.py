@@ -0,0 +1,10 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+
+class RollupQuery(BaseModel):
+    """Resolution and time bounds of a rollup request."""
+    resolution: int
+    start: datetime | None = None
+    end: datetime | None = None
+    limit: int | None = None
@@ -1,5 +1,5 @@
 from uuid import UUID
-from config.config import connect_to_db
+from config.config import connect_to_db, thread_connection
 
 connection, cursor = connect_to_db()
 
@@ -48,3 +48,45 @@ def create(planet: dict):
     except Exception as e:
         print(f"Erreur lors de la création de la planet: {e}")
         return None
+
+
+def find_planet_id(planet_name: str):
+    """Look up the id of a planet by name, on the connection of the calling thread.
+
+    Used by the ingest name resolution, which runs in worker threads.
+    Unlike the other lookups, errors are raised: a failed query must not
+    be mistaken for an unknown planet.
+
+    Returns:
+        str: The id of the planet, or None if there is none with this name.
+
+    Raises:
+        ConnectionError: If Postgres is unreachable.
+    """
+    conn = thread_connection()
+    if conn is None:
+        raise ConnectionError("No database connection")
+    with conn.cursor() as lookup_cursor:
+        lookup_cursor.execute("SELECT id FROM planets WHERE name = %s LIMIT 1",
+                              (str(planet_name),))
+        row = lookup_cursor.fetchone()
+    return row[0] if row else None
+
+
+def insert_planet(planet: dict):
+    """Insert a planet on the connection of the calling thread (see `find_planet_id`).
+
+    Raises:
+        ConnectionError: If Postgres is unreachable.
+    """
+    conn = thread_connection()
+    if conn is None:
+        raise ConnectionError("No database connection")
+    with conn.cursor() as insert_cursor:
+        insert_cursor.execute(
+            """
+            INSERT INTO planets (id, name)
+            VALUES (%s, %s)
+            """,
+            (str(planet['id']), str(planet['name']))
+        )
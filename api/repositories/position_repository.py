@@ -1,5 +1,10 @@
-from uuid import UUID
+import io
+import threading
+from datetime import datetime
+from uuid import UUID, uuid4
+from psycopg2.extras import execute_values
 from api.models.Position import Position
+from api.rollups import rollup_ctes
 
 from config.config import connect_to_db
 from config.config import get_logger
@@ -11,9 +16,115 @@ logger = get_logger()
 connection, cursor = connect_to_db()
 
 
+# Connection of the ingest write paths (batch writer, spool replay, bulk
+# loads). Request threads never use it, so their rollbacks and commits on
+# `connection` cannot abort or split an in-flight batch. Its transactions
+# are serialized by `writer_lock`.
+writer_connection = None
+writer_lock = threading.Lock()
+
+
+def connect_writer():
+    """Return the ingest writer connection, (re)connecting if it failed or was lost.
+
+    Must be called with `writer_lock` held. Lets the write paths recover
+    once Postgres is back.
+
+    Returns:
+        connection: The writer connection, or None if Postgres is unreachable.
+    """
+    global writer_connection
+    if writer_connection is None or writer_connection.closed:
+        logger.info("Connecting the ingest writer to the database.")
+        writer_connection, writer_cursor = connect_to_db()
+        if writer_cursor is not None:
+            writer_cursor.close()
+    return writer_connection
+
+
+def rollback(conn=None):
+    """Roll back the current transaction, ignoring a broken connection.
+
+    Args:
+        conn: The connection to roll back (the shared `connection` by default).
+    """
+    conn = connection if conn is None else conn
+    try:
+        if conn is not None and not conn.closed:
+            conn.rollback()
+    except Exception as e:
+        logger.error("Error rolling back: %s", e)
+
+
+# Keep the most recent row of each entity in `latest_positions`; an older
+# sample arriving late never replaces a newer one
+UPSERT_LATEST_POSITION = """
+    ON CONFLICT (id) DO UPDATE
+    SET x = EXCLUDED.x, y = EXCLUDED.y, z = EXCLUDED.z, time = EXCLUDED.time
+    WHERE latest_positions.time < EXCLUDED.time
+"""
+
+
+# Position history averaged over buckets of %s seconds, newest first
+HISTORY_BUCKETS = """
+    SELECT id, avg(x), avg(y), avg(z),
+           to_timestamp(floor(extract(epoch FROM time) / %s) * %s)
+               AT TIME ZONE 'UTC' AS bucket
+    FROM positions
+    WHERE id = %s
+      AND time >= COALESCE(%s, '-infinity'::timestamp)
+      AND time <= COALESCE(%s, 'infinity'::timestamp)
+      AND time < COALESCE(%s, 'infinity'::timestamp)
+    GROUP BY id, bucket
+    ORDER BY bucket DESC
+    LIMIT %s
+"""
+
+
+# Insert positions (from `source`, a VALUES list or a SELECT) and merge the
+# rows actually inserted into the rollup tables, in one statement. Returns
+# the number of inserted rows.
+INSERT_POSITIONS = """
+    WITH inserted AS (
+        INSERT INTO positions (id, x, y, z, time)
+        {source}
+        ON CONFLICT (id, time) DO NOTHING
+        RETURNING id, x, y, z, time
+    )""" + rollup_ctes("inserted").replace("{", "{{").replace("}", "}}") + """
+    SELECT count(*) FROM inserted
+"""
+
+
+def upsert_latest_positions(upsert_cursor, positions: list[Position]):
+    """Update `latest_positions` with the newest position of each entity in a batch.
+
+    Runs in the caller's transaction. Rows are sent in entity id order so
+    concurrent writers lock them in the same order.
+
+    Args:
+        upsert_cursor: The cursor of the transaction writing the positions.
+        positions (list[Position]): The positions being written.
+    """
+    latest: dict[UUID, Position] = {}
+    for position in positions:
+        current = latest.get(position.id)
+        if current is None or current.time < position.time:
+            latest[position.id] = position
+    execute_values(
+        upsert_cursor,
+        "INSERT INTO latest_positions (id, x, y, z, time) VALUES %s" + UPSERT_LATEST_POSITION,
+        [(str(position.id), position.x, position.y, position.z, position.time)
+         for _, position in sorted(latest.items(), key=lambda item: str(item[0]))],
+        page_size=len(latest)
+    )
+
+
 def get_position(id: UUID):
     """Retrieve the latest position for a given entity by ID.
 
+    Reads the single row maintained in `latest_positions`, whatever the size
+    of the history.
+
     Args:
         id (UUID): The unique identifier of the entity.
 
@@ -25,11 +136,9 @@ def get_position(id: UUID):
         logger.info("Fetching the latest position for entity ID: %s", id)
         cursor.execute(
             """
-            SELECT * 
-            FROM positions
+            SELECT id, x, y, z, time
+            FROM latest_positions
             WHERE id = %s
-            ORDER BY time DESC
-            LIMIT 1
             """,
             (str(id),)
         )
@@ -42,59 +151,612 @@ def get_position(id: UUID):
         return None
 
 
-def get_history_positions(id: UUID):
-    """Retrieve the position history for a given entity by ID.
+def get_latest_positions():
+    """Retrieve the latest position of every entity, with its kind.
+
+    Runs on a connection of its own, closed afterwards: the spatial index
+    reloads from a background thread, which must not share the module-level
+    cursor with the request handlers.
+
+    Returns:
+        list: (id, x, y, z, time, kind) tuples, kind being "ship", "planet"
+            or None for an unknown entity.
+        []: If an error occurs.
+    """
+    latest_connection, latest_cursor = connect_to_db()
+    if latest_connection is None:
+        logger.error("Cannot retrieve the latest positions: no connection")
+        return []
+    try:
+        logger.info("Fetching the latest position of every entity")
+        latest_cursor.execute(
+            """
+            SELECT l.id, l.x, l.y, l.z, l.time,
+                   CASE WHEN s.id IS NOT NULL THEN 'ship'
+                        WHEN p.id IS NOT NULL THEN 'planet' END
+            FROM latest_positions l
+            LEFT JOIN ships s ON s.id = l.id
+            LEFT JOIN planets p ON p.id = l.id
+            """
+        )
+        return latest_cursor.fetchall()
+    except Exception as e:
+        logger.error("Error retrieving the latest positions: %s", e)
+        return []
+    finally:
+        latest_connection.close()
+
+
+def get_history_positions(id: UUID, since: datetime = None, until: datetime = None,
+                          before: datetime = None, limit: int = None):
+    """Retrieve a page of the position history for a given entity by ID.
+
+    Rows are read newest first along the (id, time) primary key, so a page
+    costs the same wherever it starts in the history.
 
     Args:
         id (UUID): The unique identifier of the entity.
+        since (datetime): Only return positions at or after this time.
+        until (datetime): Only return positions at or before this time.
+        before (datetime): Only return positions strictly before this time
+            (the continuation point of the previous page).
+        limit (int): Maximum number of positions to return.
 
     Returns:
-        list: A list of all position entries for the entity.
+        list: The position entries, newest first.
         []: If no positions are found or an error occurs.
     """
     try:
         logger.info("Fetching position history for entity ID: %s", id)
         cursor.execute(
             """
-            SELECT * 
+            SELECT id, x, y, z, time
             FROM positions
             WHERE id = %s
+              AND time >= COALESCE(%s, '-infinity'::timestamp)
+              AND time <= COALESCE(%s, 'infinity'::timestamp)
+              AND time < COALESCE(%s, 'infinity'::timestamp)
             ORDER BY time DESC
+            LIMIT %s
             """,
-            (str(id),)
+            (str(id), since, until, before, limit)
         )
         results = cursor.fetchall()
         logger.debug(
-            "Position history retrieved for entity ID %s: %s", id, results)
+            "Position history retrieved for entity ID %s: %d rows", id, len(results))
         return results
     except Exception as e:
+        rollback()
         logger.error("Error retrieving position history for ID %s: %s", id, e)
         return []
 
 
+def get_bracketing_positions(id: UUID, times: list[datetime], neighbours: int = 1):
+    """Retrieve the samples around each of a list of times, in one round trip.
+
+    For every time, the `neighbours` samples at or before it and the
+    `neighbours` samples after it are found with index lookups on
+    `(id, time)`, whatever the size of the history.
+
+    Args:
+        id (UUID): The unique identifier of the entity.
+        times (list[datetime]): The times to bracket.
+        neighbours (int): Number of samples wanted on each side.
+
+    Returns:
+        list: (index of the time, x, y, z, time) tuples, ordered by index then time.
+        None: If an error occurs.
+    """
+    try:
+        logger.info("Fetching samples around %d times for entity ID: %s", len(times), id)
+        cursor.execute(
+            """
+            SELECT q.n - 1, s.x, s.y, s.z, s.time
+            FROM unnest(%s::timestamp[]) WITH ORDINALITY AS q(t, n)
+            CROSS JOIN LATERAL (
+                (SELECT x, y, z, time FROM positions
+                 WHERE id = %s AND time <= q.t ORDER BY time DESC LIMIT %s)
+                UNION ALL
+                (SELECT x, y, z, time FROM positions
+                 WHERE id = %s AND time > q.t ORDER BY time LIMIT %s)
+            ) s
+            ORDER BY q.n, s.time
+            """,
+            (times, str(id), neighbours, str(id), neighbours)
+        )
+        return cursor.fetchall()
+    except Exception as e:
+        rollback()
+        logger.error("Error retrieving samples around times for ID %s: %s", id, e)
+        return None
+
+
+def stream_history_positions(id: UUID, since: datetime = None, until: datetime = None,
+                             before: datetime = None, limit: int = None, chunk_size: int = 5000,
+                             bucket_seconds: float = None):
+    """Stream the position history of an entity in chunks from a server-side cursor.
+
+    The rows are read through a named cursor on a dedicated connection, so
+    only `chunk_size` rows are held in memory at a time and the shared
+    connection is not kept busy while the result is being sent.
+
+    The connection is opened and the query started before returning, so a
+    stream that cannot start is reported as None. An error while reading
+    the rows is raised from the iterator, so the response is aborted
+    instead of ending early as if complete.
+
+    Args:
+        id (UUID): The unique identifier of the entity.
+        since (datetime): Only return positions at or after this time.
+        until (datetime): Only return positions at or before this time.
+        before (datetime): Only return positions strictly before this time.
+        limit (int): Maximum number of positions (or buckets) to return.
+        chunk_size (int): Number of rows fetched per round trip.
+        bucket_seconds (float): Stream averages over buckets of this many
+            seconds instead of the raw positions (see `get_history_buckets`).
+
+    Returns:
+        Iterator[list]: Chunks of (id, x, y, z, time) rows, newest first.
+        None: If the connection or the query failed.
+    """
+    stream_connection, stream_cursor = connect_to_db()
+    if stream_connection is None:
+        logger.error("Cannot stream position history for ID %s: no connection", id)
+        return None
+    stream_cursor.close()
+    try:
+        logger.info("Streaming position history for entity ID: %s", id)
+        named_cursor = stream_connection.cursor(name=f"history_{uuid4().hex}")
+        named_cursor.itersize = chunk_size
+        if bucket_seconds:
+            named_cursor.execute(
+                HISTORY_BUCKETS,
+                (bucket_seconds, bucket_seconds, str(id), since, until, before, limit)
+            )
+        else:
+            named_cursor.execute(
+                """
+                SELECT id, x, y, z, time
+                FROM positions
+                WHERE id = %s
+                  AND time >= COALESCE(%s, '-infinity'::timestamp)
+                  AND time <= COALESCE(%s, 'infinity'::timestamp)
+                  AND time < COALESCE(%s, 'infinity'::timestamp)
+                ORDER BY time DESC
+                LIMIT %s
+                """,
+                (str(id), since, until, before, limit)
+            )
+    except Exception as e:
+        stream_connection.close()
+        logger.error("Error streaming position history for ID %s: %s", id, e)
+        return None
+    return _fetch_chunks(stream_connection, named_cursor, id, chunk_size)
+
+
+def _fetch_chunks(stream_connection, named_cursor, id: UUID, chunk_size: int):
+    try:
+        while rows := named_cursor.fetchmany(chunk_size):
+            yield rows
+    except Exception as e:
+        logger.error("Error streaming position history for ID %s: %s", id, e)
+        raise
+    finally:
+        stream_connection.close()
+
+
+def get_history_columns(id: UUID, since: datetime = None, until: datetime = None,
+                        before: datetime = None, limit: int = None, bucket_seconds: float = None):
+    """Retrieve the position history of an entity as packed binary columns.
+
+    Postgres concatenates the binary (big-endian) representation of every
+    value into one bytea per column, so no Python object is created per row.
+    Rows are in time order (the newest `limit` ones when a limit is given).
+    Times are milliseconds since the epoch: the stored timestamps are naive
+    local times, read in the time zone of the session (`TimeZone`).
+
+    Args:
+        id (UUID): The unique identifier of the entity.
+        since (datetime): Only return positions at or after this time.
+        until (datetime): Only return positions at or before this time.
+        before (datetime): Only return positions strictly before this time.
+        limit (int): Maximum number of positions (or buckets) to return.
+        bucket_seconds (float): Return averages over buckets of this many
+            seconds instead of the raw positions (see `get_history_buckets`).
+
+    Returns:
+        tuple: (count, x, y, z, time) with float64 / int64 big-endian columns.
+        None: If an error occurs.
+    """
+    if bucket_seconds:
+        page = HISTORY_BUCKETS
+        params = (bucket_seconds, bucket_seconds, str(id), since, until, before, limit)
+    else:
+        page = """
+            SELECT id, x, y, z, time
+            FROM positions
+            WHERE id = %s
+              AND time >= COALESCE(%s, '-infinity'::timestamp)
+              AND time <= COALESCE(%s, 'infinity'::timestamp)
+              AND time < COALESCE(%s, 'infinity'::timestamp)
+            ORDER BY time DESC
+            LIMIT %s
+        """
+        params = (str(id), since, until, before, limit)
+    try:
+        logger.info("Fetching position history columns for entity ID: %s", id)
+        cursor.execute(
+            f"""
+            SELECT count(*),
+                   COALESCE(string_agg(float8send(x), '' ORDER BY time), ''),
+                   COALESCE(string_agg(float8send(y), '' ORDER BY time), ''),
+                   COALESCE(string_agg(float8send(z), '' ORDER BY time), ''),
+                   COALESCE(string_agg(int8send((extract(
+                       epoch FROM time AT TIME ZONE current_setting('TimeZone')) * 1000)::bigint),
+                       '' ORDER BY time), '')
+            FROM ({page}) page (id, x, y, z, time)
+            """,
+            params
+        )
+        count, xs, ys, zs, times = cursor.fetchone()
+        return count, bytes(xs), bytes(ys), bytes(zs), bytes(times)
+    except Exception as e:
+        rollback()
+        logger.error("Error retrieving position columns for ID %s: %s", id, e)
+        return None
+
+
+def get_trajectory_kinematics(id: UUID, since: datetime = None, until: datetime = None,
+                              before: datetime = None, limit: int = None,
+                              moving_speed: float = 0.0, resolution: float = None,
+                              max_periods: int = None):
+    """Compute the kinematics of an entity over a history window, in SQL.
+
+    Consecutive samples are differenced with lag() window functions into
+    segments (duration, displacement, velocity, speed), and consecutive
+    segments into accelerations, then aggregated over the whole window and,
+    with `resolution`, over periods of that many seconds. A segment (and the
+    acceleration at its first sample) belongs to the period its first
+    sample falls in. Segments of zero duration have no velocity.
+
+    Args:
+        id (UUID): The unique identifier of the entity.
+        since (datetime): Only use positions at or after this time.
+        until (datetime): Only use positions at or before this time.
+        before (datetime): Only use positions strictly before this time.
+        limit (int): Only use the newest `limit` positions of the window.
+        moving_speed (float): Speed above which a segment counts as motion.
+        resolution (float): Width of the periods, in seconds.
+        max_periods (int): Maximum number of periods to return (the newest).
+
+    Returns:
+        list: The summary row (None, samples, duration, path length,
+            displacement, max speed, max acceleration, time in motion)
+            followed, with a resolution, by one row per period (start epoch
+            seconds, duration, distance, dx, dy, dz, max speed, max
+            acceleration, time in motion), newest first.
+        None: If an error occurs.
+    """
+    try:
+        logger.info("Computing trajectory kinematics for entity ID: %s", id)
+        cursor.execute(
+            """
+            WITH samples AS (
+                SELECT x, y, z, time
+                FROM positions
+                WHERE id = %(id)s
+                  AND time >= COALESCE(%(since)s, '-infinity'::timestamp)
+                  AND time <= COALESCE(%(until)s, 'infinity'::timestamp)
+                  AND time < COALESCE(%(before)s, 'infinity'::timestamp)
+                ORDER BY time DESC
+                LIMIT %(limit)s
+            ), steps AS (
+                SELECT time, x, y, z,
+                       lag(time) OVER w AS start,
+                       extract(epoch FROM time - lag(time) OVER w)::float8 AS dt,
+                       x - lag(x) OVER w AS dx, y - lag(y) OVER w AS dy, z - lag(z) OVER w AS dz
+                FROM samples
+                WINDOW w AS (ORDER BY time)
+            ), velocities AS (
+                SELECT *, sqrt(dx ^ 2 + dy ^ 2 + dz ^ 2) AS distance,
+                       CASE WHEN dt > 0 THEN dx / dt END AS vx,
+                       CASE WHEN dt > 0 THEN dy / dt END AS vy,
+                       CASE WHEN dt > 0 THEN dz / dt END AS vz,
+                       CASE WHEN dt > 0 THEN sqrt(dx ^ 2 + dy ^ 2 + dz ^ 2) / dt
+                            WHEN dt = 0 THEN 0 END AS speed
+                FROM steps
+            ), segments AS (
+                SELECT *, sqrt((vx - lag(vx) OVER w) ^ 2 + (vy - lag(vy) OVER w) ^ 2
+                               + (vz - lag(vz) OVER w) ^ 2) / ((dt + lag(dt) OVER w) / 2) AS acceleration
+                FROM velocities
+                WINDOW w AS (ORDER BY time)
+            )
+            SELECT NULL::float8, count(*), COALESCE(extract(epoch FROM max(time) - min(time))::float8, 0),
+                   COALESCE(sum(distance), 0),
+                   COALESCE(sqrt(((array_agg(x ORDER BY time DESC))[1] - (array_agg(x ORDER BY time))[1]) ^ 2
+                                 + ((array_agg(y ORDER BY time DESC))[1] - (array_agg(y ORDER BY time))[1]) ^ 2
+                                 + ((array_agg(z ORDER BY time DESC))[1] - (array_agg(z ORDER BY time))[1]) ^ 2), 0),
+                   NULL::float8, NULL::float8, NULL::float8,
+                   max(speed), max(acceleration),
+                   COALESCE(sum(dt) FILTER (WHERE speed > %(moving_speed)s), 0)
+            FROM segments
+            UNION ALL
+            (
+                SELECT (floor(extract(epoch FROM start) / %(resolution)s) * %(resolution)s)::float8 AS period,
+                       NULL, sum(dt), sum(distance), NULL,
+                       sum(dx) FILTER (WHERE dt > 0), sum(dy) FILTER (WHERE dt > 0),
+                       sum(dz) FILTER (WHERE dt > 0),
+                       max(speed), max(acceleration),
+                       COALESCE(sum(dt) FILTER (WHERE speed > %(moving_speed)s), 0)
+                FROM segments
+                WHERE start IS NOT NULL AND %(resolution)s IS NOT NULL
+                GROUP BY period
+                ORDER BY period DESC
+                LIMIT %(max_periods)s
+            )
+            """,
+            {"id": str(id), "since": since, "until": until, "before": before, "limit": limit,
+             "moving_speed": moving_speed, "resolution": resolution, "max_periods": max_periods}
+        )
+        return cursor.fetchall()
+    except Exception as e:
+        rollback()
+        logger.error("Error computing trajectory kinematics for ID %s: %s", id, e)
+        return None
+
+
+def get_history_buckets(id: UUID, bucket_seconds: float, since: datetime = None,
+                        until: datetime = None, before: datetime = None, limit: int = None):
+    """Retrieve the position history averaged over fixed time buckets.
+
+    The aggregation runs in Postgres, so only one row per bucket is sent back.
+    Buckets are aligned on multiples of `bucket_seconds` since the epoch.
+
+    Args:
+        id (UUID): The unique identifier of the entity.
+        bucket_seconds (float): Width of the buckets in seconds.
+        since (datetime): Only use positions at or after this time.
+        until (datetime): Only use positions at or before this time.
+        before (datetime): Only return buckets starting strictly before this time.
+        limit (int): Maximum number of buckets to return.
+
+    Returns:
+        list: (id, x, y, z, bucket start) rows, newest first.
+        []: If no positions are found or an error occurs.
+    """
+    try:
+        logger.info("Fetching position history of entity ID %s in %ss buckets",
+                    id, bucket_seconds)
+        cursor.execute(
+            HISTORY_BUCKETS,
+            (bucket_seconds, bucket_seconds, str(id), since, until, before, limit)
+        )
+        return cursor.fetchall()
+    except Exception as e:
+        rollback()
+        logger.error("Error retrieving position buckets for ID %s: %s", id, e)
+        return []
+
+
+def get_history_bounds(id: UUID, since: datetime = None, until: datetime = None):
+    """Count the positions of an entity in a time window.
+
+    Args:
+        id (UUID): The unique identifier of the entity.
+        since (datetime): Start of the window.
+        until (datetime): End of the window.
+
+    Returns:
+        tuple: (count, oldest time, newest time).
+        None: If an error occurs.
+    """
+    try:
+        cursor.execute(
+            """
+            SELECT count(*), min(time), max(time)
+            FROM positions
+            WHERE id = %s
+              AND time >= COALESCE(%s, '-infinity'::timestamp)
+              AND time <= COALESCE(%s, 'infinity'::timestamp)
+            """,
+            (str(id), since, until)
+        )
+        return cursor.fetchone()
+    except Exception as e:
+        rollback()
+        logger.error("Error counting positions for ID %s: %s", id, e)
+        return None
+
+
 def add_position(position: Position):
     """Insert a new position entry into the `positions` table.
 
+    A position already stored for the same entity and time is left untouched.
+    `latest_positions` and the rollup tables are updated in the same
+    transaction.
+
     Args:
         position (Position): The position details to insert.
 
     Returns:
-        int: The number of rows inserted (1 if successful).
+        int: The number of rows inserted (1 if inserted, 0 if already present).
         None: If an error occurs.
     """
     try:
         logger.info("Inserting a new position for entity ID: %s", position.id)
         cursor.execute(
-            """
-            INSERT INTO positions (id, x, y, z, time)
-            VALUES (%s, %s, %s, %s, %s)
-            """,
+            INSERT_POSITIONS.format(source="VALUES (%s, %s, %s, %s, %s)"),
             (str(position.id), position.x, position.y, position.z, position.time)
         )
+        rowcount = cursor.fetchone()[0]
+        upsert_latest_positions(cursor, [position])
         connection.commit()
         logger.info(
             "Position inserted successfully for entity ID: %s", position.id)
-        return cursor.rowcount
+        return rowcount
     except Exception as e:
+        rollback()
         logger.error("Error inserting position for ID %s: %s", position.id, e)
         return None
+
+
+def add_positions(positions: list[Position], offsets_group: str = None, offsets: dict = None):
+    """Insert a batch of position entries into the `positions` table.
+
+    All rows are sent in a single multi-row INSERT and committed once, along
+    with the `latest_positions` and rollup updates. Rows already stored for the same
+    entity and time are skipped, so redelivered or replayed data does not
+    abort the batch.
+
+    When `offsets` is given, the consumer offsets of `offsets_group` are
+    saved in the same transaction, so they are stored if and only if the
+    positions are.
+
+    The batch runs on the dedicated writer connection.
+
+    Args:
+        positions (list[Position]): The positions to insert.
+        offsets_group (str): The consumer group the offsets belong to.
+        offsets (dict): The next offset to read, keyed by (topic, partition).
+
+    Returns:
+        int: The number of rows inserted (duplicates excluded).
+        None: If an error occurs (the whole batch is rolled back).
+    """
+    with writer_lock:
+        return _add_positions(connect_writer(), positions, offsets_group, offsets)
+
+
+def _add_positions(writer, positions: list[Position], offsets_group: str, offsets: dict):
+    if writer is None:
+        logger.error("Batch of %d positions not inserted: no database connection",
+                     len(positions))
+        return None
+    try:
+        logger.info("Inserting a batch of %d positions", len(positions))
+        rowcount = 0
+        with writer.cursor() as batch_cursor:
+            if positions:
+                rowcount = execute_values(
+                    batch_cursor,
+                    INSERT_POSITIONS.format(source="VALUES %s"),
+                    [(str(position.id), position.x, position.y, position.z, position.time)
+                     for position in positions],
+                    page_size=len(positions),
+                    fetch=True
+                )[0][0]
+                upsert_latest_positions(batch_cursor, positions)
+            if offsets:
+                execute_values(
+                    batch_cursor,
+                    """
+                    INSERT INTO consumer_offsets (group_id, topic, partition, next_offset)
+                    VALUES %s
+                    ON CONFLICT (group_id, topic, partition)
+                    DO UPDATE SET next_offset = EXCLUDED.next_offset
+                    """,
+                    [(offsets_group, topic, partition, next_offset)
+                     for (topic, partition), next_offset in offsets.items()]
+                )
+        writer.commit()
+        logger.info("Batch of %d positions inserted successfully", rowcount)
+        return rowcount
+    except Exception as e:
+        rollback(writer)
+        logger.error("Error inserting batch of %d positions: %s",
+                     len(positions), e)
+        return None
+
+
+def get_consumer_offsets(group_id: str):
+    """Retrieve the offsets stored for a consumer group.
+
+    Args:
+        group_id (str): The consumer group.
+
+    Returns:
+        list: (topic, partition, next_offset) tuples.
+        []: If none are stored or an error occurs.
+    """
+    try:
+        with connection.cursor() as offsets_cursor:
+            offsets_cursor.execute(
+                """
+                SELECT topic, partition, next_offset
+                FROM consumer_offsets
+                WHERE group_id = %s
+                """,
+                (group_id,)
+            )
+            return offsets_cursor.fetchall()
+    except Exception as e:
+        rollback()
+        logger.error("Error retrieving offsets of group %s: %s", group_id, e)
+        return []
+
+
+def bulk_load_positions(positions: list[Position], durable: bool = False):
+    """Load a large batch of positions through a staging table.
+
+    Rows are streamed with COPY into an index-free temporary table, then
+    merged into `positions` with a single INSERT ... SELECT, so index
+    maintenance happens once per batch; the rollups and `latest_positions`
+    are updated in the same transaction. Unless `durable` is set, commits
+    are asynchronous (`synchronous_commit = off`): this is meant for
+    replays, which can safely be run again since already stored rows are
+    skipped. Callers deleting their copy of the rows once loaded (the
+    spool) must ask for a durable commit. The batch runs on the dedicated
+    writer connection.
+
+    Args:
+        positions (list[Position]): The positions to load.
+        durable (bool): Keep synchronous commits.
+
+    Returns:
+        int: The number of rows inserted (duplicates excluded).
+        None: If an error occurs (the whole batch is rolled back).
+    """
+    with writer_lock:
+        return _bulk_load_positions(connect_writer(), positions, durable)
+
+
+def _bulk_load_positions(writer, positions: list[Position], durable: bool):
+    if writer is None:
+        logger.error("Batch of %d positions not loaded: no database connection",
+                     len(positions))
+        return None
+    try:
+        logger.info("Bulk loading a batch of %d positions", len(positions))
+        buffer = io.StringIO()
+        for position in positions:
+            buffer.write(f"{position.id}\t{position.x!r}\t{position.y!r}\t"
+                         f"{position.z!r}\t{position.time.isoformat()}\n")
+        buffer.seek(0)
+        with writer.cursor() as bulk_cursor:
+            if not durable:
+                bulk_cursor.execute("SET LOCAL synchronous_commit = off")
+            bulk_cursor.execute(
+                """
+                CREATE TEMP TABLE IF NOT EXISTS positions_staging
+                (LIKE positions) ON COMMIT DELETE ROWS
+                """
+            )
+            bulk_cursor.copy_expert(
+                "COPY positions_staging (id, x, y, z, time) FROM STDIN", buffer)
+            bulk_cursor.execute(INSERT_POSITIONS.format(
+                source="SELECT id, x, y, z, time FROM positions_staging"))
+            rowcount = bulk_cursor.fetchone()[0]
+            bulk_cursor.execute(
+                """
+                INSERT INTO latest_positions (id, x, y, z, time)
+                SELECT DISTINCT ON (id) id, x, y, z, time FROM positions_staging
+                ORDER BY id, time DESC
+                """ + UPSERT_LATEST_POSITION
+            )
+        writer.commit()
+        logger.info("Bulk loaded %d positions", rowcount)
+        return rowcount
+    except Exception as e:
+        rollback(writer)
+        logger.error("Error bulk loading %d positions: %s", len(positions), e)
+        return None
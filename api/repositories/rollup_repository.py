@@ -0,0 +1,116 @@
+from datetime import datetime
+from uuid import UUID
+
+from api.rollups import AGGREGATE_QUERY, REPLACE_ROLLUP, ROLLUP_COLUMNS, rollup_table
+from config.config import connect_to_db
+from config.config import get_logger
+
+logger = get_logger()
+
+
+# Establish database connection
+connection, cursor = connect_to_db()
+
+
+def get_rollups(id: UUID, resolution: str, period_seconds: int, since: datetime = None,
+                until: datetime = None, limit: int = None):
+    """Retrieve the summaries of an entity over periods, from a rollup table.
+
+    Buckets of the rollup are merged into periods of `period_seconds`, which
+    must be a multiple of the rollup resolution.
+
+    Args:
+        id (UUID): The unique identifier of the entity.
+        resolution (str): The rollup to read (a key of `ROLLUPS`).
+        period_seconds (int): Width of the returned periods.
+        since (datetime): Only return periods containing buckets at or after this time.
+        until (datetime): Only return periods containing buckets at or before this time.
+        limit (int): Maximum number of periods to return.
+
+    Returns:
+        list: (period start, samples, min_x, max_x, min_y, max_y, min_z, max_z,
+            mean_x, mean_y, mean_z, distance) rows, newest first.
+        []: If no rollups are found or an error occurs.
+    """
+    try:
+        logger.info("Fetching %ss rollups of entity ID %s from the %s rollup",
+                    period_seconds, id, resolution)
+        cursor.execute(
+            f"""
+            SELECT to_timestamp(floor(extract(epoch FROM bucket) / %s) * %s)
+                       AT TIME ZONE 'UTC' AS period,
+                   sum(samples), min(min_x), max(max_x), min(min_y), max(max_y),
+                   min(min_z), max(max_z),
+                   sum(sum_x) / sum(samples), sum(sum_y) / sum(samples), sum(sum_z) / sum(samples),
+                   sum(distance)
+            FROM {rollup_table(resolution)}
+            WHERE id = %s
+              AND bucket >= date_trunc('{resolution}', COALESCE(%s, '-infinity'::timestamp))
+              AND bucket <= COALESCE(%s, 'infinity'::timestamp)
+            GROUP BY period
+            ORDER BY period DESC
+            LIMIT %s
+            """,
+            (period_seconds, period_seconds, str(id), since, until, limit)
+        )
+        return cursor.fetchall()
+    except Exception as e:
+        connection.rollback()
+        logger.error("Error retrieving rollups for ID %s: %s", id, e)
+        return []
+
+
+def rebuild_rollups(resolution: str, since: datetime, until: datetime, id: UUID = None):
+    """Recompute a rollup from the raw positions over a time range.
+
+    Every bucket overlapping [since, until] is deleted and aggregated again,
+    in a single transaction. Rebuilt buckets are upserted: an ingest
+    committing between the delete and the insert may have recreated some.
+
+    Args:
+        resolution (str): The rollup to rebuild (a key of `ROLLUPS`).
+        since (datetime): Start of the range.
+        until (datetime): End of the range.
+        id (UUID): Only rebuild the buckets of this entity.
+
+    Returns:
+        int: The number of buckets written.
+        None: If an error occurs (nothing is changed).
+    """
+    try:
+        logger.info("Rebuilding the %s rollup from %s to %s", resolution, since, until)
+        entity = str(id) if id else None
+        bounds = (since, until, entity, entity)
+        with connection.cursor() as rebuild_cursor:
+            rebuild_cursor.execute(
+                f"""
+                DELETE FROM {rollup_table(resolution)}
+                WHERE bucket >= date_trunc('{resolution}', %s::timestamp)
+                  AND bucket < date_trunc('{resolution}', %s::timestamp) + interval '1 {resolution}'
+                  AND (%s::uuid IS NULL OR id = %s::uuid)
+                """,
+                bounds
+            )
+            rebuild_cursor.execute(
+                f"""
+                WITH rebuilt AS (
+                    SELECT id, x, y, z, time
+                    FROM positions
+                    WHERE time >= date_trunc('{resolution}', %s::timestamp)
+                      AND time < date_trunc('{resolution}', %s::timestamp) + interval '1 {resolution}'
+                      AND (%s::uuid IS NULL OR id = %s::uuid)
+                )
+                INSERT INTO {rollup_table(resolution)} {ROLLUP_COLUMNS}
+                {AGGREGATE_QUERY.format(resolution=resolution, source="rebuilt")}
+                {REPLACE_ROLLUP}
+                """,
+                bounds
+            )
+            rowcount = rebuild_cursor.rowcount
+        connection.commit()
+        logger.info("Rebuilt %d %s rollup buckets", rowcount, resolution)
+        return rowcount
+    except Exception as e:
+        connection.rollback()
+        logger.error("Error rebuilding the %s rollup: %s", resolution, e)
+        return None
@@ -1,5 +1,5 @@
 from uuid import UUID
-from config.config import connect_to_db
+from config.config import connect_to_db, thread_connection
 
 connection, cursor = connect_to_db()
 
@@ -66,3 +66,26 @@ def get_ships_by_owner(owner: UUID):
     except Exception as e:
         print(f"Erreur lors de la recherche du vaisseau par propriétaire: {e}")
         return None
+
+
+def find_ship_id(ship_name: str):
+    """Look up the id of a ship by name, on the connection of the calling thread.
+
+    Used by the ingest name resolution, which runs in worker threads.
+    Unlike the other lookups, errors are raised: a failed query must not
+    be mistaken for an unknown ship.
+
+    Returns:
+        str: The id of the ship, or None if there is none with this name.
+
+    Raises:
+        ConnectionError: If Postgres is unreachable.
+    """
+    conn = thread_connection()
+    if conn is None:
+        raise ConnectionError("No database connection")
+    with conn.cursor() as lookup_cursor:
+        lookup_cursor.execute("SELECT id FROM ships WHERE name = %s LIMIT 1",
+                              (str(ship_name),))
+        row = lookup_cursor.fetchone()
+    return row[0] if row else None
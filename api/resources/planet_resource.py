@@ -1,14 +1,28 @@
 from uuid import UUID
 from typing import List
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Request, Response, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+from api.dependancies import analytics_query, auth_required, history_query, interpolation_times, local_time, rollup_query
+from api.exceptions import InvalidCursorException, UnencodableTrajectoryException, UnsupportedResolutionException
 
 from api.models.Planet import Planet
-from api.models.Position import Position
-from api.services import planet_service, position_service
-from config.config import get_logger
+from api.models.Analytics import AnalyticsQuery, TrajectoryAnalytics
+from api.models.HistoryQuery import HistoryQuery
+from api.models.IngestResult import IngestResult
+from api.models.Position import InterpolatedPosition, InterpolationRequest, Position
+from api.models.Rollup import Rollup
+from api.models.RollupQuery import RollupQuery
+from api.services import planet_service, position_service, rollup_service
+from config.config import HISTORY_MAX_LIMIT, get_logger
+from api.ingest import ingest_stream
 
 logger = get_logger()
 
+NDJSON = "application/x-ndjson"
+NPZ = "application/x-npz"
+TRAJECTORY = "application/x-trajectory"
+
 router = APIRouter(
     prefix="/planets",
     tags=["Planet"]
@@ -121,35 +135,85 @@ def get_planet_position_by_name(planet_name: str) -> Position:
 
 
 @router.get("/positions/{planet_id}", response_model=List[Position], summary="Retrieve a planet's position history by ID")
-def get_planet_history_positions(planet_id: UUID) -> List[Position]:
-    """Fetch the position history of a specific planet by its unique ID.
+def get_planet_history_positions(
+        planet_id: UUID,
+        request: Request,
+        response: Response,
+        query: HistoryQuery = Depends(history_query)) -> List[Position]:
+    """Fetch a page of the position history of a specific planet by its unique ID.
+
+    Positions are returned newest first. When more positions match, the
+    cursor of the next page is returned in the `X-Next-Cursor` header.
+    With `Accept: application/x-ndjson`, the positions are streamed as NDJSON
+    instead. With `Accept: application/x-npz` they are exported as columnar
+    arrays, and with `Accept: application/x-trajectory` in the compact
+    quantized format (see `api.trajectory`). None of these formats has a
+    default limit.
 
     Args:
         planet_id (UUID): The unique identifier of the planet.
+        request (Request): The HTTP request, whose Accept header selects the format.
+        response (Response): The HTTP response, carrying the next page cursor.
+        query (HistoryQuery): Time bounds, page size and continuation cursor.
 
     Returns:
         List[Position]: The position history of the planet.
 
     Raises:
-        HTTPException: If the planet is not found.
+        HTTPException: If the planet is not found or the cursor is invalid.
     """
     logger.info("Fetching position history for planet with ID: %s", planet_id)
     planet = planet_service.get_planet(planet_id)
     if not planet:
         logger.warning("Planet with ID %s not found.", planet_id)
         raise HTTPException(status_code=404, detail="Planet not found")
-    positions = position_service.get_history_positions(planet_id)
+    try:
+        accept = request.headers.get("accept", "")
+        if NDJSON in accept:
+            chunks = position_service.stream_history(planet_id, query)
+            if chunks is None:
+                raise HTTPException(status_code=500, detail="Position history could not be read")
+            return StreamingResponse(chunks, media_type=NDJSON)
+        if NPZ in accept or TRAJECTORY in accept:
+            export = (position_service.export_history_columns if NPZ in accept
+                      else position_service.export_trajectory)
+            content = export(planet_id, query)
+            if content is None:
+                raise HTTPException(status_code=500, detail="Position history could not be read")
+            return Response(content, media_type=NPZ if NPZ in accept else TRAJECTORY)
+        positions, next_cursor = position_service.get_history_page(planet_id, query)
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnencodableTrajectoryException as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     logger.debug("Position history retrieved for planet ID %s: %s",
                  planet_id, positions)
     return positions
 
 
 @router.get("/positions/name/{planet_name}", response_model=List[Position], summary="Retrieve a planet's position history by name")
-def get_planet_history_position_by_name(planet_name: str) -> List[Position]:
-    """Fetch the position history of a specific planet by its name.
+def get_planet_history_position_by_name(
+        planet_name: str,
+        request: Request,
+        response: Response,
+        query: HistoryQuery = Depends(history_query)) -> List[Position]:
+    """Fetch a page of the position history of a specific planet by its name.
+
+    Positions are returned newest first. When more positions match, the
+    cursor of the next page is returned in the `X-Next-Cursor` header.
+    With `Accept: application/x-ndjson`, the positions are streamed as NDJSON
+    instead. With `Accept: application/x-npz` they are exported as columnar
+    arrays, and with `Accept: application/x-trajectory` in the compact
+    quantized format (see `api.trajectory`). None of these formats has a
+    default limit.
 
     Args:
         planet_name (str): The name of the planet.
+        request (Request): The HTTP request, whose Accept header selects the format.
+        response (Response): The HTTP response, carrying the next page cursor.
+        query (HistoryQuery): Time bounds, page size and continuation cursor.
 
     Returns:
         List[Position]: The position history of the planet.
@@ -163,7 +227,276 @@ def get_planet_history_position_by_name(planet_name: str) -> List[Position]:
     if not planet:
         logger.warning("Planet with name %s not found.", planet_name)
         raise HTTPException(status_code=404, detail="Planet not found")
-    positions = position_service.get_history_positions(planet.id)
+    try:
+        accept = request.headers.get("accept", "")
+        if NDJSON in accept:
+            chunks = position_service.stream_history(planet.id, query)
+            if chunks is None:
+                raise HTTPException(status_code=500, detail="Position history could not be read")
+            return StreamingResponse(chunks, media_type=NDJSON)
+        if NPZ in accept or TRAJECTORY in accept:
+            export = (position_service.export_history_columns if NPZ in accept
+                      else position_service.export_trajectory)
+            content = export(planet.id, query)
+            if content is None:
+                raise HTTPException(status_code=500, detail="Position history could not be read")
+            return Response(content, media_type=NPZ if NPZ in accept else TRAJECTORY)
+        positions, next_cursor = position_service.get_history_page(planet.id, query)
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnencodableTrajectoryException as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     logger.debug("Position history retrieved for planet name %s: %s",
                  planet_name, positions)
     return positions
+
+
+@router.get("/position/at/{planet_id}", response_model=List[InterpolatedPosition],
+            summary="Retrieve a planet's position at given times by ID")
+def get_planet_position_at(
+        planet_id: UUID,
+        query: InterpolationRequest = Depends(interpolation_times)) -> List[InterpolatedPosition]:
+    """Interpolate the position of a specific planet by its unique ID at given times.
+
+    The samples around each time are found with index lookups, then
+    interpolated linearly or with a cubic spline (`method`). Times outside
+    the history get no coordinates.
+
+    Args:
+        planet_id (UUID): The unique identifier of the planet.
+        query (InterpolationRequest): The times (`time`, repeatable) and the method.
+
+    Returns:
+        List[InterpolatedPosition]: One position per requested time, in order.
+
+    Raises:
+        HTTPException: If the planet is not found.
+    """
+    logger.info("Interpolating positions for planet with ID: %s", planet_id)
+    planet = planet_service.get_planet(planet_id)
+    if not planet:
+        logger.warning("Planet with ID %s not found.", planet_id)
+        raise HTTPException(status_code=404, detail="Planet not found")
+    positions = position_service.interpolate_positions(planet_id, query.times, query.method)
+    if positions is None:
+        raise HTTPException(status_code=500, detail="Position history could not be read")
+    return positions
+
+
+@router.get("/position/at/name/{planet_name}", response_model=List[InterpolatedPosition],
+            summary="Retrieve a planet's position at given times by name")
+def get_planet_position_at_by_name(
+        planet_name: str,
+        query: InterpolationRequest = Depends(interpolation_times)) -> List[InterpolatedPosition]:
+    """Interpolate the position of a specific planet by its name at given times.
+
+    See `get_planet_position_at`.
+
+    Args:
+        planet_name (str): The name of the planet.
+        query (InterpolationRequest): The times (`time`, repeatable) and the method.
+
+    Returns:
+        List[InterpolatedPosition]: One position per requested time, in order.
+
+    Raises:
+        HTTPException: If the planet is not found.
+    """
+    logger.info("Interpolating positions for planet with name: %s", planet_name)
+    planet = planet_service.get_planet_by_name(planet_name)
+    if not planet:
+        logger.warning("Planet with name %s not found.", planet_name)
+        raise HTTPException(status_code=404, detail="Planet not found")
+    positions = position_service.interpolate_positions(planet.id, query.times, query.method)
+    if positions is None:
+        raise HTTPException(status_code=500, detail="Position history could not be read")
+    return positions
+
+
+@router.post("/position/at/{planet_id}", response_model=List[InterpolatedPosition],
+             summary="Retrieve a planet's position at many times by ID")
+def interpolate_planet_positions(
+        planet_id: UUID,
+        query: InterpolationRequest) -> List[InterpolatedPosition]:
+    """Interpolate the position of a specific planet at a batch of times.
+
+    Same as `get_planet_position_at`, for batches too large for a query
+    string. All the times are evaluated with a single database query.
+
+    Args:
+        planet_id (UUID): The unique identifier of the planet.
+        query (InterpolationRequest): The times and the method.
+
+    Returns:
+        List[InterpolatedPosition]: One position per requested time, in order.
+
+    Raises:
+        HTTPException: If the planet is not found or too many times are requested.
+    """
+    logger.info("Interpolating %d positions for planet with ID: %s", len(query.times), planet_id)
+    if len(query.times) > HISTORY_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {HISTORY_MAX_LIMIT} times per request")
+    planet = planet_service.get_planet(planet_id)
+    if not planet:
+        logger.warning("Planet with ID %s not found.", planet_id)
+        raise HTTPException(status_code=404, detail="Planet not found")
+    positions = position_service.interpolate_positions(
+        planet_id, [local_time(time) for time in query.times], query.method)
+    if positions is None:
+        raise HTTPException(status_code=500, detail="Position history could not be read")
+    return positions
+
+
+@router.get("/analytics/{planet_id}", response_model=TrajectoryAnalytics,
+            summary="Retrieve a planet's trajectory analytics by ID")
+def get_planet_analytics(
+        planet_id: UUID,
+        query: HistoryQuery = Depends(history_query),
+        analytics: AnalyticsQuery = Depends(analytics_query)) -> TrajectoryAnalytics:
+    """Compute the kinematics of a specific planet by its unique ID over a time range.
+
+    Returns the path length, displacement, mean and max speed, max
+    acceleration and time in motion of the window (selected like the
+    history, without default limit), and with `resolution` the velocity,
+    speeds and distance of every period of that many seconds.
+
+    Args:
+        planet_id (UUID): The unique identifier of the planet.
+        query (HistoryQuery): Time bounds of the window.
+        analytics (AnalyticsQuery): Period width of the series and motion threshold.
+
+    Returns:
+        TrajectoryAnalytics: The kinematics of the planet.
+
+    Raises:
+        HTTPException: If the planet is not found or the cursor is invalid.
+    """
+    logger.info("Analyzing the trajectory of planet with ID: %s", planet_id)
+    planet = planet_service.get_planet(planet_id)
+    if not planet:
+        logger.warning("Planet with ID %s not found.", planet_id)
+        raise HTTPException(status_code=404, detail="Planet not found")
+    try:
+        result = position_service.analyze_trajectory(planet_id, query, analytics)
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=500, detail="Position history could not be read")
+    return result
+
+
+@router.get("/analytics/name/{planet_name}", response_model=TrajectoryAnalytics,
+            summary="Retrieve a planet's trajectory analytics by name")
+def get_planet_analytics_by_name(
+        planet_name: str,
+        query: HistoryQuery = Depends(history_query),
+        analytics: AnalyticsQuery = Depends(analytics_query)) -> TrajectoryAnalytics:
+    """Compute the kinematics of a specific planet by its name over a time range.
+
+    See `get_planet_analytics`.
+
+    Args:
+        planet_name (str): The name of the planet.
+        query (HistoryQuery): Time bounds of the window.
+        analytics (AnalyticsQuery): Period width of the series and motion threshold.
+
+    Returns:
+        TrajectoryAnalytics: The kinematics of the planet.
+
+    Raises:
+        HTTPException: If the planet is not found or the cursor is invalid.
+    """
+    logger.info("Analyzing the trajectory of planet with name: %s", planet_name)
+    planet = planet_service.get_planet_by_name(planet_name)
+    if not planet:
+        logger.warning("Planet with name %s not found.", planet_name)
+        raise HTTPException(status_code=404, detail="Planet not found")
+    try:
+        result = position_service.analyze_trajectory(planet.id, query, analytics)
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=500, detail="Position history could not be read")
+    return result
+
+
+@router.get("/rollups/{planet_id}", response_model=List[Rollup], summary="Retrieve a planet's position summaries by ID")
+def get_planet_rollups(
+        planet_id: UUID,
+        query: RollupQuery = Depends(rollup_query)) -> List[Rollup]:
+    """Summarize the positions of a specific planet by its unique ID over periods.
+
+    Every period of `resolution` seconds holding positions gets its sample
+    count, bounding box, mean position and distance travelled, newest first.
+    Summaries are read from precomputed minute, hour and day rollups.
+
+    Args:
+        planet_id (UUID): The unique identifier of the planet.
+        query (RollupQuery): Resolution, time bounds and number of periods.
+
+    Returns:
+        List[Rollup]: The summaries of the planet.
+
+    Raises:
+        HTTPException: If the planet is not found or the resolution is not supported.
+    """
+    logger.info("Fetching position summaries for planet with ID: %s", planet_id)
+    planet = planet_service.get_planet(planet_id)
+    if not planet:
+        logger.warning("Planet with ID %s not found.", planet_id)
+        raise HTTPException(status_code=404, detail="Planet not found")
+    try:
+        return rollup_service.get_rollups(planet_id, query)
+    except UnsupportedResolutionException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/rollups/name/{planet_name}", response_model=List[Rollup], summary="Retrieve a planet's position summaries by name")
+def get_planet_rollups_by_name(
+        planet_name: str,
+        query: RollupQuery = Depends(rollup_query)) -> List[Rollup]:
+    """Summarize the positions of a specific planet by its name over periods.
+
+    See `get_planet_rollups`.
+
+    Args:
+        planet_name (str): The name of the planet.
+        query (RollupQuery): Resolution, time bounds and number of periods.
+
+    Returns:
+        List[Rollup]: The summaries of the planet.
+
+    Raises:
+        HTTPException: If the planet is not found or the resolution is not supported.
+    """
+    logger.info("Fetching position summaries for planet with name: %s", planet_name)
+    planet = planet_service.get_planet_by_name(planet_name)
+    if not planet:
+        logger.warning("Planet with name %s not found.", planet_name)
+        raise HTTPException(status_code=404, detail="Planet not found")
+    try:
+        return rollup_service.get_rollups(planet.id, query)
+    except UnsupportedResolutionException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/positions", response_model=IngestResult, summary="Ingest a batch of planet positions",
+             dependencies=[Depends(auth_required)])
+async def ingest_planet_positions(request: Request) -> IngestResult:
+    """Ingest planet positions sent as a JSON array or as NDJSON.
+
+    Records have the Kafka message shape (type_object, name, x, y, z,
+    timestamp) and are parsed while the body streams in, then resolved and
+    written in bulk like the records consumed from Kafka.
+
+    Args:
+        request (Request): The HTTP request, whose body holds the records.
+
+    Returns:
+        IngestResult: The number of accepted and rejected records.
+    """
+    logger.info("Ingesting a batch of planet positions.")
+    pipeline = getattr(request.app.state, "ingest", None)
+    return await ingest_stream(request.stream(), "planet", pipeline.writer if pipeline else None)
@@ -0,0 +1,55 @@
+from datetime import datetime
+from functools import partial
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from api.dependancies import auth_required, allowed_roles, local_time
+from api.exceptions import UnsupportedResolutionException
+from api.services import rollup_service
+from config.config import get_logger
+
+logger = get_logger()
+
+router = APIRouter(
+    prefix="/rollups",
+    dependencies=[Depends(auth_required)],
+    tags=["Rollup"]
+)
+
+
+@router.post("/rebuild", summary="Rebuild position rollups over a time range",
+             dependencies=[Depends(partial(allowed_roles, allowed_roles=["admin"]))])
+def rebuild_rollups(
+        start: datetime = Query(..., alias="from", description="Start of the range"),
+        end: datetime = Query(..., alias="to", description="End of the range"),
+        resolution: str | None = Query(None, description="Rollup to rebuild (minute, hour or day), all by default"),
+        id: UUID | None = Query(None, description="Only rebuild the rollups of this ship or planet")) -> dict[str, int]:
+    """Recompute position rollups from the raw positions.
+
+    Every bucket overlapping the range is replaced, which also makes exact
+    the distances of buckets that received samples out of order.
+
+    Args:
+        start (datetime): Start of the range.
+        end (datetime): End of the range.
+        resolution (str): The rollup to rebuild, every rollup if not given.
+        id (UUID): Only rebuild the rollups of this entity.
+
+    Returns:
+        dict[str, int]: The number of buckets written, per rollup.
+
+    Raises:
+        HTTPException: If the range or rollup is invalid, or the rebuild fails.
+    """
+    start, end = local_time(start), local_time(end)
+    if end < start:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    logger.info("Rebuilding %s rollups from %s to %s", resolution or "all", start, end)
+    try:
+        rebuilt = rollup_service.rebuild_rollups(start, end, resolution, id)
+    except UnsupportedResolutionException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if rebuilt is None:
+        raise HTTPException(status_code=500, detail="Rollups could not be rebuilt")
+    return rebuilt
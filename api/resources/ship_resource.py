@@ -1,18 +1,34 @@
 from uuid import UUID
 from typing import List
-from fastapi import APIRouter, Request, status, Depends, HTTPException
-
-from api.dependancies import auth_required
-from api.exceptions import AlreadyExistsException
+from fastapi import APIRouter, Request, Response, status, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+from api.dependancies import analytics_query, auth_required, history_query, interpolation_times, local_time, rollup_query
+from api.exceptions import (
+    AlreadyExistsException,
+    InvalidCursorException,
+    UnencodableTrajectoryException,
+    UnsupportedResolutionException
+)
 
 from api.models.Ship import ShipForCreate, Ship
-from api.models.Position import Position
-from api.services import ship_service, user_service, position_service
-from config.config import get_logger
+from api.models.Analytics import AnalyticsQuery, TrajectoryAnalytics
+from api.models.HistoryQuery import HistoryQuery
+from api.models.IngestResult import IngestResult
+from api.models.Position import InterpolatedPosition, InterpolationRequest, Position
+from api.models.Rollup import Rollup
+from api.models.RollupQuery import RollupQuery
+from api.services import ship_service, user_service, position_service, rollup_service
+from config.config import HISTORY_MAX_LIMIT, get_logger
+from api.ingest import ingest_stream
 
 
 logger = get_logger()
 
+NDJSON = "application/x-ndjson"
+NPZ = "application/x-npz"
+TRAJECTORY = "application/x-trajectory"
+
 router = APIRouter(
     prefix="/ships",
     tags=["Ship"]
@@ -183,48 +199,367 @@ def get_ship_position_by_name(ship_name: str) -> Position:
 
 
 @router.get("/positions/{ship_id}", response_model=List[Position], summary="Retrieve a ship's position history by ID")
-def get_ship_history_positions(ship_id: UUID) -> List[Position]:
-    """Fetch the position history of a specific ship by its unique ID.
+def get_ship_history_positions(
+        ship_id: UUID,
+        request: Request,
+        response: Response,
+        query: HistoryQuery = Depends(history_query)) -> List[Position]:
+    """Fetch a page of the position history of a specific ship by its unique ID.
+
+    Positions are returned newest first. When more positions match, the
+    cursor of the next page is returned in the `X-Next-Cursor` header.
+    With `Accept: application/x-ndjson`, the positions are streamed as NDJSON
+    instead. With `Accept: application/x-npz` they are exported as columnar
+    arrays, and with `Accept: application/x-trajectory` in the compact
+    quantized format (see `api.trajectory`). None of these formats has a
+    default limit.
 
     Args:
         ship_id (UUID): The unique identifier of the ship.
+        request (Request): The HTTP request, whose Accept header selects the format.
+        response (Response): The HTTP response, carrying the next page cursor.
+        query (HistoryQuery): Time bounds, page size and continuation cursor.
 
     Returns:
         List[Position]: The position history of the ship.
 
     Raises:
-        HTTPException: If the ship is not found.
+        HTTPException: If the ship is not found or the cursor is invalid.
     """
     logger.info("Fetching position history for ship with ID: %s", ship_id)
     ship = ship_service.get_ship(ship_id)
     if not ship:
         logger.warning("Ship with ID %s not found.", ship_id)
         raise HTTPException(status_code=404, detail="Ship not found")
-    positions = position_service.get_history_positions(ship_id)
+    try:
+        accept = request.headers.get("accept", "")
+        if NDJSON in accept:
+            chunks = position_service.stream_history(ship_id, query)
+            if chunks is None:
+                raise HTTPException(status_code=500, detail="Position history could not be read")
+            return StreamingResponse(chunks, media_type=NDJSON)
+        if NPZ in accept or TRAJECTORY in accept:
+            export = (position_service.export_history_columns if NPZ in accept
+                      else position_service.export_trajectory)
+            content = export(ship_id, query)
+            if content is None:
+                raise HTTPException(status_code=500, detail="Position history could not be read")
+            return Response(content, media_type=NPZ if NPZ in accept else TRAJECTORY)
+        positions, next_cursor = position_service.get_history_page(ship_id, query)
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnencodableTrajectoryException as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     logger.debug("Position history retrieved for ship ID %s: %s",
                  ship_id, positions)
     return positions
 
 
 @router.get("/positions/name/{ship_name}", response_model=List[Position], summary="Retrieve a ship's position history by name")
-def get_ship_history_positions_by_name(ship_name: str) -> List[Position]:
-    """Fetch the position history of a specific ship by its name.
+def get_ship_history_positions_by_name(
+        ship_name: str,
+        request: Request,
+        response: Response,
+        query: HistoryQuery = Depends(history_query)) -> List[Position]:
+    """Fetch a page of the position history of a specific ship by its name.
+
+    Positions are returned newest first. When more positions match, the
+    cursor of the next page is returned in the `X-Next-Cursor` header.
+    With `Accept: application/x-ndjson`, the positions are streamed as NDJSON
+    instead. With `Accept: application/x-npz` they are exported as columnar
+    arrays, and with `Accept: application/x-trajectory` in the compact
+    quantized format (see `api.trajectory`). None of these formats has a
+    default limit.
 
     Args:
         ship_name (str): The name of the ship.
+        request (Request): The HTTP request, whose Accept header selects the format.
+        response (Response): The HTTP response, carrying the next page cursor.
+        query (HistoryQuery): Time bounds, page size and continuation cursor.
 
     Returns:
         List[Position]: The position history of the ship.
 
     Raises:
-        HTTPException: If the ship is not found.
+        HTTPException: If the ship is not found or the cursor is invalid.
     """
     logger.info("Fetching position history for ship with name: %s", ship_name)
     ship = ship_service.get_ship_by_name(ship_name)
     if not ship:
         logger.warning("Ship with name %s not found.", ship_name)
         raise HTTPException(status_code=404, detail="Ship not found")
-    positions = position_service.get_history_positions(ship.id)
+    try:
+        accept = request.headers.get("accept", "")
+        if NDJSON in accept:
+            chunks = position_service.stream_history(ship.id, query)
+            if chunks is None:
+                raise HTTPException(status_code=500, detail="Position history could not be read")
+            return StreamingResponse(chunks, media_type=NDJSON)
+        if NPZ in accept or TRAJECTORY in accept:
+            export = (position_service.export_history_columns if NPZ in accept
+                      else position_service.export_trajectory)
+            content = export(ship.id, query)
+            if content is None:
+                raise HTTPException(status_code=500, detail="Position history could not be read")
+            return Response(content, media_type=NPZ if NPZ in accept else TRAJECTORY)
+        positions, next_cursor = position_service.get_history_page(ship.id, query)
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnencodableTrajectoryException as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     logger.debug("Position history retrieved for ship name %s: %s",
                  ship_name, positions)
     return positions
+
+
+@router.get("/position/at/{ship_id}", response_model=List[InterpolatedPosition],
+            summary="Retrieve a ship's position at given times by ID")
+def get_ship_position_at(
+        ship_id: UUID,
+        query: InterpolationRequest = Depends(interpolation_times)) -> List[InterpolatedPosition]:
+    """Interpolate the position of a specific ship by its unique ID at given times.
+
+    The samples around each time are found with index lookups, then
+    interpolated linearly or with a cubic spline (`method`). Times outside
+    the history get no coordinates.
+
+    Args:
+        ship_id (UUID): The unique identifier of the ship.
+        query (InterpolationRequest): The times (`time`, repeatable) and the method.
+
+    Returns:
+        List[InterpolatedPosition]: One position per requested time, in order.
+
+    Raises:
+        HTTPException: If the ship is not found.
+    """
+    logger.info("Interpolating positions for ship with ID: %s", ship_id)
+    ship = ship_service.get_ship(ship_id)
+    if not ship:
+        logger.warning("Ship with ID %s not found.", ship_id)
+        raise HTTPException(status_code=404, detail="Ship not found")
+    positions = position_service.interpolate_positions(ship_id, query.times, query.method)
+    if positions is None:
+        raise HTTPException(status_code=500, detail="Position history could not be read")
+    return positions
+
+
+@router.get("/position/at/name/{ship_name}", response_model=List[InterpolatedPosition],
+            summary="Retrieve a ship's position at given times by name")
+def get_ship_position_at_by_name(
+        ship_name: str,
+        query: InterpolationRequest = Depends(interpolation_times)) -> List[InterpolatedPosition]:
+    """Interpolate the position of a specific ship by its name at given times.
+
+    See `get_ship_position_at`.
+
+    Args:
+        ship_name (str): The name of the ship.
+        query (InterpolationRequest): The times (`time`, repeatable) and the method.
+
+    Returns:
+        List[InterpolatedPosition]: One position per requested time, in order.
+
+    Raises:
+        HTTPException: If the ship is not found.
+    """
+    logger.info("Interpolating positions for ship with name: %s", ship_name)
+    ship = ship_service.get_ship_by_name(ship_name)
+    if not ship:
+        logger.warning("Ship with name %s not found.", ship_name)
+        raise HTTPException(status_code=404, detail="Ship not found")
+    positions = position_service.interpolate_positions(ship.id, query.times, query.method)
+    if positions is None:
+        raise HTTPException(status_code=500, detail="Position history could not be read")
+    return positions
+
+
+@router.post("/position/at/{ship_id}", response_model=List[InterpolatedPosition],
+             summary="Retrieve a ship's position at many times by ID")
+def interpolate_ship_positions(
+        ship_id: UUID,
+        query: InterpolationRequest) -> List[InterpolatedPosition]:
+    """Interpolate the position of a specific ship at a batch of times.
+
+    Same as `get_ship_position_at`, for batches too large for a query
+    string. All the times are evaluated with a single database query.
+
+    Args:
+        ship_id (UUID): The unique identifier of the ship.
+        query (InterpolationRequest): The times and the method.
+
+    Returns:
+        List[InterpolatedPosition]: One position per requested time, in order.
+
+    Raises:
+        HTTPException: If the ship is not found or too many times are requested.
+    """
+    logger.info("Interpolating %d positions for ship with ID: %s", len(query.times), ship_id)
+    if len(query.times) > HISTORY_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {HISTORY_MAX_LIMIT} times per request")
+    ship = ship_service.get_ship(ship_id)
+    if not ship:
+        logger.warning("Ship with ID %s not found.", ship_id)
+        raise HTTPException(status_code=404, detail="Ship not found")
+    positions = position_service.interpolate_positions(
+        ship_id, [local_time(time) for time in query.times], query.method)
+    if positions is None:
+        raise HTTPException(status_code=500, detail="Position history could not be read")
+    return positions
+
+
+@router.get("/analytics/{ship_id}", response_model=TrajectoryAnalytics,
+            summary="Retrieve a ship's trajectory analytics by ID")
+def get_ship_analytics(
+        ship_id: UUID,
+        query: HistoryQuery = Depends(history_query),
+        analytics: AnalyticsQuery = Depends(analytics_query)) -> TrajectoryAnalytics:
+    """Compute the kinematics of a specific ship by its unique ID over a time range.
+
+    Returns the path length, displacement, mean and max speed, max
+    acceleration and time in motion of the window (selected like the
+    history, without default limit), and with `resolution` the velocity,
+    speeds and distance of every period of that many seconds.
+
+    Args:
+        ship_id (UUID): The unique identifier of the ship.
+        query (HistoryQuery): Time bounds of the window.
+        analytics (AnalyticsQuery): Period width of the series and motion threshold.
+
+    Returns:
+        TrajectoryAnalytics: The kinematics of the ship.
+
+    Raises:
+        HTTPException: If the ship is not found or the cursor is invalid.
+    """
+    logger.info("Analyzing the trajectory of ship with ID: %s", ship_id)
+    ship = ship_service.get_ship(ship_id)
+    if not ship:
+        logger.warning("Ship with ID %s not found.", ship_id)
+        raise HTTPException(status_code=404, detail="Ship not found")
+    try:
+        result = position_service.analyze_trajectory(ship_id, query, analytics)
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=500, detail="Position history could not be read")
+    return result
+
+
+@router.get("/analytics/name/{ship_name}", response_model=TrajectoryAnalytics,
+            summary="Retrieve a ship's trajectory analytics by name")
+def get_ship_analytics_by_name(
+        ship_name: str,
+        query: HistoryQuery = Depends(history_query),
+        analytics: AnalyticsQuery = Depends(analytics_query)) -> TrajectoryAnalytics:
+    """Compute the kinematics of a specific ship by its name over a time range.
+
+    See `get_ship_analytics`.
+
+    Args:
+        ship_name (str): The name of the ship.
+        query (HistoryQuery): Time bounds of the window.
+        analytics (AnalyticsQuery): Period width of the series and motion threshold.
+
+    Returns:
+        TrajectoryAnalytics: The kinematics of the ship.
+
+    Raises:
+        HTTPException: If the ship is not found or the cursor is invalid.
+    """
+    logger.info("Analyzing the trajectory of ship with name: %s", ship_name)
+    ship = ship_service.get_ship_by_name(ship_name)
+    if not ship:
+        logger.warning("Ship with name %s not found.", ship_name)
+        raise HTTPException(status_code=404, detail="Ship not found")
+    try:
+        result = position_service.analyze_trajectory(ship.id, query, analytics)
+    except InvalidCursorException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=500, detail="Position history could not be read")
+    return result
+
+
+@router.get("/rollups/{ship_id}", response_model=List[Rollup], summary="Retrieve a ship's position summaries by ID")
+def get_ship_rollups(
+        ship_id: UUID,
+        query: RollupQuery = Depends(rollup_query)) -> List[Rollup]:
+    """Summarize the positions of a specific ship by its unique ID over periods.
+
+    Every period of `resolution` seconds holding positions gets its sample
+    count, bounding box, mean position and distance travelled, newest first.
+    Summaries are read from precomputed minute, hour and day rollups.
+
+    Args:
+        ship_id (UUID): The unique identifier of the ship.
+        query (RollupQuery): Resolution, time bounds and number of periods.
+
+    Returns:
+        List[Rollup]: The summaries of the ship.
+
+    Raises:
+        HTTPException: If the ship is not found or the resolution is not supported.
+    """
+    logger.info("Fetching position summaries for ship with ID: %s", ship_id)
+    ship = ship_service.get_ship(ship_id)
+    if not ship:
+        logger.warning("Ship with ID %s not found.", ship_id)
+        raise HTTPException(status_code=404, detail="Ship not found")
+    try:
+        return rollup_service.get_rollups(ship_id, query)
+    except UnsupportedResolutionException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/rollups/name/{ship_name}", response_model=List[Rollup], summary="Retrieve a ship's position summaries by name")
+def get_ship_rollups_by_name(
+        ship_name: str,
+        query: RollupQuery = Depends(rollup_query)) -> List[Rollup]:
+    """Summarize the positions of a specific ship by its name over periods.
+
+    See `get_ship_rollups`.
+
+    Args:
+        ship_name (str): The name of the ship.
+        query (RollupQuery): Resolution, time bounds and number of periods.
+
+    Returns:
+        List[Rollup]: The summaries of the ship.
+
+    Raises:
+        HTTPException: If the ship is not found or the resolution is not supported.
+    """
+    logger.info("Fetching position summaries for ship with name: %s", ship_name)
+    ship = ship_service.get_ship_by_name(ship_name)
+    if not ship:
+        logger.warning("Ship with name %s not found.", ship_name)
+        raise HTTPException(status_code=404, detail="Ship not found")
+    try:
+        return rollup_service.get_rollups(ship.id, query)
+    except UnsupportedResolutionException as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/positions", response_model=IngestResult, summary="Ingest a batch of ship positions",
+             dependencies=[Depends(auth_required)])
+async def ingest_ship_positions(request: Request) -> IngestResult:
+    """Ingest ship positions sent as a JSON array or as NDJSON.
+
+    Records have the Kafka message shape (type_object, name, x, y, z,
+    timestamp) and are parsed while the body streams in, then resolved and
+    written in bulk like the records consumed from Kafka.
+
+    Args:
+        request (Request): The HTTP request, whose body holds the records.
+
+    Returns:
+        IngestResult: The number of accepted and rejected records.
+    """
+    logger.info("Ingesting a batch of ship positions.")
+    pipeline = getattr(request.app.state, "ingest", None)
+    return await ingest_stream(request.stream(), "ship", pipeline.writer if pipeline else None)
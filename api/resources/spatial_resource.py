@@ -0,0 +1,97 @@
+import math
+from uuid import UUID
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from api.dependancies import nearby_query
+from api.models.Nearby import NearbyEntity, NearbyQuery
+from api.services import planet_service, position_service, spatial_service
+from config.config import get_logger
+
+logger = get_logger()
+
+router = APIRouter(
+    prefix="/nearby",
+    tags=["Nearby"]
+)
+
+
+def require_index():
+    if position_service.spatial_index is None:
+        raise HTTPException(status_code=503, detail="Spatial index is disabled")
+
+
+@router.get("", response_model=List[NearbyEntity], summary="Find the entities near a point",
+            dependencies=[Depends(require_index)])
+def get_nearby(
+        x: float = Query(..., description="X coordinate of the point"),
+        y: float = Query(..., description="Y coordinate of the point"),
+        z: float = Query(..., description="Z coordinate of the point"),
+        query: NearbyQuery = Depends(nearby_query)) -> List[NearbyEntity]:
+    """Find the ships and planets near a point, from their latest positions.
+
+    Either every entity within `radius`, or the `k` nearest ones, nearest
+    first, optionally only ships or planets (`kind`).
+
+    Args:
+        x (float): X coordinate of the point.
+        y (float): Y coordinate of the point.
+        z (float): Z coordinate of the point.
+        query (NearbyQuery): Radius or number of neighbours, and kind filter.
+
+    Returns:
+        List[NearbyEntity]: The entities found, with their distance.
+    """
+    logger.info("Fetching entities near (%s, %s, %s)", x, y, z)
+    if not (math.isfinite(x) and math.isfinite(y) and math.isfinite(z)):
+        raise HTTPException(status_code=400, detail="Coordinates must be finite")
+    return spatial_service.get_nearby(x, y, z, query)
+
+
+@router.get("/planet/{planet_name}", response_model=List[NearbyEntity],
+            summary="Find the entities near a planet by name", dependencies=[Depends(require_index)])
+def get_nearby_planet(planet_name: str, query: NearbyQuery = Depends(nearby_query)) -> List[NearbyEntity]:
+    """Find the ships and planets near the latest position of a planet.
+
+    Args:
+        planet_name (str): The name of the planet.
+        query (NearbyQuery): Radius or number of neighbours, and kind filter.
+
+    Returns:
+        List[NearbyEntity]: The entities found, the planet excluded.
+
+    Raises:
+        HTTPException: If the planet is not found or has no known position.
+    """
+    logger.info("Fetching entities near planet with name: %s", planet_name)
+    planet = planet_service.get_planet_by_name(planet_name)
+    if not planet:
+        logger.warning("Planet with name %s not found.", planet_name)
+        raise HTTPException(status_code=404, detail="Planet not found")
+    nearby = spatial_service.get_nearby_entity(planet.id, query)
+    if nearby is None:
+        raise HTTPException(status_code=404, detail="Planet position not found")
+    return nearby
+
+
+@router.get("/{entity_id}", response_model=List[NearbyEntity],
+            summary="Find the entities near a ship or planet by ID", dependencies=[Depends(require_index)])
+def get_nearby_entity(entity_id: UUID, query: NearbyQuery = Depends(nearby_query)) -> List[NearbyEntity]:
+    """Find the ships and planets near the latest position of a ship or planet.
+
+    Args:
+        entity_id (UUID): The unique identifier of the ship or planet.
+        query (NearbyQuery): Radius or number of neighbours, and kind filter.
+
+    Returns:
+        List[NearbyEntity]: The entities found, the entity itself excluded.
+
+    Raises:
+        HTTPException: If the entity has no known position.
+    """
+    logger.info("Fetching entities near entity with ID: %s", entity_id)
+    nearby = spatial_service.get_nearby_entity(entity_id, query)
+    if nearby is None:
+        logger.warning("No position found for entity ID: %s", entity_id)
+        raise HTTPException(status_code=404, detail="Position not found")
+    return nearby
@@ -0,0 +1,124 @@
+# Rollup resolutions: name (a date_trunc field) -> width in seconds
+ROLLUPS = {"minute": 60, "hour": 3600, "day": 86400}
+
+# Per-bucket aggregates of a set of positions named `source`. `distance` is
+# the path length between consecutive samples of the same bucket. Rows come
+# out in (id, bucket) order so that concurrent upserts (Kafka writer, HTTP
+# ingest, spool replay) lock the hot rollup rows in the same order and
+# cannot deadlock.
+AGGREGATE_QUERY = """
+    SELECT id, bucket, count(*),
+           min(x), max(x), min(y), max(y), min(z), max(z),
+           sum(x), sum(y), sum(z),
+           COALESCE(sum(step), 0),
+           min(time), (array_agg(x ORDER BY time))[1], (array_agg(y ORDER BY time))[1],
+           (array_agg(z ORDER BY time))[1],
+           max(time), (array_agg(x ORDER BY time DESC))[1], (array_agg(y ORDER BY time DESC))[1],
+           (array_agg(z ORDER BY time DESC))[1]
+    FROM (
+        SELECT id, x, y, z, time, date_trunc('{resolution}', time) AS bucket,
+               sqrt((x - lag(x) OVER w) ^ 2 + (y - lag(y) OVER w) ^ 2 + (z - lag(z) OVER w) ^ 2) AS step
+        FROM {source}
+        WINDOW w AS (PARTITION BY id, date_trunc('{resolution}', time) ORDER BY time)
+    ) steps
+    GROUP BY id, bucket
+    ORDER BY id, bucket
+"""
+
+ROLLUP_COLUMNS = """
+    (id, bucket, samples, min_x, max_x, min_y, max_y, min_z, max_z, sum_x, sum_y, sum_z,
+     distance, first_time, first_x, first_y, first_z, last_time, last_x, last_y, last_z)
+"""
+
+# Merge the aggregates of new positions into existing buckets. Batches
+# arriving after (or before) a bucket's samples extend its path; samples
+# arriving in the middle of it are counted but their path is approximated
+# until the range is rebuilt.
+MERGE_ROLLUP = """
+    ON CONFLICT (id, bucket) DO UPDATE SET
+        samples = r.samples + EXCLUDED.samples,
+        min_x = LEAST(r.min_x, EXCLUDED.min_x), max_x = GREATEST(r.max_x, EXCLUDED.max_x),
+        min_y = LEAST(r.min_y, EXCLUDED.min_y), max_y = GREATEST(r.max_y, EXCLUDED.max_y),
+        min_z = LEAST(r.min_z, EXCLUDED.min_z), max_z = GREATEST(r.max_z, EXCLUDED.max_z),
+        sum_x = r.sum_x + EXCLUDED.sum_x,
+        sum_y = r.sum_y + EXCLUDED.sum_y,
+        sum_z = r.sum_z + EXCLUDED.sum_z,
+        distance = r.distance + EXCLUDED.distance + CASE
+            WHEN EXCLUDED.first_time > r.last_time THEN sqrt(
+                (EXCLUDED.first_x - r.last_x) ^ 2 + (EXCLUDED.first_y - r.last_y) ^ 2
+                + (EXCLUDED.first_z - r.last_z) ^ 2)
+            WHEN EXCLUDED.last_time < r.first_time THEN sqrt(
+                (r.first_x - EXCLUDED.last_x) ^ 2 + (r.first_y - EXCLUDED.last_y) ^ 2
+                + (r.first_z - EXCLUDED.last_z) ^ 2)
+            ELSE 0 END,
+        first_time = LEAST(r.first_time, EXCLUDED.first_time),
+        first_x = CASE WHEN EXCLUDED.first_time < r.first_time THEN EXCLUDED.first_x ELSE r.first_x END,
+        first_y = CASE WHEN EXCLUDED.first_time < r.first_time THEN EXCLUDED.first_y ELSE r.first_y END,
+        first_z = CASE WHEN EXCLUDED.first_time < r.first_time THEN EXCLUDED.first_z ELSE r.first_z END,
+        last_time = GREATEST(r.last_time, EXCLUDED.last_time),
+        last_x = CASE WHEN EXCLUDED.last_time > r.last_time THEN EXCLUDED.last_x ELSE r.last_x END,
+        last_y = CASE WHEN EXCLUDED.last_time > r.last_time THEN EXCLUDED.last_y ELSE r.last_y END,
+        last_z = CASE WHEN EXCLUDED.last_time > r.last_time THEN EXCLUDED.last_z ELSE r.last_z END
+"""
+
+
+# Overwrite buckets with freshly aggregated ones, for rebuilds: a bucket
+# recreated by an ingest committing during the rebuild is replaced by the
+# rebuilt aggregate, which includes its rows if they were already visible.
+REPLACE_ROLLUP = """
+    ON CONFLICT (id, bucket) DO UPDATE SET
+        samples = EXCLUDED.samples,
+        min_x = EXCLUDED.min_x, max_x = EXCLUDED.max_x,
+        min_y = EXCLUDED.min_y, max_y = EXCLUDED.max_y,
+        min_z = EXCLUDED.min_z, max_z = EXCLUDED.max_z,
+        sum_x = EXCLUDED.sum_x, sum_y = EXCLUDED.sum_y, sum_z = EXCLUDED.sum_z,
+        distance = EXCLUDED.distance,
+        first_time = EXCLUDED.first_time,
+        first_x = EXCLUDED.first_x, first_y = EXCLUDED.first_y, first_z = EXCLUDED.first_z,
+        last_time = EXCLUDED.last_time,
+        last_x = EXCLUDED.last_x, last_y = EXCLUDED.last_y, last_z = EXCLUDED.last_z
+"""
+
+
+def rollup_table(resolution: str) -> str:
+    return f"position_rollups_{resolution}"
+
+
+def rollup_ctes(source: str) -> str:
+    """Return the CTEs merging the positions of `source` into every rollup table.
+
+    Meant to follow a data-modifying CTE (e.g. `inserted AS (INSERT ...
+    RETURNING id, x, y, z, time)`), so the rollups are updated in the same
+    statement and transaction as the positions, with the rows that were
+    actually inserted.
+
+    Args:
+        source (str): The name of the CTE holding the new positions.
+
+    Returns:
+        str: The CTEs, starting with a comma.
+    """
+    return "".join(
+        f""",
+        rollup_{resolution} AS (
+            INSERT INTO {rollup_table(resolution)} AS r {ROLLUP_COLUMNS}
+            {AGGREGATE_QUERY.format(resolution=resolution, source=source)}
+            {MERGE_ROLLUP}
+        )"""
+        for resolution in ROLLUPS
+    )
+
+
+def pick_rollup(resolution: int) -> str | None:
+    """Return the coarsest rollup whose buckets tile periods of `resolution` seconds.
+
+    Args:
+        resolution (int): The requested period width, in seconds.
+
+    Returns:
+        str: The name of the rollup to read.
+        None: If no rollup divides the period.
+    """
+    candidates = [name for name, seconds in ROLLUPS.items()
+                  if seconds <= resolution and resolution % seconds == 0]
+    return max(candidates, key=ROLLUPS.get) if candidates else None
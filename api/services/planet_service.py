@@ -1,6 +1,19 @@
+import threading
 from uuid import UUID
+from api.cache import TTLCache
 from api.models.Planet import Planet
 from api.repositories import planet_repository
+from config.config import (
+    RESOLUTION_CACHE_TTL,
+    RESOLUTION_CACHE_NEGATIVE_TTL,
+    RESOLUTION_CACHE_MAX_ENTRIES
+)
+
+# Planet name -> id, shared by the ingest path
+planet_ids = TTLCache(RESOLUTION_CACHE_TTL,
+                      RESOLUTION_CACHE_NEGATIVE_TTL, RESOLUTION_CACHE_MAX_ENTRIES)
+# Serializes the creation of unknown planets by the ingest path
+creation_lock = threading.Lock()
 
 
 def get_planets() -> list[Planet]:
@@ -39,11 +52,50 @@ def get_planet_by_name(planet_name: str) -> Planet:
     )
 
 
+def resolve_planet_id(planet_name: str) -> UUID:
+    """Resolve a planet name to its id through the resolution cache.
+
+    Unknown names are cached as misses too, so repeated lookups of a missing
+    planet do not hit the database until the negative TTL expires. Safe to
+    call from worker threads; database errors are raised.
+    """
+    def load(name: str) -> UUID:
+        id = planet_repository.find_planet_id(name)
+        return UUID(id) if id else None
+
+    return planet_ids.get_or_load(planet_name, load)
+
+
+def resolve_or_create_planet_id(planet_name: str) -> UUID:
+    """Resolve a planet name to its id, creating the planet if it is unknown.
+
+    Creation is single-flight: concurrent resolutions of the same new name
+    (from the ingest worker threads) create one planet, not one each.
+
+    Raises:
+        ConnectionError: If Postgres is unreachable.
+    """
+    id = resolve_planet_id(planet_name)
+    if id:
+        return id
+    with creation_lock:
+        # Another thread may have created it while we waited
+        planet_ids.invalidate(planet_name)
+        id = resolve_planet_id(planet_name)
+        if id:
+            return id
+        planet = Planet(name=planet_name)
+        planet_repository.insert_planet(planet.model_dump(by_alias=True))
+        planet_ids.set(planet_name, planet.id)
+        return planet.id
+
+
 def create(planet_name: str) -> Planet:
     planet: Planet = Planet(
         name=planet_name
     )
     planet_repository.create(planet.model_dump(by_alias=True))
+    planet_ids.invalidate(planet_name)
 
     planet: Planet = get_planet_by_name(planet_name)
     return planet
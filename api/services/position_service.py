@@ -1,16 +1,69 @@
+import base64
+import sys
+from array import array
+from datetime import datetime, timedelta, timezone
+from typing import Iterator
 from uuid import UUID
 
+import orjson
+
 from api.models.Ship import Ship, Ship
-from api.models.Position import Position
+from api.columnar import build_npz
+from api.downsample import lttb
+from api.interpolation import interpolate
+from api.exceptions import InvalidCursorException, UnencodableTrajectoryException
+from api.models.Analytics import AnalyticsQuery, TrajectoryAnalytics, TrajectoryPeriod, TrajectorySummary
+from api.models.HistoryQuery import HistoryQuery
+from api.models.Position import InterpolatedPosition, Position
+from api.history_buffer import RecentHistory
+from api.latest_store import LatestPositionStore
+from api.spatial_index import SpatialIndex
 from api.repositories import position_repository
+from api.trajectory import encode_trajectory
+from config.config import (
+    LATEST_STORE_ENABLED,
+    LATEST_STORE_PATH,
+    LATEST_STORE_CAPACITY,
+    LATEST_STORE_MAX_AGE,
+    HISTORY_BUFFER_ENABLED,
+    HISTORY_BUFFER_SOLE_WRITER,
+    KAFKA_INGEST_IN_API,
+    HISTORY_BUFFER_SAMPLES,
+    HISTORY_BUFFER_SECONDS,
+    HISTORY_BUFFER_MEMORY_BUDGET,
+    SPATIAL_INDEX_ENABLED,
+    SPATIAL_INDEX_CELL_SIZE,
+    SPATIAL_INDEX_REFRESH_SECONDS,
+    HISTORY_DEFAULT_LIMIT,
+    HISTORY_MAX_DOWNSAMPLE_ROWS,
+    HISTORY_DOWNSAMPLE_OVERSAMPLING,
+    HISTORY_STREAM_CHUNK_ROWS,
+    TRAJECTORY_DEFAULT_PRECISION
+)
 from config.config import get_logger
 
 logger = get_logger()
 
+# Latest position of each entity, shared by all the processes of the host
+latest_positions = LatestPositionStore(
+    LATEST_STORE_PATH, LATEST_STORE_CAPACITY, LATEST_STORE_MAX_AGE) if LATEST_STORE_ENABLED else None
+# Recent history of the entities written by this process. Rows written by
+# other processes never reach it, so it is only kept (and served) when this
+# process is the sole writer; history queries go to Postgres otherwise.
+recent_history = RecentHistory(
+    HISTORY_BUFFER_SAMPLES, HISTORY_BUFFER_SECONDS, HISTORY_BUFFER_MEMORY_BUDGET
+) if HISTORY_BUFFER_ENABLED and HISTORY_BUFFER_SOLE_WRITER and KAFKA_INGEST_IN_API else None
+# Latest positions in a grid, for proximity queries (see spatial_service)
+spatial_index = SpatialIndex(
+    SPATIAL_INDEX_CELL_SIZE, SPATIAL_INDEX_REFRESH_SECONDS) if SPATIAL_INDEX_ENABLED else None
+
 
 def get_position(id: UUID) -> Position:
     """Retrieve the latest position for a given entity (ship or planet) by ID.
 
+    The shared latest position store is read first, the database only on a
+    miss.
+
     Args:
         id (UUID): The unique identifier of the entity.
 
@@ -19,6 +72,11 @@ def get_position(id: UUID) -> Position:
         None: If no position is found.
     """
     logger.info("Fetching the latest position for entity ID: %s", id)
+    if latest_positions:
+        position = latest_positions.get(id)
+        if position:
+            return position
+
     result = position_repository.get_position(id)
 
     if not result:
@@ -37,24 +95,379 @@ def get_position(id: UUID) -> Position:
     return position
 
 
-def get_history_positions(id: UUID) -> list[Position]:
-    """Retrieve the position history for a given entity (ship or planet) by ID.
+def get_history_page(id: UUID, query: HistoryQuery) -> tuple[list[Position], str | None]:
+    """Retrieve a page of the position history for a given entity (ship or planet) by ID.
+
+    Positions are returned newest first. When there are more positions than
+    `query.limit`, a cursor is returned to fetch the next (older) page.
+    Windows with a lower bound are served from the in-memory recent history
+    when it holds the whole window, from the database otherwise.
+
+    With `query.bucket`, positions are averaged over time buckets (one
+    position per bucket, paginated the same way). With `query.points`, the
+    whole window is downsampled to that many positions and not paginated.
 
     Args:
         id (UUID): The unique identifier of the entity.
+        query (HistoryQuery): Time bounds, page size, continuation cursor and downsampling.
 
     Returns:
-        list[Position]: A list of historical positions for the entity.
-        []: If no positions are found.
+        tuple[list[Position], str | None]: The positions and the next page cursor.
+
+    Raises:
+        InvalidCursorException: If the cursor is malformed or belongs to another entity.
     """
     logger.info("Fetching position history for entity ID: %s", id)
-    results = position_repository.get_history_positions(id)
+    since = history_since(query)
+    limit = query.limit or HISTORY_DEFAULT_LIMIT
+
+    if query.points:
+        positions = downsample_history(id, since, query.end, query.points, query.bucket)
+        logger.debug("Position history of entity ID %s downsampled to %d positions",
+                     id, len(positions))
+        return positions, None
+
+    before = decode_cursor(id, query.cursor) if query.cursor else None
 
-    if not results:
+    # One more row than the page tells whether there is a next page
+    positions = None
+    if query.bucket:
+        positions = to_positions(position_repository.get_history_buckets(
+            id, query.bucket, since, query.end, before, limit + 1))
+    elif since and recent_history:
+        positions = recent_history.window(id, since, query.end, before, limit + 1)
+        if positions is not None:
+            logger.debug("Position history of entity ID %s served from memory", id)
+
+    if positions is None:
+        positions = to_positions(position_repository.get_history_positions(
+            id, since, query.end, before, limit + 1))
+
+    if not positions:
         logger.warning("No position history found for entity ID: %s", id)
-        return []
+        return [], None
+
+    next_cursor = None
+    if len(positions) > limit:
+        positions = positions[:limit]
+        next_cursor = encode_cursor(id, positions[-1].time)
+    logger.debug("Position history retrieved for entity ID %s: %d positions",
+                 id, len(positions))
+    return positions, next_cursor
+
+
+def interpolate_positions(id: UUID, times: list[datetime],
+                          method: str = "linear") -> list[InterpolatedPosition] | None:
+    """Evaluate the position of an entity at each of a list of times.
+
+    The samples bracketing every time are fetched in a single query, then
+    interpolated linearly, or with a cubic Hermite spline (which also needs
+    the next sample on each side).
+
+    Args:
+        id (UUID): The unique identifier of the entity.
+        times (list[datetime]): The times to evaluate, in any order.
+        method (str): "linear" or "cubic".
+
+    Returns:
+        list[InterpolatedPosition]: One position per time, in the same order,
+            without coordinates for times outside the history.
+        None: If the history could not be read.
+    """
+    logger.info("Interpolating %d positions (%s) for entity ID: %s", len(times), method, id)
+    rows = position_repository.get_bracketing_positions(
+        id, times, 2 if method == "cubic" else 1)
+    if rows is None:
+        return None
+
+    samples: list[list[tuple]] = [[] for _ in times]
+    for index, x, y, z, time in rows:
+        samples[index].append((x, y, z, time))
+    positions = []
+    for at, around in zip(times, samples):
+        before = [sample for sample in reversed(around) if sample[3] <= at]
+        after = [sample for sample in around if sample[3] > at]
+        point = interpolate(before, after, at, method)
+        positions.append(InterpolatedPosition.model_construct(
+            id=id, time=at, x=point[0] if point else None,
+            y=point[1] if point else None, z=point[2] if point else None))
+    return positions
+
+
+def stream_history(id: UUID, query: HistoryQuery) -> Iterator[bytes] | None:
+    """Stream the position history of an entity as NDJSON, newest first.
+
+    Raw positions are read from a server-side cursor chunk by chunk and
+    encoded as they arrive, so memory stays flat whatever the window size.
+    Without `query.limit` the whole window is streamed. Bucket averages
+    (`bucket`) are streamed the same way; `points` downsamples the whole
+    window first (see `downsample_history`), then encodes it.
+
+    Args:
+        id (UUID): The unique identifier of the entity.
+        query (HistoryQuery): Time bounds, limit, continuation cursor and downsampling.
+
+    The query is started before returning, so a stream that cannot start is
+    reported as None; an error while streaming is raised by the iterator.
+
+    Returns:
+        Iterator[bytes]: NDJSON chunks, one position per line.
+        None: If the history could not be read.
+
+    Raises:
+        InvalidCursorException: If the cursor is malformed or belongs to another entity.
+    """
+    logger.info("Streaming position history for entity ID: %s", id)
+    if query.points:
+        positions = downsample_history(id, history_since(query), query.end,
+                                       query.points, query.bucket)
+        return iter([encode_ndjson([(p.id, p.x, p.y, p.z, p.time) for p in positions])])
+
+    before = decode_cursor(id, query.cursor) if query.cursor else None
+    chunks = position_repository.stream_history_positions(
+        id, history_since(query), query.end, before, query.limit, HISTORY_STREAM_CHUNK_ROWS,
+        query.bucket)
+    if chunks is None:
+        return None
+    return (encode_ndjson(rows) for rows in chunks)
+
+
+def export_history_columns(id: UUID, query: HistoryQuery) -> bytes | None:
+    """Export the position history of an entity as a columnar .npz bundle.
+
+    The bundle holds `x`, `y`, `z` (float64) and `time` (int64, epoch ms)
+    little-endian arrays in time order, built from packed columns returned by
+    Postgres. Without `query.limit` the whole window is exported, as bucket
+    averages with `bucket`; `points` downsamples the whole window first.
+
+    Args:
+        id (UUID): The unique identifier of the entity.
+        query (HistoryQuery): Time bounds, limit, continuation cursor and downsampling.
+
+    Returns:
+        bytes: The .npz archive.
+        None: If the history could not be read.
+
+    Raises:
+        InvalidCursorException: If the cursor is malformed or belongs to another entity.
+    """
+    logger.info("Exporting position history columns for entity ID: %s", id)
+    columns = history_columns(id, query)
+    if columns is None:
+        return None
+    times, xs, ys, zs = columns
+    if sys.byteorder == "big":
+        for column in columns:
+            column.byteswap()
+    return build_npz({
+        "x": ("<f8", xs.tobytes()),
+        "y": ("<f8", ys.tobytes()),
+        "z": ("<f8", zs.tobytes()),
+        "time": ("<i8", times.tobytes()),
+    }, len(times))
+
+
+def export_trajectory(id: UUID, query: HistoryQuery) -> bytes | None:
+    """Export the position history of an entity in the compact trajectory format.
+
+    Coordinates are quantized to `query.precision` and delta-of-delta encoded
+    with the times, then compressed (see `api.trajectory`). The window is
+    selected as for `export_history_columns`.
+
+    Args:
+        id (UUID): The unique identifier of the entity.
+        query (HistoryQuery): Time bounds, limit, cursor, downsampling and precision.
+
+    Returns:
+        bytes: The encoded trajectory.
+        None: If the history could not be read.
+
+    Raises:
+        InvalidCursorException: If the cursor is malformed or belongs to another entity.
+        UnencodableTrajectoryException: If a coordinate is not finite or does
+            not fit the precision.
+    """
+    logger.info("Exporting compact trajectory for entity ID: %s", id)
+    columns = history_columns(id, query)
+    if columns is None:
+        return None
+    times, xs, ys, zs = columns
+    try:
+        return encode_trajectory(times, xs, ys, zs, query.precision or TRAJECTORY_DEFAULT_PRECISION)
+    except ValueError as e:
+        raise UnencodableTrajectoryException(str(e))
+
+
+def analyze_trajectory(id: UUID, query: HistoryQuery,
+                       analytics: AnalyticsQuery) -> TrajectoryAnalytics | None:
+    """Compute the kinematics of an entity over a history window.
+
+    Velocities and accelerations are differenced and aggregated in SQL
+    (`get_trajectory_kinematics`), over the raw positions of the window
+    (`points` and `bucket` are ignored), so no row is read into Python.
+    Without `query.limit` the whole window is used. The series holds at most
+    `history.max_downsample_rows` periods, the newest; `series_truncated`
+    tells when older ones were left out.
+
+    Args:
+        id (UUID): The unique identifier of the entity.
+        query (HistoryQuery): Time bounds, limit and cursor of the window.
+        analytics (AnalyticsQuery): Period width of the series and motion threshold.
+
+    Returns:
+        TrajectoryAnalytics: The summary, and the series when a resolution is given.
+        None: If the history could not be read.
+
+    Raises:
+        InvalidCursorException: If the cursor is malformed or belongs to another entity.
+    """
+    logger.info("Analyzing the trajectory of entity ID: %s", id)
+    before = decode_cursor(id, query.cursor) if query.cursor else None
+    # One more period than the cap tells whether the series is truncated
+    rows = position_repository.get_trajectory_kinematics(
+        id, history_since(query), query.end, before, query.limit,
+        analytics.moving_speed, analytics.resolution or None, HISTORY_MAX_DOWNSAMPLE_ROWS + 1)
+    if rows is None:
+        return None
+    # The summary row is the one without a period start
+    periods = [row for row in rows if row[0] is not None]
+    _, samples, duration, path_length, displacement, _, _, _, max_speed, max_acceleration, \
+        time_in_motion = next(row for row in rows if row[0] is None)
+    summary = TrajectorySummary(
+        samples=samples, duration=duration, path_length=path_length, displacement=displacement,
+        mean_speed=path_length / duration if duration > 0 else None,
+        max_speed=max_speed, max_acceleration=max_acceleration, time_in_motion=time_in_motion)
+    series = None
+    truncated = len(periods) > HISTORY_MAX_DOWNSAMPLE_ROWS
+    if analytics.resolution:
+        periods = sorted(periods[:HISTORY_MAX_DOWNSAMPLE_ROWS], key=lambda row: row[0])
+        series = [
+            TrajectoryPeriod(
+                start=datetime.fromtimestamp(start, timezone.utc).replace(tzinfo=None),
+                distance=distance,
+                vx=dx / dt if dt > 0 else None,
+                vy=dy / dt if dt > 0 else None,
+                vz=dz / dt if dt > 0 else None,
+                mean_speed=distance / dt if dt > 0 else None,
+                max_speed=period_max_speed, max_acceleration=period_max_acceleration,
+                time_in_motion=period_time_in_motion)
+            for start, _, dt, distance, _, dx, dy, dz, period_max_speed,
+            period_max_acceleration, period_time_in_motion in periods
+        ]
+    logger.debug("Trajectory of entity ID %s: %d samples, path length %s",
+                 id, summary.samples, summary.path_length)
+    return TrajectoryAnalytics(id=id, summary=summary, series=series, series_truncated=truncated)
 
-    positions = [
+
+def history_columns(id: UUID, query: HistoryQuery) -> tuple[array, array, array, array] | None:
+    """Read a history window as native arrays of times (epoch ms), x, y and z, in time order.
+
+    Raw and bucketed windows come packed from Postgres
+    (`get_history_columns`), without any per-row object and without a
+    default limit; `points` downsamples the whole window first. Times are
+    the stored timestamps read as local times, like everywhere else.
+
+    Returns:
+        tuple: The (times, xs, ys, zs) arrays.
+        None: If the history could not be read.
+
+    Raises:
+        InvalidCursorException: If the cursor is malformed or belongs to another entity.
+    """
+    if query.points:
+        positions = downsample_history(id, history_since(query), query.end,
+                                       query.points, query.bucket)
+        positions.reverse()
+        return (array("q", (int(p.time.timestamp() * 1000)
+                            for p in positions)),
+                array("d", (p.x for p in positions)),
+                array("d", (p.y for p in positions)),
+                array("d", (p.z for p in positions)))
+
+    before = decode_cursor(id, query.cursor) if query.cursor else None
+    result = position_repository.get_history_columns(
+        id, history_since(query), query.end, before, query.limit, query.bucket)
+    if result is None:
+        return None
+    _, xs, ys, zs, times = result
+    columns = array("q", times), array("d", xs), array("d", ys), array("d", zs)
+    # Postgres sends big-endian values
+    if sys.byteorder == "little":
+        for column in columns:
+            column.byteswap()
+    return columns
+
+
+def encode_ndjson(rows: list[tuple]) -> bytes:
+    """Encode (id, x, y, z, time) rows as NDJSON positions."""
+    return b"".join(
+        orjson.dumps({"id": row[0], "x": row[1], "y": row[2], "z": row[3], "time": row[4]},
+                     option=orjson.OPT_APPEND_NEWLINE)
+        for row in rows
+    )
+
+
+def history_since(query: HistoryQuery) -> datetime | None:
+    """Return the lower time bound of a history query (`from` or `seconds`)."""
+    since = query.start
+    if query.seconds:
+        recent = datetime.now() - timedelta(seconds=query.seconds)
+        since = max(since, recent) if since else recent
+    return since
+
+
+def downsample_history(id: UUID, since: datetime | None, until: datetime | None,
+                       points: int, bucket: float = None) -> list[Position]:
+    """Reduce the positions of a time window to `points` positions with LTTB.
+
+    The source series is, in order of preference: bucket averages when
+    `bucket` is given, the in-memory recent history, the raw rows, or bucket
+    averages computed in SQL when the window holds more than
+    `history.downsample_oversampling` times `points` positions (capped at
+    `history.max_downsample_rows`), so LTTB never runs over more rows than
+    that in Python.
+
+    Args:
+        id (UUID): The unique identifier of the entity.
+        since (datetime): Start of the window.
+        until (datetime): End of the window.
+        points (int): Number of positions to return.
+        bucket (float): Average over buckets of this many seconds first.
+
+    Returns:
+        list[Position]: The selected positions, newest first.
+    """
+    rows = None
+    if bucket:
+        rows = position_repository.get_history_buckets(
+            id, bucket, since, until, limit=HISTORY_MAX_DOWNSAMPLE_ROWS)
+    elif since and recent_history:
+        positions = recent_history.window(id, since, until)
+        if positions is not None:
+            rows = [(p.id, p.x, p.y, p.z, p.time) for p in positions]
+
+    if rows is None:
+        bounds = position_repository.get_history_bounds(id, since, until)
+        if not bounds or not bounds[0]:
+            return []
+        count, oldest, newest = bounds
+        max_rows = min(HISTORY_MAX_DOWNSAMPLE_ROWS, points * HISTORY_DOWNSAMPLE_OVERSAMPLING)
+        if count > max_rows:
+            width = max((newest - oldest).total_seconds() / max_rows, 0.001)
+            rows = position_repository.get_history_buckets(id, width, since, until)
+        else:
+            rows = position_repository.get_history_positions(id, since, until)
+
+    # Rows come newest first, LTTB works in time order
+    rows.reverse()
+    _, xs, ys, zs, _ = zip(*rows) if rows else ((),) * 5
+    kept = lttb(xs, ys, zs, points)
+    return to_positions([rows[index] for index in reversed(kept)])
+
+
+def to_positions(rows: list[tuple]) -> list[Position]:
+    """Build positions from (id, x, y, z, time) rows."""
+    return [
         Position(
             id=row[0],
             x=row[1],
@@ -62,11 +475,28 @@ def get_history_positions(id: UUID) -> list[Position]:
             z=row[3],
             time=row[4],
         )
-        for row in results
+        for row in rows
     ]
-    logger.debug(
-        "Position history retrieved for entity ID %s: %s", id, positions)
-    return positions
+
+
+def encode_cursor(id: UUID, time: datetime) -> str:
+    """Build the opaque cursor continuing a history page after `time`."""
+    return base64.urlsafe_b64encode(f"{id}|{time.isoformat()}".encode()).decode()
+
+
+def decode_cursor(id: UUID, cursor: str) -> datetime:
+    """Return the time a history cursor continues from.
+
+    Raises:
+        InvalidCursorException: If the cursor is malformed or belongs to another entity.
+    """
+    try:
+        cursor_id, time = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        if UUID(cursor_id) != id:
+            raise ValueError("cursor of another entity")
+        return datetime.fromisoformat(time)
+    except ValueError as e:
+        raise InvalidCursorException(f"Invalid cursor: {cursor}") from e
 
 
 def add_position(position: Position) -> Position:
@@ -76,16 +506,103 @@ def add_position(position: Position) -> Position:
         position (Position): The position details to add.
 
     Returns:
-        Position: The added position if successful.
+        Position: The added position if successful (or if it was already stored).
         None: If the position could not be added.
     """
     logger.info("Adding a new position for entity ID: %s", position.id)
     rows_inserted = position_repository.add_position(position)
 
+    if rows_inserted is not None:
+        remember_positions([position])
+
     if rows_inserted == 1:
         logger.info(
             "Position added successfully for entity ID: %s", position.id)
         return position
+    elif rows_inserted == 0:
+        logger.info(
+            "Position already stored for entity ID: %s", position.id)
+        return position
     else:
         logger.error("Failed to add position for entity ID: %s", position.id)
         return None
+
+
+def add_positions(positions: list[Position], offsets_group: str = None, offsets: dict = None) -> int:
+    """Add a batch of position entries in a single transaction.
+
+    Args:
+        positions (list[Position]): The positions to add.
+        offsets_group (str): The consumer group `offsets` belong to.
+        offsets (dict): Consumer offsets to store in the same transaction,
+            next offset to read keyed by (topic, partition).
+
+    Returns:
+        int: The number of positions added (already stored ones excluded).
+        None: If the batch could not be added (nothing was written).
+    """
+    if not positions and not offsets:
+        return 0
+
+    logger.info("Adding a batch of %d positions", len(positions))
+    rows_inserted = position_repository.add_positions(
+        positions, offsets_group, offsets)
+
+    if rows_inserted is None:
+        logger.error("Failed to add a batch of %d positions", len(positions))
+    else:
+        remember_positions(positions)
+    return rows_inserted
+
+
+def remember_positions(positions: list[Position]):
+    """Feed written positions to the latest position store, the recent history and the spatial index.
+
+    Args:
+        positions (list[Position]): Positions the database accepted.
+    """
+    if latest_positions:
+        latest_positions.update(positions)
+    if recent_history:
+        recent_history.add(positions)
+    if spatial_index:
+        spatial_index.update(positions)
+
+
+def bulk_load_positions(positions: list[Position], durable: bool = False) -> int:
+    """Load a large batch of positions through the bulk (COPY) path.
+
+    Args:
+        positions (list[Position]): The positions to load.
+        durable (bool): Wait for the commit to be flushed to disk, for callers
+            discarding their own copy of the rows afterwards.
+
+    Returns:
+        int: The number of positions added (already stored ones excluded).
+        None: If the batch could not be loaded (nothing was written).
+    """
+    if not positions:
+        return 0
+
+    rows_inserted = position_repository.bulk_load_positions(positions, durable)
+
+    if rows_inserted is None:
+        logger.error("Failed to bulk load %d positions", len(positions))
+    else:
+        remember_positions(positions)
+    return rows_inserted
+
+
+def get_consumer_offsets(group_id: str) -> dict[tuple[str, int], int]:
+    """Retrieve the offsets stored with the positions for a consumer group.
+
+    Args:
+        group_id (str): The consumer group.
+
+    Returns:
+        dict: The next offset to read, keyed by (topic, partition).
+    """
+    return {
+        (topic, partition): next_offset
+        for topic, partition, next_offset in position_repository.get_consumer_offsets(group_id)
+    }
@@ -0,0 +1,76 @@
+from datetime import datetime
+from uuid import UUID
+
+from api.exceptions import UnsupportedResolutionException
+from api.models.Rollup import Rollup
+from api.models.RollupQuery import RollupQuery
+from api.repositories import rollup_repository
+from api.rollups import ROLLUPS, pick_rollup
+from config.config import HISTORY_DEFAULT_LIMIT
+from config.config import get_logger
+
+logger = get_logger()
+
+
+def get_rollups(id: UUID, query: RollupQuery) -> list[Rollup]:
+    """Summarize the positions of an entity (ship or planet) over periods.
+
+    Each period of `query.resolution` seconds gets its sample count,
+    bounding box, mean position and distance travelled, newest period first.
+    They are computed from the coarsest rollup table whose buckets tile the
+    periods, so a day of hourly summaries reads 24 hour buckets rather than
+    every position.
+
+    Args:
+        id (UUID): The unique identifier of the entity.
+        query (RollupQuery): Resolution, time bounds and number of periods.
+
+    Returns:
+        list[Rollup]: The summaries of the periods holding positions.
+
+    Raises:
+        UnsupportedResolutionException: If no rollup divides the resolution.
+    """
+    resolution = pick_rollup(query.resolution)
+    if resolution is None:
+        raise UnsupportedResolutionException(
+            f"Resolution must be a multiple of {min(ROLLUPS.values())} seconds")
+    logger.info("Fetching %ss rollups for entity ID %s from the %s rollup",
+                query.resolution, id, resolution)
+    rows = rollup_repository.get_rollups(id, resolution, query.resolution, query.start,
+                                         query.end, query.limit or HISTORY_DEFAULT_LIMIT)
+    return [
+        Rollup(id=id, start=row[0], seconds=query.resolution, samples=row[1],
+               min_x=row[2], max_x=row[3], min_y=row[4], max_y=row[5], min_z=row[6], max_z=row[7],
+               mean_x=row[8], mean_y=row[9], mean_z=row[10], distance=row[11])
+        for row in rows
+    ]
+
+
+def rebuild_rollups(since: datetime, until: datetime, resolution: str = None,
+                    id: UUID = None) -> dict[str, int] | None:
+    """Recompute rollups from the raw positions over a time range.
+
+    Args:
+        since (datetime): Start of the range.
+        until (datetime): End of the range.
+        resolution (str): The rollup to rebuild, every rollup if None.
+        id (UUID): Only rebuild the rollups of this entity.
+
+    Returns:
+        dict[str, int]: The number of buckets written, per rollup.
+        None: If a rebuild failed (the rollups rebuilt before it are kept).
+
+    Raises:
+        UnsupportedResolutionException: If the rollup does not exist.
+    """
+    if resolution is not None and resolution not in ROLLUPS:
+        raise UnsupportedResolutionException(
+            f"Unknown rollup '{resolution}', expected one of: {', '.join(ROLLUPS)}")
+    rebuilt = {}
+    for name in [resolution] if resolution else ROLLUPS:
+        count = rollup_repository.rebuild_rollups(name, since, until, id)
+        if count is None:
+            return None
+        rebuilt[name] = count
+    return rebuilt
@@ -1,8 +1,18 @@
 from uuid import UUID
 
+from api.cache import TTLCache
 from api.exceptions import AlreadyExistsException
 from api.models.Ship import Ship, ShipForCreate, Ship
 from api.repositories import ship_repository
+from config.config import (
+    RESOLUTION_CACHE_TTL,
+    RESOLUTION_CACHE_NEGATIVE_TTL,
+    RESOLUTION_CACHE_MAX_ENTRIES
+)
+
+# Ship name -> id, shared by the ingest path
+ship_ids = TTLCache(RESOLUTION_CACHE_TTL,
+                    RESOLUTION_CACHE_NEGATIVE_TTL, RESOLUTION_CACHE_MAX_ENTRIES)
 
 
 def create_ship(ship: ShipForCreate) -> Ship:
@@ -14,6 +24,7 @@ def create_ship(ship: ShipForCreate) -> Ship:
         name=ship.name
     )
     _, ship_id = ship_repository.create_ship(ship.model_dump(by_alias=True))
+    ship_ids.invalidate(ship.name)
 
     # Get the ship with the id
     ship_output: Ship = get_ship(ship_id)
@@ -59,6 +70,20 @@ def get_ship_by_name(ship_name: str) -> Ship:
     )
 
 
+def resolve_ship_id(ship_name: str) -> UUID:
+    """Resolve a ship name to its id through the resolution cache.
+
+    Unknown names are cached as misses too, so repeated lookups of a missing
+    ship do not hit the database until the negative TTL expires. Safe to
+    call from worker threads; database errors are raised.
+    """
+    def load(name: str) -> UUID:
+        id = ship_repository.find_ship_id(name)
+        return UUID(id) if id else None
+
+    return ship_ids.get_or_load(ship_name, load)
+
+
 def get_ships_by_owner(owner: UUID) -> Ship:
     result = ship_repository.get_ships_by_owner(owner)
 
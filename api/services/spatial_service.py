@@ -0,0 +1,93 @@
+import threading
+from uuid import UUID
+
+from api.models.Nearby import NearbyEntity, NearbyQuery
+from api.repositories import position_repository
+from api.services import position_service
+from api.spatial_index import SpatialIndex, entry_time
+from config.config import get_logger
+
+logger = get_logger()
+
+
+def get_index() -> SpatialIndex | None:
+    """Return the spatial index, reloading it from `latest_positions` when due.
+
+    Between reloads the index follows the positions written by this process;
+    the reload picks up those written by other workers. Only the first load
+    runs in the calling request; later reloads run in a background thread
+    while queries keep being served from the current index.
+
+    Returns:
+        SpatialIndex: The index of this process.
+        None: If the spatial index is disabled.
+    """
+    index = position_service.spatial_index
+    if index is None:
+        return None
+    first = index.loaded_at is None
+    if index.needs_refresh():
+        if first:
+            reload_index(index)
+        else:
+            threading.Thread(target=reload_index, args=(index,),
+                             name="spatial-index-reload", daemon=True).start()
+    return index
+
+
+def reload_index(index: SpatialIndex):
+    """Merge the rows of `latest_positions` into the index."""
+    try:
+        rows = position_repository.get_latest_positions()
+        index.load(rows)
+        logger.debug("Spatial index reloaded with %d positions", len(rows))
+    except Exception as e:
+        logger.error("Error reloading the spatial index: %s", e)
+
+
+def get_nearby(x: float, y: float, z: float, query: NearbyQuery,
+               exclude: UUID = None) -> list[NearbyEntity] | None:
+    """Find the entities around a point, nearest first.
+
+    Args:
+        x (float): X coordinate of the point.
+        y (float): Y coordinate of the point.
+        z (float): Z coordinate of the point.
+        query (NearbyQuery): Radius or number of neighbours, and kind filter.
+        exclude (UUID): An entity to leave out of the results.
+
+    Returns:
+        list[NearbyEntity]: The entities found.
+        None: If the spatial index is disabled.
+    """
+    index = get_index()
+    if index is None:
+        return None
+    if query.radius is not None:
+        found = index.within(x, y, z, query.radius, query.kind, exclude)
+    else:
+        found = index.nearest(x, y, z, query.k, query.kind, exclude)
+    return [
+        NearbyEntity.model_construct(id=id, kind=entry[4], x=entry[0], y=entry[1], z=entry[2],
+                                     time=entry_time(entry), distance=distance)
+        for distance, id, entry in found
+    ]
+
+
+def get_nearby_entity(id: UUID, query: NearbyQuery) -> list[NearbyEntity] | None:
+    """Find the entities around the latest position of an entity, nearest first.
+
+    Args:
+        id (UUID): The unique identifier of the entity at the center.
+        query (NearbyQuery): Radius or number of neighbours, and kind filter.
+
+    Returns:
+        list[NearbyEntity]: The entities found, the center one excluded.
+        None: If the entity has no known position or the index is disabled.
+    """
+    index = get_index()
+    entry = index.get(id) if index else None
+    if entry is None:
+        logger.warning("No indexed position for entity ID: %s", id)
+        return None
+    return get_nearby(entry[0], entry[1], entry[2], query, exclude=id)
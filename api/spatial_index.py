@@ -0,0 +1,230 @@
+import heapq
+import math
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from api.models.Position import Position
+
+# Entry of an entity: x, y, z, time (epoch ms), kind ("ship", "planet" or None)
+Entry = tuple[float, float, float, int, str | None]
+Cell = tuple[int, int, int]
+
+
+class SpatialIndex:
+    """Latest position of every entity in a uniform grid, for proximity queries.
+
+    Space is cut into cubes of `cell_size`; each occupied cube maps to the
+    entities currently in it, so a radius or nearest-neighbour query only
+    looks at the cubes around the query point. Positions only replace older
+    ones; positions with non-finite coordinates are ignored. The kind of an entity (ship or planet) comes from `load`; entities
+    first seen through `update` have no kind until the next load.
+    """
+
+    def __init__(self, cell_size: float, refresh_seconds: float):
+        self.cell_size = cell_size
+        self.refresh_seconds = refresh_seconds
+        self.loaded_at: float | None = None
+        self.queries = 0
+        self._entries: dict[uuid.UUID, Entry] = {}
+        self._cells: dict[Cell, set[uuid.UUID]] = {}
+        # Cells ever occupied lie within these bounds (min and max per axis)
+        self._low: list[int] | None = None
+        self._high: list[int] | None = None
+        self._lock = threading.Lock()
+
+    def needs_refresh(self) -> bool:
+        """Return True, once, when the index is due for a reload.
+
+        The first caller past the interval claims the reload, so concurrent
+        queries do not all hit the database.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.loaded_at is not None and (
+                    self.refresh_seconds <= 0 or now - self.loaded_at < self.refresh_seconds):
+                return False
+            self.loaded_at = now
+            return True
+
+    def load(self, rows: list[tuple]):
+        """Merge (id, x, y, z, time, kind) rows read from the database."""
+        # Convert outside of the lock, queries only wait for the merge
+        entries = [(id if isinstance(id, uuid.UUID) else uuid.UUID(id),
+                    x, y, z, int(timestamp.timestamp() * 1000), kind)
+                   for id, x, y, z, timestamp, kind in rows]
+        with self._lock:
+            for entry in entries:
+                self._put(*entry)
+
+    def update(self, positions: list[Position]):
+        """Move entities to the written positions newer than the indexed ones."""
+        with self._lock:
+            for position in positions:
+                self._put(position.id, position.x, position.y, position.z,
+                          int(position.time.timestamp() * 1000))
+
+    def get(self, id: uuid.UUID) -> Entry | None:
+        return self._entries.get(id)
+
+    def within(self, x: float, y: float, z: float, radius: float, kind: str = None,
+               exclude: uuid.UUID = None) -> list[tuple[float, uuid.UUID, Entry]]:
+        """Return the entities within `radius` of a point, nearest first.
+
+        Args:
+            x (float): X coordinate of the point.
+            y (float): Y coordinate of the point.
+            z (float): Z coordinate of the point.
+            radius (float): Maximum distance.
+            kind (str): Only return entities of this kind.
+            exclude (UUID): An entity to leave out, e.g. the one at the point.
+
+        Returns:
+            list: (distance, id, entry) tuples.
+        """
+        reach = math.ceil(radius / self.cell_size)
+        ci, cj, ck = self._cell(x, y, z)
+        found = []
+        with self._lock:
+            self.queries += 1
+            if (2 * reach + 1) ** 3 <= len(self._cells):
+                cells = [(i, j, k)
+                         for i in range(ci - reach, ci + reach + 1)
+                         for j in range(cj - reach, cj + reach + 1)
+                         for k in range(ck - reach, ck + reach + 1)]
+            else:
+                # Wide query: the occupied cells are fewer than the covered ones
+                cells = [cell for cell in self._cells
+                         if max(abs(cell[0] - ci), abs(cell[1] - cj), abs(cell[2] - ck)) <= reach]
+            for cell in cells:
+                for id in self._cells.get(cell, ()):
+                    entry = self._entries[id]
+                    if id == exclude or (kind and entry[4] != kind):
+                        continue
+                    distance = math.dist((x, y, z), entry[:3])
+                    if distance <= radius:
+                        found.append((distance, id, entry))
+        found.sort(key=lambda item: item[0])
+        return found
+
+    def nearest(self, x: float, y: float, z: float, k: int, kind: str = None,
+                exclude: uuid.UUID = None) -> list[tuple[float, uuid.UUID, Entry]]:
+        """Return the `k` entities nearest to a point, nearest first.
+
+        Cells are visited in growing shells around the point. After shell `s`,
+        every entity not seen yet is at least `s * cell_size` away, so the
+        search stops as soon as the k-th best distance is within that.
+
+        Args:
+            x (float): X coordinate of the point.
+            y (float): Y coordinate of the point.
+            z (float): Z coordinate of the point.
+            k (int): Number of entities to return.
+            kind (str): Only return entities of this kind.
+            exclude (UUID): An entity to leave out, e.g. the one at the point.
+
+        Returns:
+            list: (distance, id, entry) tuples.
+        """
+        ci, cj, ck = self._cell(x, y, z)
+        # Max-heap of the k best (negated squared distance, id) pairs
+        best: list[tuple[float, uuid.UUID]] = []
+        entries = self._entries
+
+        def consider(ids):
+            for id in ids:
+                ex, ey, ez, _, entry_kind = entries[id]
+                if id == exclude or (kind and entry_kind != kind):
+                    continue
+                item = (-((ex - x) ** 2 + (ey - y) ** 2 + (ez - z) ** 2), id)
+                if len(best) < k:
+                    heapq.heappush(best, item)
+                elif item > best[0]:
+                    heapq.heapreplace(best, item)
+
+        with self._lock:
+            self.queries += 1
+            extent = -1 if self._low is None else max(
+                max(abs(low - c), abs(high - c))
+                for low, high, c in zip(self._low, self._high, (ci, cj, ck)))
+            shell = 0
+            while shell <= extent:
+                if (2 * shell + 1) ** 3 > len(self._cells) // 8:
+                    # Sparse grid: scanning the remaining cells is cheaper than the shells
+                    for cell, ids in self._cells.items():
+                        if max(abs(cell[0] - ci), abs(cell[1] - cj), abs(cell[2] - ck)) >= shell:
+                            consider(ids)
+                    break
+                for cell in _shell(ci, cj, ck, shell):
+                    ids = self._cells.get(cell)
+                    if ids:
+                        consider(ids)
+                if len(best) == k and -best[0][0] <= (shell * self.cell_size) ** 2:
+                    break
+                shell += 1
+            result = [(math.sqrt(-distance), id, entries[id]) for distance, id in best]
+        result.sort(key=lambda item: item[0])
+        return result
+
+    def stats(self) -> dict:
+        """Return the size of the index and the age of its last reload."""
+        return {
+            "entities": len(self._entries),
+            "cells": len(self._cells),
+            "cell_size": self.cell_size,
+            "queries": self.queries,
+            "loaded_seconds_ago": (round(time.monotonic() - self.loaded_at, 3)
+                                   if self.loaded_at is not None else None),
+        }
+
+    def _cell(self, x: float, y: float, z: float) -> Cell:
+        size = self.cell_size
+        return math.floor(x / size), math.floor(y / size), math.floor(z / size)
+
+    def _put(self, id: uuid.UUID, x: float, y: float, z: float, timestamp: int, kind: str = None):
+        if not (math.isfinite(x) and math.isfinite(y) and math.isfinite(z)):
+            return
+        current = self._entries.get(id)
+        if current is not None:
+            kind = kind or current[4]
+            if current[3] > timestamp:
+                if kind != current[4]:
+                    self._entries[id] = current[:4] + (kind,)
+                return
+            old_cell = self._cell(*current[:3])
+        else:
+            old_cell = None
+        cell = self._cell(x, y, z)
+        if cell != old_cell:
+            if old_cell is not None:
+                ids = self._cells[old_cell]
+                ids.discard(id)
+                if not ids:
+                    del self._cells[old_cell]
+            self._cells.setdefault(cell, set()).add(id)
+            if self._low is None:
+                self._low, self._high = list(cell), list(cell)
+            else:
+                self._low = [min(a, b) for a, b in zip(self._low, cell)]
+                self._high = [max(a, b) for a, b in zip(self._high, cell)]
+        self._entries[id] = (x, y, z, timestamp, kind)
+
+
+def _shell(ci: int, cj: int, ck: int, shell: int):
+    """Yield the cells at Chebyshev distance `shell` from (ci, cj, ck)."""
+    if shell == 0:
+        yield ci, cj, ck
+        return
+    for i in range(ci - shell, ci + shell + 1):
+        for j in range(cj - shell, cj + shell + 1):
+            if abs(i - ci) == shell or abs(j - cj) == shell:
+                for k in range(ck - shell, ck + shell + 1):
+                    yield i, j, k
+            else:
+                yield i, j, ck - shell
+                yield i, j, ck + shell
+
+
+def entry_time(entry: Entry) -> datetime:
+    return datetime.fromtimestamp(entry[3] / 1000.0)
@@ -0,0 +1,123 @@
+import struct
+import zlib
+from typing import Sequence
+
+# Header: magic, format version, quantization step, number of samples
+TRAJECTORY_HEADER = struct.Struct("<5sBdI")
+TRAJECTORY_MAGIC = b"OWTRJ"
+TRAJECTORY_VERSION = 1
+
+
+def encode_trajectory(times: Sequence[int], xs: Sequence[float], ys: Sequence[float],
+                      zs: Sequence[float], precision: float) -> bytes:
+    """Encode a trajectory in the compact delta-of-delta format.
+
+    Coordinates are quantized to integer multiples of `precision` (the error
+    is at most `precision / 2`), times are kept as exact epoch ms. Each column
+    (time, x, y, z) is then written as its first value, its first delta, and
+    the delta of consecutive deltas for the rest, all as zigzag varints, so a
+    smooth trajectory sampled at a steady rate becomes mostly zeros. The
+    varint stream is compressed with zlib.
+
+    Args:
+        times (Sequence[int]): Sample times (epoch ms), in time order.
+        xs (Sequence[float]): X coordinates.
+        ys (Sequence[float]): Y coordinates.
+        zs (Sequence[float]): Z coordinates.
+        precision (float): Quantization step of the coordinates.
+
+    Returns:
+        bytes: The encoded trajectory, see `decode_trajectory`.
+
+    Raises:
+        ValueError: If a coordinate is not finite, or too large for `precision`.
+    """
+    stream = bytearray()
+    _write_column(stream, times)
+    for column in (xs, ys, zs):
+        try:
+            _write_column(stream, [round(value / precision) for value in column])
+        except (OverflowError, ValueError):
+            raise ValueError(f"Coordinates cannot be quantized to a precision of {precision} "
+                             "(non-finite or out of range value)")
+    header = TRAJECTORY_HEADER.pack(TRAJECTORY_MAGIC, TRAJECTORY_VERSION, precision, len(times))
+    return header + zlib.compress(bytes(stream), 9)
+
+
+def decode_trajectory(data: bytes) -> tuple[list[int], list[float], list[float], list[float]]:
+    """Reference decoder of the compact trajectory format.
+
+    Layout: a little-endian header (5-byte magic "OWTRJ", uint8 version,
+    float64 precision, uint32 sample count) followed by a zlib stream of
+    zigzag varints. The stream holds four columns one after the other: time
+    (epoch ms), then x, y and z as integer multiples of the precision. Each
+    column is its first value, the first delta, then deltas of deltas.
+
+    Args:
+        data (bytes): The encoded trajectory.
+
+    Returns:
+        tuple: (times, xs, ys, zs) lists in time order.
+
+    Raises:
+        ValueError: If the data is not a trajectory of a supported version.
+    """
+    magic, version, precision, count = TRAJECTORY_HEADER.unpack_from(data)
+    if magic != TRAJECTORY_MAGIC or version != TRAJECTORY_VERSION:
+        raise ValueError("Not a version 1 trajectory")
+    stream = zlib.decompress(data[TRAJECTORY_HEADER.size:])
+    position = 0
+    columns = []
+    for _ in range(4):
+        values = []
+        value = delta = 0
+        for index in range(count):
+            encoded, position = _read_varint(stream, position)
+            step = (encoded >> 1) ^ -(encoded & 1)
+            if index == 0:
+                value = step
+            elif index == 1:
+                delta = step
+                value += delta
+            else:
+                delta += step
+                value += delta
+            values.append(value)
+        columns.append(values)
+    times, xs, ys, zs = columns
+    return (times,
+            [value * precision for value in xs],
+            [value * precision for value in ys],
+            [value * precision for value in zs])
+
+
+def _write_column(stream: bytearray, values: Sequence[int]):
+    previous = previous_delta = 0
+    for index, value in enumerate(values):
+        if index == 0:
+            step = value
+        elif index == 1:
+            previous_delta = value - previous
+            step = previous_delta
+        else:
+            delta = value - previous
+            step = delta - previous_delta
+            previous_delta = delta
+        previous = value
+        # Zigzag: small negative and positive numbers both get short varints
+        encoded = step * 2 if step >= 0 else -step * 2 - 1
+        while encoded >= 0x80:
+            stream.append((encoded & 0x7F) | 0x80)
+            encoded >>= 7
+        stream.append(encoded)
+
+
+def _read_varint(stream: bytes, position: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = stream[position]
+        position += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, position
+        shift += 7
@@ -1,4 +1,5 @@
 import os
+import threading
 import yaml
 import psycopg2
 import logging
@@ -50,6 +51,83 @@ KAFKA_BOOTSTRAP_SERVERS = f"{
     config['kafka']['host']}:{config['kafka']['port']}"
 KAFKA_TOPIC_PLANETS = config['kafka']['topic']['planets']
 KAFKA_TOPIC_SHIPS = config['kafka']['topic']['ships']
+KAFKA_CODEC_PLANETS = config['kafka']['codec']['planets']
+KAFKA_CODEC_SHIPS = config['kafka']['codec']['ships']
+KAFKA_INGEST_IN_API = str(
+    config['kafka']['ingest_in_api']).lower() in ("1", "true", "yes")
+KAFKA_STATS_INTERVAL = float(config['kafka']['stats_interval_seconds'])
+KAFKA_GROUP_ID = config['kafka']['group_id']
+KAFKA_AUTO_OFFSET_RESET = config['kafka']['auto_offset_reset']
+KAFKA_COMMIT_POLICY = config['kafka']['commit_policy']
+KAFKA_BATCH_SIZE = int(config['kafka']['batch']['size'])
+KAFKA_BATCH_LINGER_MS = int(config['kafka']['batch']['linger_ms'])
+KAFKA_DEDUP_WINDOW = int(config['kafka']['dedup_window'])
+KAFKA_DEADBAND = {
+    type_object: (float(rule['epsilon']), int(rule['max_silence_ms']))
+    for type_object, rule in config['kafka']['deadband'].items()
+}
+KAFKA_DEADBAND_MAX_ENTITIES = int(config['kafka']['deadband_max_entities'])
+KAFKA_PIPELINE_QUEUE_SIZE = int(config['kafka']['pipeline']['queue_size'])
+KAFKA_PIPELINE_PAUSE_AT = float(config['kafka']['pipeline']['pause_at'])
+KAFKA_PIPELINE_RESUME_AT = float(config['kafka']['pipeline']['resume_at'])
+KAFKA_RESOLVE_CONCURRENCY = int(
+    config['kafka']['pipeline']['concurrency']['resolve'])
+KAFKA_WRITE_CONCURRENCY = int(
+    config['kafka']['pipeline']['concurrency']['write'])
+KAFKA_DLQ_SINK = config['kafka']['dead_letter']['sink']
+KAFKA_DLQ_PATH = config['kafka']['dead_letter']['path']
+KAFKA_DLQ_TOPIC = config['kafka']['dead_letter']['topic']
+KAFKA_DLQ_MAX_ATTEMPTS = int(config['kafka']['dead_letter']['max_attempts'])
+KAFKA_DLQ_BASE_DELAY_MS = int(config['kafka']['dead_letter']['base_delay_ms'])
+KAFKA_DLQ_MAX_DELAY_MS = int(config['kafka']['dead_letter']['max_delay_ms'])
+KAFKA_DLQ_CAPACITY = int(config['kafka']['dead_letter']['capacity'])
+KAFKA_SPOOL_ENABLED = str(
+    config['kafka']['spool']['enabled']).lower() in ("1", "true", "yes")
+KAFKA_SPOOL_DIR = config['kafka']['spool']['directory']
+KAFKA_SPOOL_SEGMENT_BYTES = int(config['kafka']['spool']['segment_bytes'])
+KAFKA_SPOOL_MAX_BYTES = int(config['kafka']['spool']['max_bytes'])
+KAFKA_SPOOL_SLOW_FLUSH_MS = int(config['kafka']['spool']['slow_flush_ms'])
+KAFKA_SPOOL_REPLAY_INTERVAL_MS = int(
+    config['kafka']['spool']['replay_interval_ms'])
+KAFKA_SPOOL_REPLAY_BATCH_SIZE = int(
+    config['kafka']['spool']['replay_batch_size'])
+KAFKA_SPOOL_REPLAY_ROWS_PER_SECOND = int(
+    config['kafka']['spool']['replay_rows_per_second'])
+
+# Name -> id resolution cache configuration
+RESOLUTION_CACHE_TTL = float(config['cache']['resolution']['ttl_seconds'])
+RESOLUTION_CACHE_NEGATIVE_TTL = float(
+    config['cache']['resolution']['negative_ttl_seconds'])
+RESOLUTION_CACHE_MAX_ENTRIES = int(
+    config['cache']['resolution']['max_entries'])
+LATEST_STORE_ENABLED = str(
+    config['cache']['latest_positions']['enabled']).lower() in ("1", "true", "yes")
+LATEST_STORE_PATH = config['cache']['latest_positions']['path']
+LATEST_STORE_CAPACITY = int(config['cache']['latest_positions']['capacity'])
+LATEST_STORE_MAX_AGE = float(
+    config['cache']['latest_positions']['max_age_seconds'])
+HISTORY_BUFFER_ENABLED = str(
+    config['cache']['history']['enabled']).lower() in ("1", "true", "yes")
+HISTORY_BUFFER_SOLE_WRITER = str(
+    config['cache']['history']['sole_writer']).lower() in ("1", "true", "yes")
+HISTORY_BUFFER_SAMPLES = int(config['cache']['history']['samples'])
+HISTORY_BUFFER_SECONDS = int(config['cache']['history']['seconds'])
+HISTORY_BUFFER_MEMORY_BUDGET = int(
+    config['cache']['history']['memory_budget_mb']) * 1024 * 1024
+SPATIAL_INDEX_ENABLED = str(
+    config['cache']['spatial']['enabled']).lower() in ("1", "true", "yes")
+SPATIAL_INDEX_CELL_SIZE = float(config['cache']['spatial']['cell_size'])
+SPATIAL_INDEX_REFRESH_SECONDS = float(
+    config['cache']['spatial']['refresh_seconds'])
+
+# Position history endpoints configuration
+HISTORY_DEFAULT_LIMIT = int(config['history']['default_limit'])
+HISTORY_MAX_LIMIT = int(config['history']['max_limit'])
+HISTORY_MAX_DOWNSAMPLE_ROWS = int(config['history']['max_downsample_rows'])
+HISTORY_DOWNSAMPLE_OVERSAMPLING = int(config['history']['downsample_oversampling'])
+HISTORY_STREAM_CHUNK_ROWS = int(config['history']['stream_chunk_rows'])
+TRAJECTORY_DEFAULT_PRECISION = float(config['history']['trajectory_precision'])
+ANALYTICS_MOVING_SPEED = float(config['history']['moving_speed'])
 
 # Configure logging
 
@@ -94,3 +172,30 @@ def connect_to_db():
     except Exception as e:
         logger.error(f"Error connecting to the database: {e}")
         return None, None
+
+
+# Connections of the worker threads, see thread_connection
+_thread_connections = threading.local()
+
+
+def thread_connection():
+    """Return the database connection of the calling thread, connecting if needed.
+
+    A psycopg2 cursor must not be used by several threads at once, so code
+    running in worker threads (e.g. the ingest name resolution) queries
+    through a connection of its own instead of the module-level ones. The
+    connection is in autocommit mode: a failed query never leaves an
+    aborted transaction behind.
+
+    Returns:
+        connection: The connection of the thread, or None if Postgres is unreachable.
+    """
+    connection = getattr(_thread_connections, "connection", None)
+    if connection is None or connection.closed:
+        connection, cursor = connect_to_db()
+        if connection is None:
+            return None
+        cursor.close()
+        connection.autocommit = True
+        _thread_connections.connection = connection
+    return connection
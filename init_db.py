@@ -1,6 +1,7 @@
 from config.config import connect_to_db, get_logger
 from api.services import user_service
 from api.models.User import UserForCreate
+from api.rollups import AGGREGATE_QUERY, ROLLUP_COLUMNS, ROLLUPS, rollup_table
 
 logger = get_logger()
 
@@ -109,6 +110,115 @@ def create_positions_table():
         connection.close()
 
 
+def create_consumer_offsets_table():
+    """Create the 'consumer_offsets' table in the database if it doesn't exist."""
+    connection, cursor = connect_to_db()
+    if connection is None or cursor is None:
+        logger.error("Failed to connect to the database.")
+        return
+
+    create_table_query = """
+    CREATE TABLE IF NOT EXISTS consumer_offsets (
+        group_id VARCHAR(255),
+        topic VARCHAR(255),
+        partition INT,
+        next_offset BIGINT NOT NULL,
+        PRIMARY KEY (group_id, topic, partition)
+    )
+    """
+    try:
+        cursor.execute(create_table_query)
+        connection.commit()
+        logger.info("'consumer_offsets' table created successfully.")
+    except Exception as e:
+        logger.exception("Error creating 'consumer_offsets' table: %s", e)
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def create_latest_positions_table():
+    """Create the 'latest_positions' table and fill it from the position history.
+
+    The table holds the most recent position of each entity and is kept up
+    to date by the position writes.
+    """
+    connection, cursor = connect_to_db()
+    if connection is None or cursor is None:
+        logger.error("Failed to connect to the database.")
+        return
+
+    create_table_query = """
+    CREATE TABLE IF NOT EXISTS latest_positions (
+        id UUID PRIMARY KEY,
+        x FLOAT,
+        y FLOAT,
+        z FLOAT,
+        time TIMESTAMP(3)
+    )
+    """
+    backfill_query = """
+    INSERT INTO latest_positions (id, x, y, z, time)
+    SELECT DISTINCT ON (id) id, x, y, z, time
+    FROM positions
+    ORDER BY id, time DESC
+    ON CONFLICT (id) DO NOTHING
+    """
+    try:
+        cursor.execute(create_table_query)
+        cursor.execute(backfill_query)
+        connection.commit()
+        logger.info("'latest_positions' table created successfully.")
+    except Exception as e:
+        logger.exception("Error creating 'latest_positions' table: %s", e)
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def create_rollup_tables():
+    """Create the position rollup tables and fill them from the position history.
+
+    There is one table per rollup resolution, with the summary of each entity
+    over each bucket. They are kept up to date by the position writes.
+    """
+    connection, cursor = connect_to_db()
+    if connection is None or cursor is None:
+        logger.error("Failed to connect to the database.")
+        return
+
+    try:
+        for resolution in ROLLUPS:
+            table = rollup_table(resolution)
+            cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id UUID NOT NULL,
+                bucket TIMESTAMP NOT NULL,
+                samples BIGINT NOT NULL,
+                min_x FLOAT, max_x FLOAT,
+                min_y FLOAT, max_y FLOAT,
+                min_z FLOAT, max_z FLOAT,
+                sum_x FLOAT, sum_y FLOAT, sum_z FLOAT,
+                distance FLOAT NOT NULL,
+                first_time TIMESTAMP(3), first_x FLOAT, first_y FLOAT, first_z FLOAT,
+                last_time TIMESTAMP(3), last_x FLOAT, last_y FLOAT, last_z FLOAT,
+                PRIMARY KEY (id, bucket)
+            )
+            """)
+            cursor.execute(f"""
+            INSERT INTO {table} {ROLLUP_COLUMNS}
+            {AGGREGATE_QUERY.format(resolution=resolution, source="positions")}
+            ON CONFLICT (id, bucket) DO NOTHING
+            """)
+        connection.commit()
+        logger.info("Rollup tables created successfully.")
+    except Exception as e:
+        logger.exception("Error creating rollup tables: %s", e)
+    finally:
+        cursor.close()
+        connection.close()
+
+
 def initialize_db():
     """Initialize the database with an admin user if not already present."""
     admin_email = "admin@example.com"
@@ -144,4 +254,7 @@ if __name__ == "__main__":
     create_ships_table()
     create_planets_table()
     create_positions_table()
+    create_consumer_offsets_table()
+    create_latest_positions_table()
+    create_rollup_tables()
     initialize_db()
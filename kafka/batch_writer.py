@@ -0,0 +1,346 @@
+import asyncio
+import inspect
+from typing import Awaitable, Callable, Hashable
+
+from config.config import KAFKA_BATCH_SIZE, KAFKA_BATCH_LINGER_MS
+from config.config import KAFKA_DLQ_MAX_ATTEMPTS, KAFKA_DLQ_BASE_DELAY_MS, KAFKA_DLQ_MAX_DELAY_MS
+from config.config import get_logger
+
+from api.models.Position import Position
+from api.services import position_service
+
+from kafka.dedup import DedupWindow
+from kafka.spool import PositionSpool
+
+logger = get_logger()
+
+
+class PositionBatchWriter:
+    """Buffer positions coming from Kafka and write them in bulk.
+
+    A batch is flushed when it reaches `max_size` rows or when its oldest row
+    has been waiting for `linger_ms`, whichever comes first. The database call
+    runs in a worker thread so the consumer keeps fetching while a batch is
+    being written.
+
+    The consumer marks every processed offset with `mark`. Once a batch is
+    durable, `on_flush` is awaited with the highest offset marked per
+    partition before that batch was cut, so offsets are never committed ahead
+    of the data they cover. A batch the database refuses is kept, with its
+    offsets, and retried with exponential backoff by the next flushes, so
+    offsets never move past it; while it is held, `add` waits for the retry
+    instead of growing the buffer, which pauses the pipeline. After
+    `max_attempts` failed flushes it is handed to `on_failure` when set (it
+    may be a coroutine function and must durably take the rows, e.g. to the
+    dead-letter sink); once that returns its offsets are committed.
+
+    With `offsets_group`, the offsets are also saved in Postgres in the same
+    transaction as the batch (partitions must then be TopicPartitions), so
+    the stored offsets always match the stored positions.
+
+    With a `dedup` window, a position whose (id, time) was recently written,
+    or is already buffered, is dropped before reaching the database. Keys
+    only enter the window once their batch is durable. Older duplicates are
+    skipped by the database itself (ON CONFLICT DO NOTHING).
+
+    `on_written`, when set, is called with every batch once it is durable
+    (written or spooled). `add` also returns a future resolved with the
+    outcome of the batch the position joined: True once it is durable,
+    False if it was handed to `on_failure`.
+
+    With a `spool`, a batch the database refuses, or a flush slower than the
+    spool's `slow_flush_ms`, switches the writer to degraded mode: batches are
+    then appended to the local spool, which replays them once Postgres keeps
+    up again. A spooled batch is durable, so its offsets are committed;
+    batches the spool cannot take are held and retried as above. Offsets
+    saved in Postgres are not updated while spooling.
+    """
+
+    def __init__(
+        self,
+        max_size: int = KAFKA_BATCH_SIZE,
+        linger_ms: int = KAFKA_BATCH_LINGER_MS,
+        on_flush: Callable[[dict], Awaitable[None]] = None,
+        on_failure: Callable[[list[Position]], Awaitable[None] | None] = None,
+        dedup: DedupWindow = None,
+        offsets_group: str = None,
+        spool: PositionSpool = None,
+        on_written: Callable[[list[Position]], None] = None,
+        max_attempts: int = KAFKA_DLQ_MAX_ATTEMPTS,
+        base_delay_ms: int = KAFKA_DLQ_BASE_DELAY_MS,
+        max_delay_ms: int = KAFKA_DLQ_MAX_DELAY_MS
+    ):
+        self.max_size = max_size
+        self.linger = linger_ms / 1000.0
+        self.on_flush = on_flush
+        self.on_failure = on_failure
+        self.dedup = dedup
+        self.offsets_group = offsets_group
+        self.spool = spool
+        self.on_written = on_written
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay_ms / 1000.0
+        self.max_delay = max_delay_ms / 1000.0
+        self._buffer: list[Position] = []
+        self._offsets: dict[Hashable, int] = {}
+        # (id, time) of the buffered positions, while a dedup window is used
+        self._keys: set[tuple] = set()
+        # Outcome futures of the buffered batches, the last one taking new rows
+        self._waiters: list[asyncio.Future] = []
+        self._waiter: asyncio.Future | None = None
+        self._opened_at: float | None = None
+        # Consecutive failed flushes of the held batch, and when to retry it
+        self._attempts = 0
+        self._retry_at: float | None = None
+        self._lock = asyncio.Lock()
+        self._linger_task: asyncio.Task | None = None
+        self.batches = 0
+        self.failed_batches = 0
+        self.rows_written = 0
+        self.rows_spooled = 0
+        self.conflicts = 0
+        self.last_flush = 0.0
+
+    async def start(self):
+        """Start the background task enforcing the time limit."""
+        self._linger_task = asyncio.create_task(self._linger_loop())
+        logger.info("Position batch writer started (size=%d, linger=%.3fs)",
+                    self.max_size, self.linger)
+
+    async def stop(self):
+        """Stop the background task and flush whatever is still buffered."""
+        if self._linger_task:
+            self._linger_task.cancel()
+            try:
+                await self._linger_task
+            except asyncio.CancelledError:
+                pass
+            self._linger_task = None
+        await self.flush()
+        # A batch still held is not written by this writer any more
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(False)
+        logger.info("Position batch writer stopped.")
+
+    async def add(self, position: Position) -> asyncio.Future | None:
+        """Buffer a position, flushing immediately if the batch is full.
+
+        Args:
+            position (Position): The position to write.
+
+        Returns:
+            asyncio.Future: Resolved with True once the position is durable,
+                False if its batch was handed to `on_failure`.
+            None: If the position was dropped as a duplicate.
+        """
+        if self.dedup:
+            key = (position.id, position.time)
+            if key in self._keys:
+                self.dedup.duplicates += 1
+                return None
+            if self.dedup.seen(key):
+                return None
+            self._keys.add(key)
+        self._open()
+        self._buffer.append(position)
+        if self._waiter is None:
+            self._waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(self._waiter)
+        waiter = self._waiter
+        if len(self._buffer) >= self.max_size:
+            await self._wait_retry()
+            await self.flush()
+        return waiter
+
+    def mark(self, partition: Hashable, offset: int):
+        """Record that `offset` of `partition` has been processed.
+
+        Args:
+            partition (Hashable): The partition the record came from.
+            offset (int): The offset of the processed record.
+        """
+        self._open()
+        self._offsets[partition] = offset
+
+    def forget(self, partitions):
+        """Drop the offsets marked for revoked partitions.
+
+        Their positions are still written, but the offsets must not be
+        committed (or stored) on behalf of the partitions' next owner.
+        """
+        for partition in partitions:
+            self._offsets.pop(partition, None)
+
+    async def flush(self, force: bool = True) -> int:
+        """Write the buffered positions in a single transaction.
+
+        Args:
+            force (bool): Retry a held batch right away; otherwise leave it to
+                the background retry when its backoff has not elapsed.
+
+        Returns:
+            int: The number of rows written.
+        """
+        async with self._lock:
+            if not self._buffer and not self._offsets:
+                return 0
+            if (not force and self._retry_at is not None
+                    and self._retry_at > asyncio.get_running_loop().time()):
+                return 0
+            batch, self._buffer = self._buffer, []
+            offsets, self._offsets = self._offsets, {}
+            waiters, self._waiters = self._waiters, []
+            self._waiter = None
+            self._opened_at = None
+
+            if self.spool and self.spool.degraded:
+                if batch and not await self._spool(batch, waiters):
+                    return self._hold(batch, offsets, waiters)
+                if offsets and self.on_flush:
+                    await self.on_flush(offsets)
+                return 0
+
+            stored_offsets = None
+            if self.offsets_group:
+                stored_offsets = {(tp.topic, tp.partition): offset + 1
+                                  for tp, offset in offsets.items()}
+
+            written = 0
+            if batch or stored_offsets:
+                loop = asyncio.get_running_loop()
+                started = loop.time()
+                written = await asyncio.to_thread(
+                    position_service.add_positions, batch, self.offsets_group, stored_offsets)
+                self.last_flush = loop.time() - started
+                if written is None:
+                    self.failed_batches += 1
+                    if self.spool:
+                        self.spool.degrade("database write failed")
+                        if batch and not await self._spool(batch, waiters):
+                            return self._hold(batch, offsets, waiters)
+                    elif not await self._give_up(batch, waiters):
+                        return self._hold(batch, offsets, waiters)
+                    written = 0
+                else:
+                    self._attempts = 0
+                    self._retry_at = None
+                    self._settle(batch, waiters, durable=True)
+                    self.batches += 1
+                    self.rows_written += written
+                    self.conflicts += len(batch) - written
+                    if self.spool and self.spool.is_slow(self.last_flush):
+                        self.spool.degrade(f"flush took {self.last_flush * 1000:.0f} ms")
+            logger.debug("Flushed %d/%d positions", written, len(batch))
+
+            if offsets and self.on_flush:
+                await self.on_flush(offsets)
+            return written
+
+    def stats(self) -> dict:
+        """Return buffer occupancy and flush counters."""
+        return {
+            "buffered": len(self._buffer),
+            "max_size": self.max_size,
+            "failed_attempts": self._attempts,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "rows_written": self.rows_written,
+            "duplicates_dropped": self.dedup.duplicates if self.dedup else 0,
+            "conflicts_skipped": self.conflicts,
+            "rows_spooled": self.rows_spooled,
+            "last_flush_ms": round(self.last_flush * 1000, 3),
+            "spool": self.spool.stats() if self.spool else None,
+        }
+
+    async def _spool(self, batch: list[Position], waiters: list[asyncio.Future]) -> bool:
+        """Append a batch to the spool, handing it to `on_failure` if refused.
+
+        Returns:
+            bool: False if the batch is neither spooled nor handed over, it
+            must then be held with its offsets.
+        """
+        if await self.spool.append(batch):
+            self.rows_spooled += len(batch)
+            self._settle(batch, waiters, durable=True)
+            self._attempts = 0
+            self._retry_at = None
+            return True
+        return await self._give_up(batch, waiters)
+
+    async def _give_up(self, batch: list[Position], waiters: list[asyncio.Future]) -> bool:
+        """Hand a failed batch to `on_failure` once it has used all its attempts.
+
+        Returns:
+            bool: True if the callback took the rows.
+        """
+        if not batch:
+            return False
+        if self.on_failure is None or self._attempts + 1 < self.max_attempts:
+            return False
+        try:
+            result = self.on_failure(batch)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.error("Could not hand over a failed batch of %d positions: %s", len(batch), e)
+            return False
+        self._settle(batch, waiters, durable=False)
+        self._attempts = 0
+        self._retry_at = None
+        return True
+
+    def _settle(self, batch: list[Position], waiters: list[asyncio.Future], durable: bool):
+        """Release a batch that left the writer, reporting its outcome."""
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(durable)
+        if self.dedup:
+            keys = [(position.id, position.time) for position in batch]
+            self._keys.difference_update(keys)
+            if durable:
+                self.dedup.add(keys)
+        if durable and self.on_written and batch:
+            self.on_written(batch)
+
+    def _hold(self, batch: list[Position], offsets: dict, waiters: list[asyncio.Future]) -> int:
+        """Put a failed batch back in front of the buffer, with its offsets.
+
+        Offsets marked since the batch was cut are higher and win; they are
+        committed together with the batch once it is written.
+        """
+        self._buffer = batch + self._buffer
+        self._offsets = {**offsets, **self._offsets}
+        self._waiters = waiters + self._waiters
+        self._open()
+        self._attempts += 1
+        delay = min(self.max_delay, self.base_delay * 2 ** (self._attempts - 1))
+        self._retry_at = asyncio.get_running_loop().time() + delay
+        logger.error("Batch of %d positions not written (attempt %d), retrying in %.1fs",
+                     len(batch), self._attempts, delay)
+        return 0
+
+    async def _wait_retry(self):
+        if self._retry_at is not None:
+            remaining = self._retry_at - asyncio.get_running_loop().time()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+
+    def _open(self):
+        if self._opened_at is None:
+            self._opened_at = asyncio.get_running_loop().time()
+
+    async def _linger_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if self._opened_at is None:
+                await asyncio.sleep(self.linger)
+                continue
+            remaining = max(self._opened_at + self.linger, self._retry_at or 0) - loop.time()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+                continue
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.exception("Error flushing position batch: %s", e)
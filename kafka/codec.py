@@ -0,0 +1,104 @@
+import math
+import struct
+
+import orjson
+
+from api.models.Message import Message
+
+# Binary layout: type code, name length, x, y, z, timestamp (ms), then the
+# UTF-8 name. Little-endian, 34 bytes + name.
+BINARY_HEADER = struct.Struct("<BBdddq")
+BINARY_TYPES = ("planet", "ship")
+BINARY_TYPE_CODES = {type_object: code for code, type_object in enumerate(BINARY_TYPES)}
+
+
+class PydanticJsonCodec:
+    """Reference JSON codec validating every record with the `Message` model."""
+    name = "pydantic"
+
+    def decode(self, value: bytes) -> Message:
+        return Message.model_validate_json(value)
+
+    def encode(self, message: Message) -> bytes:
+        return message.model_dump_json().encode("utf-8")
+
+
+class JsonCodec:
+    """Fast JSON codec.
+
+    Parses with orjson and checks field types directly, then builds the
+    `Message` without running validation again. Records that do not have the
+    exact expected types (numeric strings, missing fields...) fall back to
+    full pydantic validation, so they are accepted or rejected exactly as
+    before.
+    """
+    name = "json"
+
+    def decode(self, value: bytes) -> Message:
+        data = orjson.loads(value)
+        try:
+            type_object = data["type_object"]
+            name = data["name"]
+            x = data["x"]
+            y = data["y"]
+            z = data["z"]
+            timestamp = data["timestamp"]
+        except (KeyError, TypeError):
+            return Message.model_validate(data)
+
+        if (type(type_object) is str and type(name) is str
+                and type(x) in (float, int) and type(y) in (float, int)
+                and type(z) in (float, int) and type(timestamp) is int):
+            return Message.model_construct(
+                type_object=type_object, name=name,
+                x=float(x), y=float(y), z=float(z), timestamp=timestamp
+            )
+        return Message.model_validate(data)
+
+    def encode(self, message: Message) -> bytes:
+        return orjson.dumps(message.model_dump())
+
+
+class BinaryCodec:
+    """Compact fixed-layout binary codec (see `BINARY_HEADER`)."""
+    name = "binary"
+
+    def decode(self, value: bytes) -> Message:
+        if len(value) < BINARY_HEADER.size:
+            raise ValueError(f"Binary record too short: {len(value)} bytes")
+        code, name_length, x, y, z, timestamp = BINARY_HEADER.unpack_from(value)
+        if code >= len(BINARY_TYPES):
+            raise ValueError(f"Unknown binary type code: {code}")
+        if len(value) != BINARY_HEADER.size + name_length:
+            raise ValueError(f"Binary record length mismatch: {len(value)} bytes")
+        if not (math.isfinite(x) and math.isfinite(y) and math.isfinite(z)):
+            raise ValueError(f"Non-finite coordinates in binary record: {x}, {y}, {z}")
+        return Message.model_construct(
+            type_object=BINARY_TYPES[code],
+            name=value[BINARY_HEADER.size:].decode("utf-8"),
+            x=x, y=y, z=z, timestamp=timestamp
+        )
+
+    def encode(self, message: Message) -> bytes:
+        name = message.name.encode("utf-8")
+        if len(name) > 255:
+            raise ValueError(f"Name too long for binary encoding: {message.name}")
+        return BINARY_HEADER.pack(
+            BINARY_TYPE_CODES[message.type_object], len(name),
+            message.x, message.y, message.z, message.timestamp
+        ) + name
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec(), PydanticJsonCodec(), BinaryCodec())}
+
+
+def get_codec(name: str):
+    """Return the codec registered under `name`.
+
+    Raises:
+        ValueError: If no codec has this name.
+    """
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown codec: {name} (available: {', '.join(CODECS)})")
@@ -1,118 +1,282 @@
 import asyncio
 import logging
 from datetime import datetime
-from aiokafka import AIOKafkaConsumer
+from aiokafka import AIOKafkaConsumer, ConsumerRebalanceListener
+from aiokafka.errors import CommitFailedError
 from contextlib import asynccontextmanager
 from config.config import KAFKA_BOOTSTRAP_SERVERS, KAFKA_TOPIC_PLANETS, KAFKA_TOPIC_SHIPS
-from pydantic import ValidationError
+from config.config import KAFKA_CODEC_PLANETS, KAFKA_CODEC_SHIPS
+from config.config import (
+    KAFKA_GROUP_ID,
+    KAFKA_AUTO_OFFSET_RESET,
+    KAFKA_COMMIT_POLICY,
+    KAFKA_INGEST_IN_API,
+    KAFKA_DEDUP_WINDOW,
+    KAFKA_DEADBAND,
+    KAFKA_DEADBAND_MAX_ENTITIES,
+    KAFKA_SPOOL_ENABLED,
+    KAFKA_RESOLVE_CONCURRENCY,
+    KAFKA_WRITE_CONCURRENCY
+)
 from config.config import get_logger
 
+from api.exceptions import NotFoundException
 from api.services import planet_service, ship_service, position_service
 
 from api.models.Message import Message
 from api.models.Position import Position
 
+from kafka.batch_writer import PositionBatchWriter
+from kafka.codec import get_codec
+from kafka.dead_letter import DeadLetterQueue, build_sink
+from kafka.dedup import DedupWindow
+from kafka.deadband import DeadbandFilter
+from kafka.pipeline import IngestPipeline, Stage
+from kafka.spool import PositionSpool
+
 logger = get_logger()
 
+# Codec used to decode the records of each topic
+TOPIC_CODECS = {
+    KAFKA_TOPIC_PLANETS: get_codec(KAFKA_CODEC_PLANETS),
+    KAFKA_TOPIC_SHIPS: get_codec(KAFKA_CODEC_SHIPS),
+}
+
+
+class FlushOnRevoke(ConsumerRebalanceListener):
+    """Flush the batch writer before partitions are taken away.
+
+    This commits the offsets of everything processed so far while this
+    consumer still owns the partitions, so the next owner resumes right after.
+
+    With the `transactional` commit policy, newly assigned partitions are
+    moved to the offsets stored in Postgres alongside the positions.
+    """
+
+    def __init__(self, pipeline: IngestPipeline, consumer=None, offsets_group: str = None):
+        self.pipeline = pipeline
+        self.consumer = consumer
+        self.offsets_group = offsets_group
+
+    async def on_partitions_revoked(self, revoked):
+        logger.info("Partitions revoked: %s", revoked)
+        # Stop tracking first so no offset of a revoked partition can be
+        # marked after this last flush
+        self.pipeline.forget(revoked)
+        self.pipeline.writer.forget(revoked)
+        await self.pipeline.writer.flush()
+        # Entities of the revoked partitions will no longer be written by
+        # this process, their recent history would go stale
+        if revoked and position_service.recent_history:
+            position_service.recent_history.clear()
+
+    async def on_partitions_assigned(self, assigned):
+        logger.info("Partitions assigned: %s", assigned)
+        if not self.offsets_group:
+            return
+        stored = await asyncio.to_thread(
+            position_service.get_consumer_offsets, self.offsets_group)
+        for tp in assigned:
+            next_offset = stored.get((tp.topic, tp.partition))
+            if next_offset is not None:
+                self.consumer.seek(tp, next_offset)
+                logger.info("Resuming %s at stored offset %d", tp, next_offset)
+
 
 @asynccontextmanager
 async def kafka_lifespan(app):
-    """Lifespan context manager for Kafka consumer lifecycle.
+    """Lifespan context manager running Kafka ingestion inside the API.
 
-    This context manager initializes a Kafka consumer, starts it, and ensures
-    proper cleanup of resources when exiting the context.
+    Ingestion only runs in the API process when `kafka.ingest_in_api` is
+    enabled; otherwise it is left to the standalone worker (`worker.py`).
+    The running pipeline is exposed as `app.state.ingest` so its statistics
+    can be served by the API.
 
     Args:
-        app: The FastAPI application instance (not used in this example).
+        app: The FastAPI application instance.
 
     Yields:
         None: The context does not pass any specific object.
     """
+    app.state.ingest = None
+    if not KAFKA_INGEST_IN_API:
+        logger.info("Kafka ingestion disabled in the API process.")
+        yield
+        return
+
+    async with ingest_session() as pipeline:
+        app.state.ingest = pipeline
+        try:
+            yield
+        finally:
+            app.state.ingest = None
+
+
+@asynccontextmanager
+async def ingest_session():
+    """Context manager for the Kafka consumer and ingest pipeline lifecycle.
+
+    This context manager initializes a Kafka consumer and the ingest pipeline
+    (decode, resolve and batched write stages), starts them, and ensures
+    proper cleanup of resources when exiting the context. Queued records are
+    drained and positions still buffered at shutdown are flushed.
+
+    The consumer joins the `kafka.group_id` consumer group. With the `batch`
+    commit policy, offsets are committed manually once the batch holding
+    their positions is durable in the database. With the `transactional`
+    policy, offsets are also stored in Postgres in the same transaction as
+    the positions and partitions resume from there, giving exactly-once
+    effects; the Kafka commit is then only informational (lag monitoring).
+
+    When `kafka.spool.enabled` is set, batches are spooled to local files
+    while Postgres is unavailable or slow and replayed once it recovers.
+
+    Yields:
+        IngestPipeline: The running pipeline.
+    """
+    manual_commit = KAFKA_COMMIT_POLICY in ("batch", "transactional")
+    offsets_group = KAFKA_GROUP_ID if KAFKA_COMMIT_POLICY == "transactional" else None
     consumer = AIOKafkaConsumer(
-        *[KAFKA_TOPIC_PLANETS, KAFKA_TOPIC_SHIPS],
         bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
-        group_id=None
+        group_id=KAFKA_GROUP_ID,
+        auto_offset_reset=KAFKA_AUTO_OFFSET_RESET,
+        enable_auto_commit=not manual_commit
     )
+
+    async def commit_offsets(offsets: dict):
+        assigned = consumer.assignment()
+        offsets = {tp: offset + 1 for tp, offset in offsets.items() if tp in assigned}
+        if not offsets:
+            return
+        try:
+            await consumer.commit(offsets)
+            logger.debug("Committed offsets: %s", offsets)
+        except CommitFailedError as e:
+            logger.warning("Offset commit failed (group rebalanced?): %s", e)
+
+    dead_letters = DeadLetterQueue(build_sink())
+    spool = PositionSpool() if KAFKA_SPOOL_ENABLED else None
+    deadband = DeadbandFilter(KAFKA_DEADBAND, KAFKA_DEADBAND_MAX_ENTITIES)
+    writer = PositionBatchWriter(
+        on_flush=commit_offsets if manual_commit else None,
+        on_failure=dead_letters.dead_letter_batch,
+        dedup=DedupWindow(KAFKA_DEDUP_WINDOW) if KAFKA_DEDUP_WINDOW > 0 else None,
+        offsets_group=offsets_group,
+        spool=spool,
+        on_written=deadband.remember)
+    pipeline = build_pipeline(consumer, writer, dead_letters, deadband)
+
     await consumer.start()
-    logger.info(f"Kafka consumer started for topics: {KAFKA_TOPIC_PLANETS}, {KAFKA_TOPIC_SHIPS}")
+    consumer.subscribe([KAFKA_TOPIC_PLANETS, KAFKA_TOPIC_SHIPS],
+                       listener=FlushOnRevoke(pipeline, consumer, offsets_group))
+    logger.info(f"Kafka consumer started for topics: {KAFKA_TOPIC_PLANETS}, {KAFKA_TOPIC_SHIPS} "
+                f"(group={KAFKA_GROUP_ID}, commit={KAFKA_COMMIT_POLICY})")
 
-    # Create a task to consume messages
-    consumer_task = asyncio.create_task(consume_messages(consumer))
+    await dead_letters.start()
+    if spool:
+        await spool.start()
+    await writer.start()
+    await pipeline.start()
 
     try:
-        yield
+        yield pipeline
     finally:
-        # Cancel the consumer task and ensure proper cleanup
-        consumer_task.cancel()
-        try:
-            await asyncio.shield(consumer_task)
-        except asyncio.CancelledError:
-            logger.info("Consumer task cancelled.")
+        await pipeline.stop()
+        # Stop retries first so nothing is added to the writer once it is
+        # stopped; letters from its last flush are still sent to the sink.
+        await dead_letters.stop_retries()
+        await writer.stop()
+        if spool:
+            # Segments left are replayed by the next session
+            await spool.stop()
+        await dead_letters.stop()
         await consumer.stop()
         logger.info("Kafka consumer stopped.")
 
 
-async def consume_messages(consumer):
-    """Consume messages from Kafka topics asynchronously.
+def build_pipeline(consumer, writer: PositionBatchWriter, dead_letters: DeadLetterQueue = None,
+                   deadband: DeadbandFilter = None) -> IngestPipeline:
+    """Assemble the decode -> resolve -> write pipeline for a consumer.
+
+    Args:
+        consumer: An instance of AIOKafkaConsumer to fetch records from.
+        writer (PositionBatchWriter): The writer buffering positions for bulk insert.
+        dead_letters (DeadLetterQueue): Where failed records are retried and dead-lettered.
+        deadband (DeadbandFilter): Drops resolved samples that barely moved; it
+            must be fed the written batches (`writer.on_written`).
+
+    Returns:
+        IngestPipeline: The pipeline, not started yet.
+    """
+    def resolve(message: Message) -> Position:
+        position = resolve_position(message)
+        if position is None or (deadband and not deadband.accept(message.type_object, position)):
+            return None
+        return position
+
+    return IngestPipeline(consumer, writer, [
+        Stage("decode", decode_message, 1),
+        Stage("resolve", resolve, KAFKA_RESOLVE_CONCURRENCY, blocking=True),
+        Stage("write", writer.add, KAFKA_WRITE_CONCURRENCY),
+    ], dead_letters)
+
 
-    This function processes messages received from Kafka topics and performs
-    necessary operations, including data validation and service calls.
+def decode_message(record) -> Message:
+    """Decode and validate a Kafka record with the codec of its topic.
 
     Args:
-        consumer: An instance of AIOKafkaConsumer initialized with topics to consume.
+        record: The Kafka record (ConsumerRecord).
+
+    Returns:
+        Message: The validated message.
 
     Raises:
-        asyncio.CancelledError: When the task is cancelled, this exception is propagated.
+        ValidationError: If a JSON payload is not a valid message.
+        ValueError: If the payload cannot be decoded.
     """
-    try:
-        async for msg in consumer:
-            try:
-                # Decode the message
-                message_value = msg.value.decode('utf-8')
-
-                # Validate and parse the message using a Pydantic model
-                message: Message = Message.model_validate_json(message_value)
-
-                id = None
-                if message.type_object == "planet":
-                    # Retrieve or create a planet by its name
-                    planet = planet_service.get_planet_by_name(message.name)
-                    if not planet:
-                        planet = planet_service.create(message.name)
-                    id = planet.id
-
-                elif message.type_object == "ship":
-                    # Retrieve a ship by its name, raising an error if not found
-                    ship = ship_service.get_ship_by_name(message.name)
-                    if not ship:
-                        logger.error(f"Ship not found for name: {message.name}")
-                        raise ValueError(f"Ship not found: {message.name}")
-                    id = ship.id
-
-                if id:
-                    # Convert the timestamp to a datetime object and create a position
-                    position_time = datetime.fromtimestamp(
-                        message.timestamp / 1000.0)
-                    position = Position(
-                        id=id,
-                        x=message.x,
-                        y=message.y,
-                        z=message.z,
-                        time=position_time
-                    )
-                    position_service.add_position(position)
-
-            except ValidationError as ve:
-                # Log validation errors for invalid messages
-                logger.error(f"Validation error for message: {msg.value}, error: {ve}")
-            except ValueError as ve:
-                # Log value errors for missing or invalid entities
-                logger.error(f"Value error: {ve}")
-            except Exception as e:
-                # Log unexpected errors during message processing
-                logger.exception(f"Unexpected error processing message: {msg.value}, error: {e}")
-
-    except asyncio.CancelledError:
-        # Log when the task is cancelled
-        logger.info("Message consumption cancelled.")
-        raise
+    return TOPIC_CODECS[record.topic].decode(record.value)
+
+
+def resolve_position(message: Message) -> Position:
+    """Resolve the entity a message refers to and build its position.
+
+    Planets are created on the fly when unknown; ships must already exist.
+    Runs in worker threads: lookups use a database connection per thread.
+
+    Args:
+        message (Message): The validated message.
+
+    Returns:
+        Position: The position to write.
+        None: If the object type is not handled.
+
+    Raises:
+        NotFoundException: If the ship does not exist.
+        ConnectionError: If Postgres is unreachable.
+    """
+    id = None
+    if message.type_object == "planet":
+        # Resolve (cached) or create a planet by its name
+        id = planet_service.resolve_or_create_planet_id(message.name)
+
+    elif message.type_object == "ship":
+        # Resolve a ship by its name (cached, including misses),
+        # raising an error if not found
+        id = ship_service.resolve_ship_id(message.name)
+        if not id:
+            raise NotFoundException(f"Ship not found: {message.name}")
+
+    if not id:
+        return None
+
+    # Convert the timestamp to a datetime object and create a position.
+    # The message is already validated, so the model is built without
+    # validating it a second time.
+    position_time = datetime.fromtimestamp(message.timestamp / 1000.0)
+    return Position.model_construct(
+        id=id,
+        x=message.x,
+        y=message.y,
+        z=message.z,
+        time=position_time
+    )
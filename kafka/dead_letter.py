@@ -0,0 +1,317 @@
+import asyncio
+import base64
+import heapq
+import itertools
+import os
+import random
+import time
+from typing import Awaitable, Callable
+
+import orjson
+from aiokafka import AIOKafkaProducer
+from pydantic import ValidationError
+
+from config.config import (
+    KAFKA_BOOTSTRAP_SERVERS,
+    KAFKA_DLQ_SINK,
+    KAFKA_DLQ_PATH,
+    KAFKA_DLQ_TOPIC,
+    KAFKA_DLQ_MAX_ATTEMPTS,
+    KAFKA_DLQ_BASE_DELAY_MS,
+    KAFKA_DLQ_MAX_DELAY_MS,
+    KAFKA_DLQ_CAPACITY
+)
+from config.config import get_logger
+
+from api.exceptions import NotFoundException
+from api.models.Message import Message
+from api.models.Position import Position
+
+logger = get_logger()
+
+
+class FileDeadLetterSink:
+    """Append dead letters as NDJSON lines to a local file, synced to disk on every write."""
+
+    def __init__(self, path: str = KAFKA_DLQ_PATH):
+        self.path = path
+
+    async def start(self):
+        logger.info("Dead letters are written to file: %s", self.path)
+
+    async def stop(self):
+        pass
+
+    async def write(self, letters: list[dict]):
+        await asyncio.to_thread(self._append, letters)
+
+    def _append(self, letters: list[dict]):
+        with open(self.path, "ab") as file:
+            file.write(b"".join(orjson.dumps(letter) + b"\n" for letter in letters))
+            file.flush()
+            os.fsync(file.fileno())
+
+
+class KafkaDeadLetterSink:
+    """Publish dead letters as JSON records to a Kafka topic.
+
+    A write returns once every record is acknowledged by all in-sync
+    replicas, and raises if any of them failed.
+    """
+
+    def __init__(self, topic: str = KAFKA_DLQ_TOPIC):
+        self.topic = topic
+        self.producer = AIOKafkaProducer(bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS, acks="all")
+
+    async def start(self):
+        await self.producer.start()
+        logger.info("Dead letters are published to topic: %s", self.topic)
+
+    async def stop(self):
+        await self.producer.stop()
+
+    async def write(self, letters: list[dict]):
+        # send() only queues a record; its future resolves once the broker has it
+        deliveries = [await self.producer.send(self.topic, orjson.dumps(letter))
+                      for letter in letters]
+        await asyncio.gather(*deliveries)
+
+
+def build_sink(kind: str = KAFKA_DLQ_SINK):
+    """Create the dead-letter sink configured by `kafka.dead_letter.sink`."""
+    if kind == "kafka":
+        return KafkaDeadLetterSink()
+    if kind == "file":
+        return FileDeadLetterSink()
+    raise ValueError(f"Unknown dead-letter sink: {kind}")
+
+
+def classify(stage: str, error: Exception) -> tuple[str, bool]:
+    """Map a failure to its class and whether it is worth retrying.
+
+    Args:
+        stage (str): The name of the stage that failed.
+        error (Exception): The error it raised.
+
+    Returns:
+        tuple: The failure class and True if the record should be retried.
+    """
+    if isinstance(error, NotFoundException):
+        return "unknown_entity", True
+    if stage == "decode" or isinstance(error, ValidationError):
+        return "invalid", False
+    return "unexpected", True
+
+
+def describe(payload) -> dict:
+    """Return a JSON-serializable form of a pipeline payload."""
+    if isinstance(payload, Message):
+        return {"message": payload.model_dump()}
+    if isinstance(payload, Position):
+        return {"position": payload.model_dump(mode="json")}
+    # Raw Kafka record
+    return {
+        "topic": payload.topic,
+        "partition": payload.partition,
+        "offset": payload.offset,
+        "value": base64.b64encode(payload.value).decode("ascii"),
+    }
+
+
+class DeadLetter:
+    """A failed record (or batch) waiting for a retry or for the sink."""
+    __slots__ = ("reason", "error", "payloads", "retry", "on_settled", "attempts")
+
+    def __init__(self, reason: str, error: str, payloads: list, retry: Callable[[], Awaitable] | None,
+                 on_settled: Callable[[], None] | None = None):
+        self.reason = reason
+        self.error = error
+        self.payloads = payloads
+        self.retry = retry
+        self.on_settled = on_settled
+        self.attempts = 0
+
+    def settle(self):
+        if self.on_settled:
+            self.on_settled()
+
+    def to_lines(self) -> list[dict]:
+        failed_at = int(time.time() * 1000)
+        return [{
+            "reason": self.reason,
+            "error": self.error,
+            "attempts": self.attempts,
+            "failed_at": failed_at,
+            **describe(payload)
+        } for payload in self.payloads]
+
+
+class DeadLetterQueue:
+    """Retry failed ingest records off the hot path, then dead-letter them.
+
+    Submitting never blocks: retryable failures are scheduled with exponential
+    backoff (with jitter) on a background task, everything else goes to the
+    sink. Records still failing after `max_attempts`, or submitted while
+    `capacity` retries are already pending, go to the sink too, as do pending
+    retries on shutdown.
+
+    A letter's `on_settled` callback runs once it is taken care of durably:
+    its retry succeeded or it was written to the sink. The pipeline commits
+    the record's offset only then, so a crash while the letter is waiting
+    in memory redelivers the record. Sink writes that fail are retried.
+    """
+
+    def __init__(
+        self,
+        sink,
+        max_attempts: int = KAFKA_DLQ_MAX_ATTEMPTS,
+        base_delay_ms: int = KAFKA_DLQ_BASE_DELAY_MS,
+        max_delay_ms: int = KAFKA_DLQ_MAX_DELAY_MS,
+        capacity: int = KAFKA_DLQ_CAPACITY
+    ):
+        self.sink = sink
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay_ms / 1000.0
+        self.max_delay = max_delay_ms / 1000.0
+        self.capacity = capacity
+        self.failures: dict[str, int] = {}
+        self.retried = 0
+        self.recovered = 0
+        self.dead_lettered = 0
+        self._scheduled: list[tuple[float, int, DeadLetter]] = []
+        self._sequence = itertools.count()
+        self._outbox: list[DeadLetter] = []
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    async def start(self):
+        await self.sink.start()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop_retries(self):
+        """Stop the retry task. Letters can still be submitted until `stop`."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def stop(self):
+        """Stop retrying and send every pending letter to the sink."""
+        await self.stop_retries()
+        self._outbox.extend(letter for _, _, letter in self._scheduled)
+        self._scheduled = []
+        if not await self._drain_outbox():
+            logger.error("%d dead letters left unwritten, their records will be redelivered",
+                         len(self._outbox))
+        await self.sink.stop()
+
+    def submit_record(self, stage: str, payload, error: Exception,
+                      retry: Callable[[], Awaitable] | None = None,
+                      on_settled: Callable[[], None] | None = None):
+        """Handle a record that failed in a pipeline stage.
+
+        Args:
+            stage (str): The name of the stage that failed.
+            payload: The input the stage failed on.
+            error (Exception): The error it raised.
+            retry (Callable): Coroutine function re-running the record from that stage.
+            on_settled (Callable): Called once the record was retried successfully
+                or written to the sink.
+        """
+        reason, retryable = classify(stage, error)
+        self._submit(DeadLetter(reason, str(error), [payload], retry if retryable else None,
+                                on_settled))
+
+    async def dead_letter_batch(self, positions: list[Position]):
+        """Write a batch of positions the database kept refusing to the sink.
+
+        The batch writer has already retried it, so it goes straight to the
+        sink; the write is awaited so the caller only commits the batch's
+        offsets once the rows are durable there.
+
+        Raises:
+            Exception: If the sink could not take the batch.
+        """
+        letter = DeadLetter("database", "Batch insert failed", positions, None)
+        self.failures[letter.reason] = self.failures.get(letter.reason, 0) + len(positions)
+        lines = letter.to_lines()
+        await self.sink.write(lines)
+        self.dead_lettered += len(lines)
+        logger.warning("%d positions dead-lettered after failed batch inserts", len(lines))
+
+    def stats(self) -> dict:
+        """Return failure counters per class and retry state."""
+        return {
+            "failures": dict(self.failures),
+            "pending_retries": len(self._scheduled),
+            "retried": self.retried,
+            "recovered": self.recovered,
+            "dead_lettered": self.dead_lettered,
+        }
+
+    def _submit(self, letter: DeadLetter):
+        self.failures[letter.reason] = self.failures.get(letter.reason, 0) + len(letter.payloads)
+        logger.debug("Ingest failure (%s): %s", letter.reason, letter.error)
+        if letter.retry is None or len(self._scheduled) >= self.capacity:
+            self._outbox.append(letter)
+        else:
+            self._schedule(letter)
+        self._wakeup.set()
+
+    def _schedule(self, letter: DeadLetter):
+        delay = min(self.max_delay, self.base_delay * 2 ** letter.attempts)
+        due = time.monotonic() + delay * random.uniform(0.5, 1.0)
+        heapq.heappush(self._scheduled, (due, next(self._sequence), letter))
+
+    async def _run(self):
+        while True:
+            if not await self._drain_outbox():
+                await asyncio.sleep(self.base_delay)
+                continue
+            timeout = self._scheduled[0][0] - time.monotonic() if self._scheduled else None
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, letter = heapq.heappop(self._scheduled)
+            letter.attempts += 1
+            self.retried += 1
+            try:
+                await letter.retry()
+                self.recovered += len(letter.payloads)
+                letter.settle()
+            except Exception as e:
+                letter.error = str(e)
+                if letter.attempts >= self.max_attempts:
+                    self._outbox.append(letter)
+                else:
+                    self._schedule(letter)
+
+    async def _drain_outbox(self) -> bool:
+        """Write the outbox to the sink, keeping it if the write fails.
+
+        Returns:
+            bool: False if the sink refused the letters.
+        """
+        if not self._outbox:
+            return True
+        letters, self._outbox = self._outbox, []
+        lines = [line for letter in letters for line in letter.to_lines()]
+        try:
+            await self.sink.write(lines)
+        except Exception as e:
+            self._outbox = letters + self._outbox
+            logger.error("Could not write %d dead letters, will retry: %s", len(lines), e)
+            return False
+        self.dead_lettered += len(lines)
+        logger.warning("%d records dead-lettered", len(lines))
+        for letter in letters:
+            letter.settle()
+        return True
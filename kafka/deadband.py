@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+from uuid import UUID
+
+from api.models.Position import Position
+
+
+class DeadbandFilter:
+    """Drop samples of entities that barely moved since their last written sample.
+
+    `rules` maps a `type_object` to `(epsilon, max_silence_ms)`. A sample is
+    kept when the entity moved more than `epsilon` since the last kept sample,
+    or when `max_silence_ms` elapsed since then. Types without a rule, or with
+    a non-positive epsilon, are never filtered. Samples older than the last
+    kept one (late or replayed data) are kept.
+
+    The reference sample of an entity is only updated by `remember`, once
+    the kept sample is durably written, so a sample whose write failed does
+    not hide the next ones. At most `max_entities` entities are tracked, the
+    least recently seen ones being forgotten first. `accept` may be called
+    from several threads.
+    """
+
+    def __init__(self, rules: dict[str, tuple[float, int]], max_entities: int):
+        self.rules = {
+            type_object: (epsilon * epsilon, max_silence_ms)
+            for type_object, (epsilon, max_silence_ms) in rules.items()
+            if epsilon > 0
+        }
+        self.max_entities = max_entities
+        self.filtered: dict[str, int] = {}
+        # Last written sample (x, y, z, epoch ms) of the tracked entities,
+        # None until one is written
+        self._last: OrderedDict[UUID, tuple[float, float, float, int] | None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def accept(self, type_object: str, position: Position) -> bool:
+        """Return True if the sample should be written.
+
+        Args:
+            type_object (str): The object type of the sample ("ship", "planet"...).
+            position (Position): The resolved sample.
+
+        Returns:
+            bool: False if the sample falls inside the dead band.
+        """
+        rule = self.rules.get(type_object)
+        if rule is None:
+            return True
+        epsilon_squared, max_silence_ms = rule
+        timestamp = int(position.time.timestamp() * 1000)
+
+        with self._lock:
+            if position.id in self._last:
+                self._last.move_to_end(position.id)
+                last = self._last[position.id]
+            else:
+                last = self._last[position.id] = None
+                if len(self._last) > self.max_entities:
+                    self._last.popitem(last=False)
+            if last is None:
+                return True
+            last_x, last_y, last_z, last_timestamp = last
+            if timestamp <= last_timestamp:
+                return True
+            dx = position.x - last_x
+            dy = position.y - last_y
+            dz = position.z - last_z
+            if (dx * dx + dy * dy + dz * dz <= epsilon_squared
+                    and timestamp - last_timestamp < max_silence_ms):
+                self.filtered[type_object] = self.filtered.get(type_object, 0) + 1
+                return False
+        return True
+
+    def remember(self, positions: list[Position]):
+        """Make durably written positions the reference of their (tracked) entities."""
+        with self._lock:
+            for position in positions:
+                if position.id not in self._last:
+                    continue
+                timestamp = int(position.time.timestamp() * 1000)
+                last = self._last[position.id]
+                if last is None or timestamp > last[3]:
+                    self._last[position.id] = (position.x, position.y, position.z, timestamp)
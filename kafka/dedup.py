@@ -0,0 +1,38 @@
+from typing import Hashable, Iterable
+
+
+class DedupWindow:
+    """Remember the last `size` keys written, to drop obvious duplicates.
+
+    Keys are kept in insertion order in a dict, and the oldest key is evicted
+    once the window is full. Checking a key does not add it: keys are only
+    added once their record is durable, so a record whose write failed is
+    not dropped as a duplicate when it is delivered again.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.duplicates = 0
+        self._keys: dict[Hashable, None] = {}
+
+    def seen(self, key: Hashable) -> bool:
+        """Return True if `key` is in the window.
+
+        Args:
+            key (Hashable): The key identifying the record.
+
+        Returns:
+            bool: True if the key was already written (the record is a duplicate).
+        """
+        if key in self._keys:
+            self.duplicates += 1
+            return True
+        return False
+
+    def add(self, keys: Iterable[Hashable]):
+        """Add the keys of durably written records, evicting the oldest ones."""
+        for key in keys:
+            self._keys.pop(key, None)
+            self._keys[key] = None
+        while len(self._keys) > self.size:
+            del self._keys[next(iter(self._keys))]
@@ -0,0 +1,297 @@
+import asyncio
+import functools
+import heapq
+import inspect
+from typing import Any, Callable, Hashable
+
+from config.config import (
+    KAFKA_BATCH_SIZE,
+    KAFKA_BATCH_LINGER_MS,
+    KAFKA_PIPELINE_QUEUE_SIZE,
+    KAFKA_PIPELINE_PAUSE_AT,
+    KAFKA_PIPELINE_RESUME_AT
+)
+from config.config import get_logger
+
+from kafka.batch_writer import PositionBatchWriter
+from kafka.dead_letter import DeadLetterQueue
+
+logger = get_logger()
+
+# Weight of the latest sample in the exponential moving average latencies
+LATENCY_EWMA_ALPHA = 0.05
+
+
+class Record:
+    """A Kafka record travelling through the pipeline stages."""
+    __slots__ = ("partition", "offset", "generation", "payload", "enqueued_at")
+
+    def __init__(self, partition: Hashable, offset: int, generation: int, payload: Any):
+        self.partition = partition
+        self.offset = offset
+        self.generation = generation
+        self.payload = payload
+        self.enqueued_at = 0.0
+
+
+class Stage:
+    """A pipeline stage: a bounded input queue drained by `concurrency` workers.
+
+    `handler` receives the record payload and returns the payload for the next
+    stage (it may be a coroutine function). Returning None drops the record,
+    raising marks it as failed.
+
+    A `blocking` handler (e.g. one querying the database) runs in a worker
+    thread, so its `concurrency` workers actually overlap and the event loop
+    keeps fetching. Other synchronous handlers run on the event loop, where
+    more than one worker would not add any parallelism.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Any], concurrency: int,
+                 queue_size: int = KAFKA_PIPELINE_QUEUE_SIZE, blocking: bool = False):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.blocking = blocking
+        self.queue: asyncio.Queue[Record] = asyncio.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self.wait = 0.0
+
+    def observe(self, waited: float, latency: float):
+        self.wait += LATENCY_EWMA_ALPHA * (waited - self.wait)
+        self.latency += LATENCY_EWMA_ALPHA * (latency - self.latency)
+        self.max_latency = max(self.max_latency, latency)
+
+    async def run(self, payload):
+        """Run the handler on a payload, in a worker thread if it is blocking."""
+        if self.blocking:
+            return await asyncio.to_thread(self.handler, payload)
+        result = self.handler(payload)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "depth": self.queue.qsize(),
+            "capacity": self.queue.maxsize,
+            "concurrency": self.concurrency,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "avg_wait_ms": round(self.wait * 1000, 3),
+            "avg_latency_ms": round(self.latency * 1000, 3),
+            "max_latency_ms": round(self.max_latency * 1000, 3),
+        }
+
+
+class OffsetTracker:
+    """Compute, per partition, the highest offset below which every record is done.
+
+    Stages may complete records out of order, so a record's offset can only be
+    committed once every earlier record of the same partition is finished too.
+
+    Every assignment of a partition gets a new generation. Records carry the
+    generation they were fetched in, and completions from an earlier one
+    (records still in flight when the partition was revoked) are ignored,
+    so they cannot move the offsets of a later assignment.
+    """
+
+    def __init__(self):
+        self._pending: dict[Hashable, list[int]] = {}
+        self._done: dict[Hashable, set[int]] = {}
+        self._highest: dict[Hashable, int] = {}
+        self._generations: dict[Hashable, int] = {}
+
+    def start(self, partition: Hashable, offset: int) -> int:
+        """Track a fetched record and return the generation it belongs to."""
+        heapq.heappush(self._pending.setdefault(partition, []), offset)
+        return self._generations.setdefault(partition, 0)
+
+    def done(self, partition: Hashable, offset: int, generation: int) -> int | None:
+        """Mark a record as finished.
+
+        Returns:
+            int: The highest offset that is safe to commit for the partition.
+            None: If nothing can be committed yet, or the partition was
+                revoked since the record was fetched.
+        """
+        pending = self._pending.get(partition)
+        if pending is None or self._generations.get(partition) != generation:
+            return None
+        done = self._done.setdefault(partition, set())
+        done.add(offset)
+        self._highest[partition] = max(self._highest.get(partition, -1), offset)
+        while pending and pending[0] in done:
+            done.discard(heapq.heappop(pending))
+        safe = pending[0] - 1 if pending else self._highest[partition]
+        return safe if safe >= 0 else None
+
+    def forget(self, partitions):
+        for partition in partitions:
+            self._pending.pop(partition, None)
+            self._done.pop(partition, None)
+            self._highest.pop(partition, None)
+            self._generations[partition] = self._generations.get(partition, 0) + 1
+
+
+class IngestPipeline:
+    """Fetch -> decode -> resolve -> write pipeline over bounded queues.
+
+    The fetcher pauses every assigned partition as soon as one stage queue is
+    filled past `pause_at` of its capacity, and resumes them once every queue
+    is back under `resume_at`. It keeps polling while paused so the consumer
+    stays in its group.
+
+    Records a stage fails on are handed to the dead-letter queue, which
+    retries them from that stage off the hot path. Their offsets are only
+    marked done once the queue settles them (retried successfully or
+    written to the sink), so no record is committed while it only lives in
+    memory.
+    """
+
+    def __init__(
+        self,
+        consumer,
+        writer: PositionBatchWriter,
+        stages: list[Stage],
+        dead_letters: DeadLetterQueue = None,
+        pause_at: float = KAFKA_PIPELINE_PAUSE_AT,
+        resume_at: float = KAFKA_PIPELINE_RESUME_AT
+    ):
+        self.consumer = consumer
+        self.writer = writer
+        self.stages = stages
+        self.dead_letters = dead_letters
+        self.pause_at = pause_at
+        self.resume_at = resume_at
+        self.tracker = OffsetTracker()
+        self.fetched = 0
+        self.paused = False
+        self.pause_count = 0
+        self._fetch_task: asyncio.Task | None = None
+        self._workers: list[asyncio.Task] = []
+
+    async def start(self):
+        """Start the fetcher and the stage workers."""
+        for index, stage in enumerate(self.stages):
+            next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            for _ in range(stage.concurrency):
+                self._workers.append(asyncio.create_task(self._work(index, stage, next_stage)))
+        self._fetch_task = asyncio.create_task(self._fetch())
+        logger.info("Ingest pipeline started: %s",
+                    ", ".join(f"{s.name}x{s.concurrency}" for s in self.stages))
+
+    async def stop(self, drain_timeout: float = 5.0):
+        """Stop fetching, let queued records drain for up to `drain_timeout`, then stop the workers."""
+        if self._fetch_task:
+            self._fetch_task.cancel()
+            try:
+                await self._fetch_task
+            except asyncio.CancelledError:
+                pass
+        try:
+            for stage in self.stages:
+                await asyncio.wait_for(stage.queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Ingest pipeline did not drain in %.1fs", drain_timeout)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        logger.info("Ingest pipeline stopped.")
+
+    def forget(self, partitions):
+        """Drop offset tracking for revoked partitions."""
+        self.tracker.forget(partitions)
+
+    def stats(self) -> dict:
+        """Return queue depths, stage latencies and fetcher state."""
+        return {
+            "fetched": self.fetched,
+            "paused": self.paused,
+            "pause_count": self.pause_count,
+            "stages": {stage.name: stage.stats() for stage in self.stages},
+            "writer": self.writer.stats(),
+            "dead_letters": self.dead_letters.stats() if self.dead_letters else None,
+        }
+
+    async def run_from(self, index: int, payload):
+        """Run a payload through the handlers of stage `index` onwards, bypassing the queues."""
+        for stage in self.stages[index:]:
+            payload = await stage.run(payload)
+            if payload is None:
+                return
+
+    async def _fetch(self):
+        first = self.stages[0]
+        loop = asyncio.get_running_loop()
+        while True:
+            self._apply_backpressure()
+            batches = await self.consumer.getmany(
+                timeout_ms=KAFKA_BATCH_LINGER_MS, max_records=KAFKA_BATCH_SIZE)
+            for tp, messages in batches.items():
+                for msg in messages:
+                    generation = self.tracker.start(tp, msg.offset)
+                    record = Record(tp, msg.offset, generation, msg)
+                    record.enqueued_at = loop.time()
+                    await first.queue.put(record)
+                    self.fetched += 1
+
+    def _apply_backpressure(self):
+        fill = max(stage.queue.qsize() / stage.queue.maxsize for stage in self.stages)
+        if not self.paused and fill >= self.pause_at:
+            partitions = self.consumer.assignment()
+            self.consumer.pause(*partitions)
+            self.paused = True
+            self.pause_count += 1
+            logger.info("Ingest backpressure: paused %d partitions (fill=%.2f)",
+                        len(partitions), fill)
+        elif self.paused and fill <= self.resume_at:
+            self.consumer.resume(*self.consumer.paused())
+            self.paused = False
+            logger.info("Ingest backpressure released (fill=%.2f)", fill)
+
+    async def _work(self, index: int, stage: Stage, next_stage: Stage | None):
+        loop = asyncio.get_running_loop()
+        while True:
+            record = await stage.queue.get()
+            try:
+                started = loop.time()
+                try:
+                    result = await stage.run(record.payload)
+                except Exception as e:
+                    stage.failed += 1
+                    if self.dead_letters:
+                        self.dead_letters.submit_record(
+                            stage.name, record.payload, e,
+                            retry=functools.partial(self.run_from, index, record.payload),
+                            on_settled=functools.partial(self._complete, record))
+                    else:
+                        logger.error("%s failed for %s@%d: %s",
+                                     stage.name, record.partition, record.offset, e)
+                        self._complete(record)
+                    continue
+                finished = loop.time()
+                stage.processed += 1
+                stage.observe(started - record.enqueued_at, finished - started)
+
+                if result is None or next_stage is None:
+                    if result is None and next_stage is not None:
+                        stage.dropped += 1
+                    self._complete(record)
+                else:
+                    record.payload = result
+                    record.enqueued_at = finished
+                    await next_stage.queue.put(record)
+            finally:
+                stage.queue.task_done()
+
+    def _complete(self, record: Record):
+        safe = self.tracker.done(record.partition, record.offset, record.generation)
+        if safe is not None:
+            self.writer.mark(record.partition, safe)
@@ -0,0 +1,203 @@
+import asyncio
+import struct
+import time
+
+from aiokafka import AIOKafkaConsumer, TopicPartition
+
+from config.config import KAFKA_BOOTSTRAP_SERVERS
+from config.config import get_logger
+
+from api.models.Position import Position
+from api.services import position_service
+
+from kafka.codec import get_codec
+from kafka.consumer import TOPIC_CODECS, resolve_position
+from kafka.dead_letter import classify
+
+logger = get_logger()
+
+# Binary replay files frame each record with its length
+BINARY_FRAME = struct.Struct("<I")
+
+
+class BulkLoader:
+    """Decode, resolve and bulk load records, reporting throughput.
+
+    Records go through the same codecs and resolution as the live consumer,
+    then are written through `position_service.bulk_load_positions` in large
+    batches. One batch is written in the background while the next one is
+    being decoded. Failed records are counted per failure class and skipped.
+    """
+
+    def __init__(self, batch_size: int, report_every: float = 5.0):
+        self.batch_size = batch_size
+        self.report_every = report_every
+        self.read = 0
+        self.written = 0
+        self.failed_batches = 0
+        self.failures: dict[str, int] = {}
+        self._batch: list[Position] = []
+        self._writing: asyncio.Task | None = None
+        self._started = time.monotonic()
+        self._reported = self._started
+
+    async def add(self, codec, value: bytes):
+        """Decode and resolve one record, flushing when the batch is full."""
+        self.read += 1
+        stage = "decode"
+        try:
+            message = codec.decode(value)
+            stage = "resolve"
+            position = resolve_position(message)
+        except Exception as e:
+            reason, _ = classify(stage, e)
+            self.failures[reason] = self.failures.get(reason, 0) + 1
+            return
+        if position is not None:
+            self._batch.append(position)
+        if len(self._batch) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        """Start writing the current batch, once the previous one is written."""
+        await self.wait()
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        self._writing = asyncio.create_task(self._write(batch))
+
+    async def wait(self):
+        """Wait for the batch being written, if any."""
+        if self._writing:
+            await self._writing
+            self._writing = None
+
+    async def finish(self, progress: str = ""):
+        """Write the last batch and print the final report."""
+        await self.flush()
+        await self.wait()
+        self.report(progress)
+
+    def maybe_report(self, progress: str = ""):
+        """Print a report if `report_every` elapsed since the last one."""
+        if time.monotonic() - self._reported >= self.report_every:
+            self.report(progress)
+
+    async def _write(self, batch: list[Position]):
+        written = await asyncio.to_thread(position_service.bulk_load_positions, batch)
+        if written is None:
+            self.failed_batches += 1
+            self.failures["database"] = self.failures.get("database", 0) + len(batch)
+        else:
+            self.written += written
+
+    def report(self, progress: str = ""):
+        """Print counters and rates since the start of the replay."""
+        now = time.monotonic()
+        self._reported = now
+        elapsed = max(now - self._started, 1e-9)
+        print(f"{self.read} read ({self.read / elapsed:.0f}/s), "
+              f"{self.written} written ({self.written / elapsed:.0f} rows/s), "
+              f"failures: {self.failures or 'none'}"
+              + (f", {progress}" if progress else ""), flush=True)
+
+
+async def replay_kafka(
+    topics: list[str],
+    loader: BulkLoader,
+    from_offset: int = None,
+    from_timestamp: int = None,
+    to_timestamp: int = None
+):
+    """Replay the given topics from an offset or a timestamp up to their current end.
+
+    A standalone consumer without group is used, so the live consumer group
+    offsets are left untouched.
+
+    Args:
+        topics (list[str]): The topics to replay.
+        loader (BulkLoader): The loader receiving the records.
+        from_offset (int): Offset to start from in every partition (default: beginning).
+        from_timestamp (int): Start at the first record at or after this time (epoch ms).
+        to_timestamp (int): Stop at records after this time (epoch ms).
+    """
+    consumer = AIOKafkaConsumer(
+        bootstrap_servers=KAFKA_BOOTSTRAP_SERVERS,
+        group_id=None,
+        enable_auto_commit=False
+    )
+    await consumer.start()
+    try:
+        await consumer.topics()
+        partitions = [TopicPartition(topic, partition)
+                      for topic in topics
+                      for partition in sorted(consumer.partitions_for_topic(topic) or ())]
+        consumer.assign(partitions)
+        end = await consumer.end_offsets(partitions)
+
+        if from_timestamp is not None:
+            found = await consumer.offsets_for_times({tp: from_timestamp for tp in partitions})
+            for tp in partitions:
+                consumer.seek(tp, found[tp].offset if found[tp] else end[tp])
+        elif from_offset is not None:
+            for tp in partitions:
+                consumer.seek(tp, min(from_offset, end[tp]))
+        else:
+            await consumer.seek_to_beginning(*partitions)
+
+        remaining = set()
+        for tp in partitions:
+            if await consumer.position(tp) < end[tp]:
+                remaining.add(tp)
+        total = sum(end[tp] - await consumer.position(tp) for tp in remaining)
+        print(f"Replaying {total} records from {len(remaining)} partitions", flush=True)
+
+        consumed = 0
+        while remaining:
+            batches = await consumer.getmany(
+                *remaining, timeout_ms=1000, max_records=loader.batch_size)
+            for tp, records in batches.items():
+                codec = TOPIC_CODECS.get(tp.topic) or get_codec("json")
+                for record in records:
+                    if record.offset >= end[tp] or (
+                            to_timestamp is not None and record.timestamp > to_timestamp):
+                        remaining.discard(tp)
+                        break
+                    consumed += 1
+                    await loader.add(codec, record.value)
+            # Checked for every partition: one whose last offsets are control
+            # records, compacted away or aborted reaches the end without
+            # returning any record
+            for tp in list(remaining):
+                if await consumer.position(tp) >= end[tp]:
+                    remaining.discard(tp)
+            loader.maybe_report(f"{consumed}/{total} records")
+        await loader.finish(f"{consumed}/{total} records")
+    finally:
+        await consumer.stop()
+
+
+async def replay_file(path: str, loader: BulkLoader, binary: bool = False):
+    """Replay an exported file of records.
+
+    NDJSON files hold one JSON message per line. Binary files hold records
+    in the binary codec layout, each prefixed by its length (`BINARY_FRAME`).
+
+    Args:
+        path (str): The file to replay.
+        loader (BulkLoader): The loader receiving the records.
+        binary (bool): True for a binary file, False for NDJSON.
+    """
+    codec = get_codec("binary" if binary else "json")
+    with open(path, "rb") as file:
+        if binary:
+            while header := file.read(BINARY_FRAME.size):
+                (length,) = BINARY_FRAME.unpack(header)
+                await loader.add(codec, file.read(length))
+                loader.maybe_report()
+        else:
+            for line in file:
+                if line.strip():
+                    await loader.add(codec, line)
+                    loader.maybe_report()
+    await loader.finish()
@@ -0,0 +1,211 @@
+import asyncio
+import os
+import struct
+import time
+import uuid
+from datetime import datetime
+
+from config.config import (
+    KAFKA_SPOOL_DIR,
+    KAFKA_SPOOL_SEGMENT_BYTES,
+    KAFKA_SPOOL_MAX_BYTES,
+    KAFKA_SPOOL_SLOW_FLUSH_MS,
+    KAFKA_SPOOL_REPLAY_INTERVAL_MS,
+    KAFKA_SPOOL_REPLAY_BATCH_SIZE,
+    KAFKA_SPOOL_REPLAY_ROWS_PER_SECOND
+)
+from config.config import get_logger
+
+from api.models.Position import Position
+from api.services import position_service
+
+logger = get_logger()
+
+# Spooled position: entity id, x, y, z, time (epoch ms). 48 bytes.
+SPOOL_RECORD = struct.Struct("<16sdddq")
+SEGMENT_SUFFIX = ".seg"
+
+
+class PositionSpool:
+    """Local append-only segment spool used while Postgres is down or slow.
+
+    Once `degrade` is called, the batch writer appends its batches here
+    instead of writing them to the database. Segments are rotated at
+    `segment_bytes` and the spool refuses batches beyond `max_bytes`. A
+    background task replays the oldest segments in bulk, at most
+    `replay_rows_per_second` (0 for no limit), and leaves degraded mode once
+    the spool is empty.
+    """
+
+    def __init__(
+        self,
+        directory: str = KAFKA_SPOOL_DIR,
+        segment_bytes: int = KAFKA_SPOOL_SEGMENT_BYTES,
+        max_bytes: int = KAFKA_SPOOL_MAX_BYTES,
+        slow_flush_ms: int = KAFKA_SPOOL_SLOW_FLUSH_MS,
+        replay_interval_ms: int = KAFKA_SPOOL_REPLAY_INTERVAL_MS,
+        replay_batch_size: int = KAFKA_SPOOL_REPLAY_BATCH_SIZE,
+        replay_rows_per_second: int = KAFKA_SPOOL_REPLAY_ROWS_PER_SECOND
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.slow_flush = slow_flush_ms / 1000.0
+        self.replay_interval = replay_interval_ms / 1000.0
+        self.replay_batch_size = replay_batch_size
+        self.replay_rows_per_second = replay_rows_per_second
+        self.degraded = False
+        self.reason = None
+        self.spooled_rows = 0
+        self.replayed_rows = 0
+        self.rejected_rows = 0
+        self.replay_rate = 0.0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+        self._active: str | None = None
+        self._sequence = 0
+
+    async def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self._segments()
+        if segments:
+            self._sequence = int(os.path.basename(segments[-1])[:-len(SEGMENT_SUFFIX)])
+            self.degrade(f"{len(segments)} segments left from a previous run")
+        self._task = asyncio.create_task(self._replay_loop())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def degrade(self, reason: str):
+        """Route new batches to the spool until it has been replayed."""
+        if not self.degraded:
+            logger.warning("Spooling positions locally: %s", reason)
+        self.degraded = True
+        self.reason = reason
+
+    def is_slow(self, flush_seconds: float) -> bool:
+        return flush_seconds >= self.slow_flush
+
+    async def append(self, positions: list[Position]) -> bool:
+        """Durably append a batch to the active segment.
+
+        Returns:
+            bool: False if the spool is full or the write failed.
+        """
+        data = b"".join(
+            SPOOL_RECORD.pack(position.id.bytes, position.x, position.y, position.z,
+                              int(position.time.timestamp() * 1000))
+            for position in positions
+        )
+        async with self._lock:
+            if self.size() + len(data) > self.max_bytes:
+                self.rejected_rows += len(positions)
+                logger.error("Spool full, %d positions rejected", len(positions))
+                return False
+            try:
+                await asyncio.to_thread(self._write, data)
+            except OSError as e:
+                self.rejected_rows += len(positions)
+                logger.error("Could not spool %d positions: %s", len(positions), e)
+                return False
+        self.spooled_rows += len(positions)
+        return True
+
+    def size(self) -> int:
+        """Total size of the spool segments in bytes."""
+        return sum(os.path.getsize(path) for path in self._segments())
+
+    def stats(self) -> dict:
+        """Return the spool state, size and replay counters."""
+        segments = self._segments()
+        return {
+            "degraded": self.degraded,
+            "reason": self.reason,
+            "segments": len(segments),
+            "bytes": sum(os.path.getsize(path) for path in segments),
+            "max_bytes": self.max_bytes,
+            "spooled_rows": self.spooled_rows,
+            "replayed_rows": self.replayed_rows,
+            "rejected_rows": self.rejected_rows,
+            "replay_rows_per_second": round(self.replay_rate),
+        }
+
+    def _segments(self) -> list[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+
+    def _write(self, data: bytes):
+        if self._active is None or os.path.getsize(self._active) >= self.segment_bytes:
+            self._sequence += 1
+            self._active = os.path.join(
+                self.directory, f"{self._sequence:012d}{SEGMENT_SUFFIX}")
+        with open(self._active, "ab") as segment:
+            segment.write(data)
+            segment.flush()
+            os.fsync(segment.fileno())
+
+    async def _replay_loop(self):
+        while True:
+            await asyncio.sleep(self.replay_interval)
+            if not self.degraded:
+                continue
+            try:
+                await self._replay()
+            except Exception as e:
+                logger.exception("Error replaying spool: %s", e)
+
+    async def _replay(self):
+        while True:
+            async with self._lock:
+                segments = self._segments()
+                if not segments:
+                    self.degraded = False
+                    self.reason = None
+                    logger.warning("Spool replayed, writing to the database again.")
+                    return
+                segment = segments[0]
+                if segment == self._active:
+                    # Close the active segment so new batches go to a new one
+                    self._active = None
+
+            with open(segment, "rb") as file:
+                data = file.read()
+            positions = [
+                Position.model_construct(
+                    id=uuid.UUID(bytes=id_bytes), x=x, y=y, z=z,
+                    time=datetime.fromtimestamp(timestamp / 1000.0))
+                for id_bytes, x, y, z, timestamp in SPOOL_RECORD.iter_unpack(
+                    data[:len(data) - len(data) % SPOOL_RECORD.size])
+            ]
+
+            for start in range(0, len(positions), self.replay_batch_size):
+                chunk = positions[start:start + self.replay_batch_size]
+                started = time.monotonic()
+                # The segment is deleted once replayed: commits must be durable
+                written = await asyncio.to_thread(
+                    position_service.bulk_load_positions, chunk, True)
+                if written is None:
+                    # Still down: keep the segment, already loaded rows are
+                    # skipped on the next attempt
+                    return
+                elapsed = time.monotonic() - started
+                self.replayed_rows += len(chunk)
+                if self.replay_rows_per_second > 0:
+                    budget = len(chunk) / self.replay_rows_per_second
+                    if budget > elapsed:
+                        await asyncio.sleep(budget - elapsed)
+                self.replay_rate = len(chunk) / max(time.monotonic() - started, 1e-9)
+
+            os.remove(segment)
+            logger.info("Spool segment replayed: %s (%d rows)", segment, len(positions))
@@ -1,12 +1,15 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from kafka.consumer import kafka_lifespan
+from api.services import position_service
 from config.config import get_logger
 from api.resources import (
     auth_resource,
     user_resource,
     ship_resource,
-    planet_resource
+    planet_resource,
+    rollup_resource,
+    spatial_resource
 )
 
 
@@ -19,6 +22,8 @@ tags_metadata = [
     {"name": "User", "description": "User management endpoints."},
     {"name": "Ship", "description": "Ship management endpoints."},
     {"name": "Planet", "description": "Planet management endpoints."},
+    {"name": "Rollup", "description": "Position rollup maintenance endpoints."},
+    {"name": "Nearby", "description": "Proximity search endpoints."},
     {"name": "Health", "description": "Health check endpoint."}
 ]
 
@@ -39,7 +44,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Disposition"]
+    expose_headers=["Content-Disposition", "X-Next-Cursor"]
 )
 
 # Health check route
@@ -51,11 +56,46 @@ async def ping():
     logger.info("Health check endpoint accessed.")
     return {"message": "API is running"}
 
+
+@app.get("/ingest/stats", tags=["Health"], summary="Ingest pipeline statistics")
+async def ingest_stats(request: Request):
+    """Report queue depths, stage latencies and writer counters of the Kafka ingest pipeline."""
+    pipeline = getattr(request.app.state, "ingest", None)
+    if pipeline is None:
+        raise HTTPException(status_code=503, detail="Ingestion is not running")
+    return pipeline.stats()
+
+
+@app.get("/latest/stats", tags=["Health"], summary="Latest position store statistics")
+async def latest_stats():
+    """Report hit rate and staleness of the shared latest position store (for the serving worker)."""
+    if position_service.latest_positions is None:
+        raise HTTPException(status_code=503, detail="Latest position store is disabled")
+    return position_service.latest_positions.stats()
+
+
+@app.get("/history/stats", tags=["Health"], summary="Recent history buffer statistics")
+async def history_stats():
+    """Report hit rate and memory use of the in-memory recent history (for the serving worker)."""
+    if position_service.recent_history is None:
+        raise HTTPException(status_code=503, detail="Recent history buffer is disabled")
+    return position_service.recent_history.stats()
+
+
+@app.get("/nearby/stats", tags=["Health"], summary="Spatial index statistics")
+async def nearby_stats():
+    """Report the size and freshness of the spatial index (for the serving worker)."""
+    if position_service.spatial_index is None:
+        raise HTTPException(status_code=503, detail="Spatial index is disabled")
+    return position_service.spatial_index.stats()
+
 # Include routers from resources
 app.include_router(auth_resource.router)
 app.include_router(user_resource.router)
 app.include_router(ship_resource.router)
 app.include_router(planet_resource.router)
+app.include_router(rollup_resource.router)
+app.include_router(spatial_resource.router)
 
 # Integrate Kafka consumer into the application's lifecycle
 app.router.lifespan_context = kafka_lifespan
@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+
+from config.config import KAFKA_TOPIC_PLANETS, KAFKA_TOPIC_SHIPS
+from kafka.replay import BulkLoader, replay_file, replay_kafka
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Re-ingest positions from Kafka or from an exported file using the bulk-load path.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--from-offset", type=int,
+                        help="Kafka offset to start from in every partition (default: beginning)")
+    source.add_argument("--from-timestamp", type=int,
+                        help="Start at the first Kafka record at or after this time (epoch ms)")
+    source.add_argument("--file", help="Replay an exported file instead of Kafka")
+    parser.add_argument("--to-timestamp", type=int,
+                        help="Stop at Kafka records after this time (epoch ms)")
+    parser.add_argument("--topic", action="append",
+                        help="Topic to replay, may be repeated (default: planets and ships)")
+    parser.add_argument("--binary", action="store_true",
+                        help="The file holds length-prefixed binary records instead of NDJSON")
+    parser.add_argument("--batch-size", type=int, default=20000,
+                        help="Rows per bulk-load batch (default: 20000)")
+    parser.add_argument("--report-every", type=float, default=5.0,
+                        help="Seconds between progress reports (default: 5)")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    loader = BulkLoader(args.batch_size, args.report_every)
+    if args.file:
+        await replay_file(args.file, loader, binary=args.binary)
+    else:
+        await replay_kafka(
+            args.topic or [KAFKA_TOPIC_PLANETS, KAFKA_TOPIC_SHIPS],
+            loader,
+            from_offset=args.from_offset,
+            from_timestamp=args.from_timestamp,
+            to_timestamp=args.to_timestamp
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
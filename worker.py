@@ -0,0 +1,41 @@
+import asyncio
+import signal
+
+from config.config import KAFKA_STATS_INTERVAL
+from config.config import get_logger
+from kafka.consumer import ingest_session
+
+logger = get_logger()
+
+
+async def run_worker():
+    """Run the Kafka ingest pipeline until SIGINT or SIGTERM is received.
+
+    Several workers can run side by side: they share the partitions of the
+    `kafka.group_id` consumer group. Pipeline statistics are logged every
+    `kafka.stats_interval_seconds`.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    async with ingest_session() as pipeline:
+        logger.info("Ingest worker started.")
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), KAFKA_STATS_INTERVAL)
+            except asyncio.TimeoutError:
+                logger.info("Ingest stats: %s", pipeline.stats())
+        logger.info("Stopping ingest worker...")
+
+    logger.info("Ingest worker stopped.")
+
+
+if __name__ == "__main__":
+    # uvloop is used when installed, it is optional
+    try:
+        from uvloop import run
+    except ImportError:
+        from asyncio import run
+    run(run_worker())